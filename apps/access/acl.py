@@ -1,18 +1,55 @@
+from django.conf import settings
+from django.core.cache import cache
+
 import amo
 
 
+def compile_rules(rules):
+    """
+    Return the set of (app, action) pairs granted by `rules`, a list of
+    comma separated rule strings as found in Group.
+
+    Every rule also grants (app, '%'), which is what asking whether any
+    action of `app` is allowed looks for.
+    """
+    permissions = set()
+    for rule in ','.join(rules).split(','):
+        if rule:
+            rule_app, rule_action = rule.split(':')
+            permissions.update([(rule_app, rule_action), (rule_app, '%')])
+    return frozenset(permissions)
+
+
+def allowed(permissions, app, action):
+    """Whether the compiled `permissions` allow `action` on `app`."""
+    return bool(permissions.intersection(
+        [(app, action), (app, '*'), ('*', action), ('*', '*')]))
+
+
 def match_rules(rules, app, action):
     """
     This will match rules found in Group.
     """
-    for rule in rules.split(','):
-        rule_app, rule_action = rule.split(':')
-        if rule_app == '*' or rule_app == app:
-            if (rule_action == '*'
-                or rule_action == action
-                or action == '%'):
-                return True
-    return False
+    return allowed(compile_rules([rules]), app, action)
+
+
+def permissions_key(user_id):
+    return 'acl:permissions:%s' % user_id
+
+
+def get_permissions(user):
+    """
+    The compiled rules of all the groups of `user`, cached until they change,
+    see access.models.
+    """
+    from access.models import Group
+    key = permissions_key(user.id)
+    permissions = cache.get(key)
+    if permissions is None:
+        permissions = compile_rules(Group.uncached.filter(users=user.id)
+                                    .values_list('rules', flat=True))
+        cache.set(key, permissions, settings.ACL_CACHE_TIMEOUT)
+    return permissions
 
 
 def action_allowed(request, app, action):
@@ -22,16 +59,17 @@ def action_allowed(request, app, action):
     'Admin:%' is true if the user has any of:
     ('Admin:*', 'Admin:%s'%whatever, '*:*',) as rules.
     """
-    allowed = any(match_rules(group.rules, app, action) for group in
-                  getattr(request, 'groups', ()))
-    return allowed
+    # ACLMiddleware compiles them once per request, otherwise use the groups.
+    permissions = getattr(request, 'permissions', None)
+    if not isinstance(permissions, frozenset):
+        permissions = compile_rules(group.rules for group in
+                                    getattr(request, 'groups', ()))
+    return allowed(permissions, app, action)
 
 
 def action_allowed_user(user, app, action):
     """Similar to action_allowed, but takes user instead of request."""
-    allowed = any(match_rules(group.rules, app, action) for group in
-                  user.groups.all())
-    return allowed
+    return allowed(get_permissions(user), app, action)
 
 
 def check_ownership(request, obj, require_owner=False, require_author=False,
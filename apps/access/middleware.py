@@ -30,7 +30,10 @@ class ACLMiddleware(object):
 
             amo.set_user(amo_user)
             request.user._profile_cache = request.amo_user = amo_user
+            # Lazy, the permissions below answer action_allowed() from the
+            # cache without loading the groups.
             request.groups = request.amo_user.groups.all()
+            request.permissions = acl.get_permissions(amo_user)
 
             if acl.action_allowed(request, 'Admin', '%'):
                 request.user.is_staff = True
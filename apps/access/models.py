@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.db import models
 from django import dispatch
 from django.db.models import signals
@@ -5,6 +6,7 @@ from django.db.models import signals
 import amo
 import amo.models
 import commonware.log
+from access.acl import permissions_key
 
 
 log = commonware.log.getLogger('z.users')
@@ -61,3 +63,19 @@ def groupuser_post_delete(sender, instance, **kw):
         instance.user.user.is_superuser = instance.user.user.is_staff = False
         instance.user.user.save()
     log.info('Removed %s from %s' % (instance.user, instance.group))
+
+
+@dispatch.receiver(signals.post_save, sender=GroupUser,
+                   dispatch_uid='groupuser.invalidate_permissions')
+@dispatch.receiver(signals.post_delete, sender=GroupUser,
+                   dispatch_uid='groupuser.invalidate_permissions')
+def groupuser_invalidate_permissions(sender, instance, **kw):
+    cache.delete(permissions_key(instance.user_id))
+
+
+@dispatch.receiver(signals.post_save, sender=Group,
+                   dispatch_uid='group.invalidate_permissions')
+def group_invalidate_permissions(sender, instance, **kw):
+    users = GroupUser.objects.filter(group=instance).values_list('user',
+                                                                 flat=True)
+    cache.delete_many([permissions_key(user) for user in users])
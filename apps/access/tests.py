@@ -1,7 +1,8 @@
 from django.http import HttpRequest
+from django.test.client import RequestFactory
 
 import mock
-from nose.tools import assert_false
+from nose.tools import assert_false, eq_
 
 import amo
 from amo.tests import TestCase
@@ -9,8 +10,11 @@ from amo.urlresolvers import reverse
 from addons.models import Addon, AddonUser
 from users.models import UserProfile
 
-from .acl import (action_allowed, check_addon_ownership, check_ownership,
-                  match_rules)
+from .acl import (action_allowed, action_allowed_user, allowed,
+                  check_addon_ownership, check_ownership, compile_rules,
+                  get_permissions, match_rules)
+from .middleware import ACLMiddleware
+from .models import Group, GroupUser
 
 
 def test_match_rules():
@@ -195,3 +199,55 @@ class TestHasPerm(TestCase):
         self.au.role = amo.AUTHOR_ROLE_SUPPORT
         self.au.save()
         assert check_addon_ownership(self.request, self.addon, support=True)
+
+
+def test_compile_rules():
+    permissions = compile_rules(['Admin:Foo,Editors:*', '', 'Apps:Review'])
+    assert allowed(permissions, 'Admin', 'Foo')
+    assert allowed(permissions, 'Admin', '%')
+    assert not allowed(permissions, 'Admin', 'Bar')
+    assert allowed(permissions, 'Editors', 'Anything')
+    assert allowed(permissions, 'Apps', 'Review')
+    assert not allowed(permissions, 'Apps', 'Edit')
+    assert not allowed(permissions, 'Addons', '%')
+    assert allowed(compile_rules(['*:*']), 'Addons', 'Edit')
+    assert allowed(compile_rules(['*:Review']), 'Addons', 'Review')
+    assert not allowed(compile_rules(['*:Review']), 'Addons', 'Edit')
+
+
+class TestPermissions(TestCase):
+    fixtures = ['base/users']
+
+    def setUp(self):
+        self.user = UserProfile.objects.get(email='regular@mozilla.com')
+        self.group = Group.objects.create(name='Reviewers',
+                                          rules='Apps:Review')
+
+    def test_cached(self):
+        eq_(get_permissions(self.user), frozenset())
+        with self.assertNumQueries(0):
+            assert not action_allowed_user(self.user, 'Apps', 'Review')
+
+    def test_group_user_added_and_removed(self):
+        assert not action_allowed_user(self.user, 'Apps', 'Review')
+        group_user = GroupUser.objects.create(group=self.group,
+                                              user=self.user)
+        assert action_allowed_user(self.user, 'Apps', 'Review')
+        group_user.delete()
+        assert not action_allowed_user(self.user, 'Apps', 'Review')
+
+    def test_group_rules_changed(self):
+        GroupUser.objects.create(group=self.group, user=self.user)
+        assert not action_allowed_user(self.user, 'Addons', 'Review')
+        self.group.update(rules='Apps:Review,Addons:Review')
+        assert action_allowed_user(self.user, 'Addons', 'Review')
+
+    def test_middleware(self):
+        GroupUser.objects.create(group=self.group, user=self.user)
+        request = RequestFactory().get('/')
+        request.user = self.user.user
+        ACLMiddleware().process_request(request)
+        eq_(request.permissions, get_permissions(self.user))
+        with self.assertNumQueries(0):
+            assert action_allowed(request, 'Apps', 'Review')
+            assert not action_allowed(request, 'Admin', '%')
@@ -1,6 +1,7 @@
 import array
 import itertools
 import logging
+import multiprocessing
 import operator
 import os
 import subprocess
@@ -20,10 +21,11 @@ from celeryutils import task
 import waffle
 
 import amo
-from amo.utils import chunked
+from amo.utils import bulk_update, cache_ns_key, chunked
 from addons import search
 from addons.models import Addon, AppSupport, FrozenAddon, Persona
 from files.models import File
+from lib.es.bulk import BulkIndexer
 from lib.es.utils import raise_if_reindex_in_progress
 from stats.models import ThemeUserCount, UpdateCount
 
@@ -116,25 +118,25 @@ def update_addon_average_daily_users():
 def _update_addon_average_daily_users(data, **kw):
     task_log.info("[%s] Updating add-ons ADU totals." % (len(data)))
 
-    for pk, count in data:
-        try:
-            addon = Addon.objects.get(pk=pk)
-        except Addon.DoesNotExist:
-            # The processing input comes from metrics which might be out of
-            # date in regards to currently existing add-ons
-            m = "Got an ADU update (%s) but the add-on doesn't exist (%s)"
-            task_log.debug(m % (count, pk))
-            continue
-
+    counts = dict(data)
+    addons = _get_addons(counts)
+    for pk in set(counts).difference(a.id for a in addons):
+        # The processing input comes from metrics which might be out of
+        # date in regards to currently existing add-ons
+        m = "Got an ADU update (%s) but the add-on doesn't exist (%s)"
+        task_log.debug(m % (counts[pk], pk))
+
+    rows = []
+    for addon in addons:
+        count = counts[addon.id]
         if (count - addon.total_downloads) > 10000:
             # Adjust ADU to equal total downloads so bundled add-ons don't
             # skew the results when sorting by users.
             task_log.info('Readjusted ADU count for addon %s' % addon.slug)
-            addon.update(average_daily_users=addon.total_downloads)
-        else:
-            #task_log.debug('Updating "%s" :: ADU %s -> %s' %
-            #               (addon.slug, addon.average_daily_users, count))
-            addon.update(average_daily_users=count)
+            count = addon.total_downloads
+        rows.append((addon.id, count))
+
+    _bulk_update_addons(addons, ['average_daily_users'], rows)
 
 
 @cronjobs.register
@@ -160,6 +162,24 @@ def _update_daily_theme_user_counts(data, **kw):
                                       date=datetime.now())
 
 
+def _get_addons(ids):
+    return list(Addon.objects.no_cache().filter(id__in=ids).no_transforms())
+
+
+def _bulk_update_addons(addons, fields, rows):
+    """
+    Set `fields` of `addons` from `rows` of (pk, value, ...) in a single
+    UPDATE, then invalidate and reindex them all at once instead of sending
+    a post_save for each of them.
+    """
+    from .tasks import index_addons
+    if not addons:
+        return
+    bulk_update(Addon, fields, rows)
+    Addon.objects.invalidate(*addons)
+    index_addons.delay([addon.id for addon in addons])
+
+
 @cronjobs.register
 def update_addon_download_totals():
     """Update add-on total and average downloads."""
@@ -186,16 +206,18 @@ def _update_addon_download_totals(data, **kw):
     task_log.info("[%s] Updating add-ons download+average totals." %
                    (len(data)))
 
-    for pk, avg, sum in data:
-        try:
-            Addon.objects.get(pk=pk).update(average_daily_downloads=avg,
-                                            total_downloads=sum)
-        except Addon.DoesNotExist:
-            # The processing input comes from metrics which might be out of
-            # date in regards to currently existing add-ons
-            m = ("Got new download totals (total=%s,avg=%s) but the add-on"
-                 "doesn't exist (%s)" % (sum, avg, pk))
-            task_log.debug(m)
+    totals = dict((pk, (avg, sum)) for pk, avg, sum in data)
+    addons = _get_addons(totals)
+    for pk in set(totals).difference(a.id for a in addons):
+        # The processing input comes from metrics which might be out of
+        # date in regards to currently existing add-ons
+        m = ("Got new download totals (total=%s,avg=%s) but the add-on"
+             "doesn't exist (%s)" % (totals[pk][1], totals[pk][0], pk))
+        task_log.debug(m)
+
+    rows = [(addon.id,) + totals[addon.id] for addon in addons]
+    _bulk_update_addons(addons, ['average_daily_downloads', 'total_downloads'],
+                        rows)
 
 
 def _change_last_updated(next):
@@ -343,24 +365,33 @@ def deliver_hotness():
     one_week = now - timedelta(days=7)
     four_weeks = now - timedelta(days=28)
     for ids in chunked(all_ids, 300):
-        addons = Addon.uncached.filter(id__in=ids).no_transforms()
+        addons = list(Addon.uncached.filter(id__in=ids).no_transforms())
         ids = [a.id for a in addons if a.id not in frozen]
         qs = (UpdateCount.objects.filter(addon__in=ids)
               .values_list('addon').annotate(Avg('count')))
         thisweek = dict(qs.filter(date__gte=one_week))
         threeweek = dict(qs.filter(date__range=(four_weeks, one_week)))
+        rows = []
         for addon in addons:
             this, three = thisweek.get(addon.id, 0), threeweek.get(addon.id, 0)
             if this > 1000 and three > 1:
-                addon.update(hotness=(this - three) / float(three))
+                rows.append((addon.id, (this - three) / float(three)))
             else:
-                addon.update(hotness=0)
-        # Let the database catch its breath.
-        time.sleep(10)
+                rows.append((addon.id, 0))
+        # One UPDATE per chunk, so there is no need to pause between them.
+        _bulk_update_addons(addons, ['hotness'], rows)
+
+
+# Shared with the worker processes of the recs cron.
+_recs = {}
+
+
+def _calc_recs(ids):
+    return list(recommend.top_similar(ids=ids, **_recs))
 
 
 @cronjobs.register
-def recs():
+def recs(processes=1):
     start = time.time()
     cursor = connections[multidb.get_slave()].cursor()
     cursor.execute("""
@@ -388,7 +419,17 @@ def recs():
     except Exception:
         log.error('Could not call ps', exc_info=True)
 
-    sim = recommend.similarity  # Locals are faster.
+    # Only add-ons sharing a collection get compared, through an index of
+    # {collection: [addon]}. The workers inherit it when they are forked.
+    index, by_size = recommend.build_index(addons)
+    _recs.update(items=addons, index=index, by_size=by_size, size=11)
+    recs_log.info('%.2fs (index) : %s collections' %
+                  ((time.time() - start), len(index)))
+
+    processes = int(processes)
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    imap = pool.imap_unordered if pool else itertools.imap
+
     sims, start, timers = {}, [time.time()], {'calc': [], 'sql': []}
 
     def write_recs():
@@ -403,17 +444,19 @@ def recs():
         timers['sql'].append(time.time() - calc)
         start[0] = time.time()
 
-    for idx, (addon, collections) in enumerate(addons.iteritems(), 1):
-        xs = [(other, sim(collections, cs))
-              for other, cs in addons.iteritems()]
-        # Sort by similarity and keep the top N.
-        others = sorted(xs, key=operator.itemgetter(1), reverse=True)
-        sims[addon] = [(k, v) for k, v in others[:11] if k != addon]
-
-        if idx % 50 == 0:
+    try:
+        for chunk in imap(_calc_recs, chunked(addons.keys(), 50)):
+            for addon, others in chunk:
+                sims[addon] = [(k, v) for k, v in others if k != addon]
             write_recs()
-    else:
-        write_recs()
+    finally:
+        _recs.clear()
+        if pool:
+            pool.close()
+            pool.join()
+
+    # Drop the cached scores and the recommendations made from them.
+    cache_ns_key('recs', increment=True)
 
     avg_len = sum(len(v) for v in addons.itervalues()) / float(len(addons))
     recs_log.info('%s addons: average length: %.2f' % (len(addons), avg_len))
@@ -466,30 +509,33 @@ def give_personas_versions():
         log.info('Gave versions to %s personas.' % cursor.rowcount)
 
 
+def _reindex(name, qs, index):
+    from . import tasks
+    indexer = BulkIndexer(name, qs.no_cache(), search, index,
+                          tasks.INDEX_TRANSFORMS,
+                          workers=settings.ES_REINDEX_WORKERS)
+    indexed, errors = indexer.run()
+    log.info('Reindexed %s %s in %s with %s errors.'
+             % (indexed, name, indexer.index, errors))
+
+
 @cronjobs.register
 def reindex_addons(index=None, aliased=True, addon_type=None):
-    from . import tasks
     # Make sure our mapping is up to date.
     search.setup_mapping(index, aliased)
-    ids = (Addon.objects.values_list('id', flat=True)
-           .filter(_current_version__isnull=False,
-                   status__in=amo.VALID_STATUSES,
-                   disabled_by_user=False))
+    qs = Addon.objects.filter(_current_version__isnull=False,
+                              status__in=amo.VALID_STATUSES,
+                              disabled_by_user=False)
     if addon_type:
-        ids = ids.filter(type=addon_type)
-    ts = [tasks.index_addons.subtask(args=[chunk], kwargs=dict(index=index))
-          for chunk in chunked(sorted(list(ids)), 150)]
-    TaskSet(ts).apply_async()
+        qs = qs.filter(type=addon_type)
+    _reindex('addons', qs, index)
 
 
 @cronjobs.register
 def reindex_apps(index=None, aliased=True):
     """Apps do get indexed by `reindex_addons`, but run this for apps only."""
-    from . import tasks
     search.setup_mapping(index, aliased)
-    ids = (Addon.objects.values_list('id', flat=True)
-           .filter(type=amo.ADDON_WEBAPP, status__in=amo.VALID_STATUSES,
-                   disabled_by_user=False))
-    ts = [tasks.index_addons.subtask(args=[chunk], kwargs=dict(index=index))
-          for chunk in chunked(sorted(list(ids)), 150)]
-    TaskSet(ts).apply_async()
+    qs = Addon.objects.filter(type=amo.ADDON_WEBAPP,
+                              status__in=amo.VALID_STATUSES,
+                              disabled_by_user=False)
+    _reindex('apps', qs, index)
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import array
 import collections
 import itertools
 import json
@@ -39,11 +40,13 @@ from files.models import File
 from market.models import AddonPremium, Price
 import mkt.constants
 from reviews.models import Review
+from services.compat_index import log_changed
 import sharing.utils as sharing
 from stats.models import AddonShareCountTotal
 from tags.models import Tag
 from translations.fields import (LinkifiedField, PurifiedField, save_signal,
                                  TranslatedField, Translation)
+from translations.models import rows_cache_key
 from translations.query import order_by_translation
 from users.models import UserForeignKey, UserProfile
 from versions.compare import version_int
@@ -818,6 +821,8 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
         key = cache_ns_key('d2c-versions:%s' % self.id, increment=True)
         log.info('Incrementing d2c-versions namespace for add-on [%s]: %s' % (
                  self.id, key))
+        # The update service reloads it in its compat index.
+        log_changed([self.id])
 
     @property
     def current_version(self):
@@ -951,6 +956,8 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
             version.addon = addon
 
         # Attach listed authors.
+        for addon in addons:
+            addon.listed_authors = []
         q = (UserProfile.objects.no_cache()
              .filter(addons__in=addons, addonuser__listed=True)
              .extra(select={'addon_id': 'addons_users.addon_id',
@@ -1324,10 +1331,11 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
     def remove_locale(self, locale):
         """NULLify strings in this locale for the add-on and versions."""
         for o in itertools.chain([self], self.versions.all()):
-            ids = [getattr(o, f.attname) for f in o._meta.translated_fields]
-            qs = Translation.objects.filter(id__in=filter(None, ids),
-                                            locale=locale)
+            ids = filter(None, [getattr(o, f.attname)
+                                for f in o._meta.translated_fields])
+            qs = Translation.objects.filter(id__in=ids, locale=locale)
             qs.update(localized_string=None, localized_string_clean=None)
+            cache.delete_many(map(rows_cache_key, ids))
 
     def app_perf_results(self):
         """Generator of (AppVersion, [list of perf results contexts]).
@@ -1634,6 +1642,16 @@ def watch_disabled(old_attr={}, new_attr={}, instance=None, sender=None, **kw):
             f.hide_disabled_file()
 
 
+@Addon.on_change
+def watch_d2c_versions(old_attr={}, new_attr={}, instance=None, sender=None,
+                       **kw):
+    """Invalidate the compatible versions when the add-on status changes."""
+    for field in ('status', 'disabled_by_user'):
+        if old_attr.get(field) != new_attr.get(field):
+            instance.invalidate_d2c_versions()
+            return
+
+
 def attach_devices(addons):
     addon_dict = dict((a.id, a) for a in addons if a.type == amo.ADDON_WEBAPP)
     devices = (AddonDeviceType.objects.filter(addon__in=addon_dict)
@@ -1845,6 +1863,17 @@ class Persona(caching.CachingMixin, models.Model):
         return self.addon.listed_authors
 
 
+@receiver(dbsignals.post_save, sender=Persona,
+          dispatch_uid='addons.persona.modified')
+def update_persona_modified(sender, instance, **kw):
+    """
+    The colours, images and author of a theme are on its persona, but the
+    theme update service and the image urls go by `Addon.modified`.
+    """
+    if not kw.get('raw') and not kw.get('created'):
+        instance.addon.update(modified=datetime.now())
+
+
 class AddonCategory(caching.CachingMixin, models.Model):
     addon = models.ForeignKey(Addon)
     category = models.ForeignKey('Category')
@@ -1883,11 +1912,32 @@ class AddonRecommendation(models.Model):
     @classmethod
     def scores(cls, addon_ids):
         """Get a mapping of {addon: {other_addon: score}} for each add-on."""
-        d = {}
-        q = (AddonRecommendation.objects.filter(addon__in=addon_ids)
-             .values('addon', 'other_addon', 'score'))
-        for addon, rows in sorted_groupby(q, key=lambda x: x['addon']):
-            d[addon] = dict((r['other_addon'], r['score']) for r in rows)
+        return dict((addon, dict(zip(*arrays))) for addon, arrays
+                    in cls.score_arrays(addon_ids).items() if arrays[0])
+
+    @classmethod
+    def score_arrays(cls, addon_ids):
+        """
+        Get a mapping of {addon: (other_addons, scores)} for each add-on, as
+        two arrays. They are cached until the recs cron writes new scores.
+        """
+        ns = cache_ns_key('recs')
+        keys = dict(('%s:scores:%s' % (ns, addon), addon)
+                    for addon in addon_ids)
+        cached = cache.get_many(keys.keys())
+        d = dict((keys[key], arrays) for key, arrays in cached.items())
+        missing = set(addon_ids) - set(d)
+        if missing:
+            q = (AddonRecommendation.objects.filter(addon__in=missing)
+                 .values_list('addon', 'other_addon', 'score'))
+            for addon in missing:
+                d[addon] = (array.array('l'), array.array('d'))
+            for addon, other, score in q:
+                d[addon][0].append(other)
+                d[addon][1].append(score)
+            cache.set_many(dict(('%s:scores:%s' % (ns, addon), d[addon])
+                                for addon in missing),
+                           settings.RECS_CACHE_TIMEOUT)
         return d
 
 
@@ -3,7 +3,6 @@ from operator import attrgetter
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Count
 
 import pyes.exceptions as pyes
 
@@ -13,7 +12,6 @@ from addons.models import Persona
 from amo.utils import create_es_index_if_missing
 from bandwagon.models import Collection
 from compat.models import AppCompat
-from stats.models import ClientData
 from users.models import UserProfile
 from versions.compare import version_int
 
@@ -28,11 +26,52 @@ log = logging.getLogger('z.es')
 
 def extract(addon):
     """Extract indexable attributes from an add-on."""
+    return extract_many([addon])[0]
+
+
+def _analyzers():
+    """The analyzers we index the translated fields with."""
+    return [analyzer for analyzer in amo.SEARCH_ANALYZER_MAP
+            if settings.ES_USE_PLUGINS or
+            analyzer not in amo.SEARCH_ANALYZER_PLUGINS]
+
+
+def _analyzed_strings(strings, analyzers):
+    """
+    Group the (locale, string) pairs of a translated field by the analyzer
+    of their locale, in one pass.
+    """
+    grouped = dict((analyzer, set()) for analyzer in analyzers)
+    for locale, string in strings:
+        analyzer = amo.SEARCH_LANGUAGE_TO_ANALYZER.get(locale.lower())
+        if analyzer in grouped:
+            grouped[analyzer].add(string)
+    return grouped
+
+
+def extract_many(addons):
+    """
+    Extract indexable attributes from a list of add-ons, which should have
+    been run through `Addon.transformer` and `attach_trans_dict`. Installs
+    and regional popularity of the apps are fetched once for all of them.
+    """
+    analyzers = _analyzers()
+    app_ids = [a.id for a in addons if a.type == amo.ADDON_WEBAPP]
+    installs, regions = (Installed.popularity(app_ids) if app_ids
+                         else ({}, {}))
+    return [_extract(addon, analyzers, installs, regions) for addon in addons]
+
+
+def _extract(addon, analyzers, installs, regions):
     attrs = ('id', 'slug', 'app_slug', 'created', 'last_updated',
              'weekly_downloads', 'bayesian_rating', 'average_daily_users',
-             'status', 'type', 'hotness', 'is_disabled', 'premium_type',
-             'uses_flash')
+             'status', 'type', 'hotness', 'is_disabled', 'premium_type')
     d = dict(zip(attrs, attrgetter(*attrs)(addon)))
+    # Same as `addon.uses_flash`, from the files attached to the version.
+    version = addon.current_version
+    files = sorted(version.all_files if version else [],
+                   key=attrgetter('created'), reverse=True)
+    d['uses_flash'] = files[0].uses_flash if files else False
     # Coerce the Translation into a string.
     d['name_sort'] = unicode(addon.name).lower()
     translations = addon.translations
@@ -47,9 +86,8 @@ def extract(addon):
     d['category'] = getattr(addon, 'category_ids', [])
     d['tags'] = getattr(addon, 'tag_list', [])
     d['price'] = getattr(addon, 'price', 0.0)
-    if addon.current_version:
-        d['platforms'] = [p.id for p in
-                          addon.current_version.supported_platforms]
+    if version:
+        d['platforms'] = [p.id for p in version.supported_platforms]
     d['appversion'] = {}
     for app, appver in addon.compatible_apps.items():
         if appver:
@@ -74,22 +112,19 @@ def extract(addon):
             # The addon won't have a persona while it's being created.
             pass
     elif addon.type == amo.ADDON_WEBAPP:
-        installed_ids = list(Installed.objects.filter(addon=addon)
-                             .values_list('id', flat=True))
-        d['popularity'] = d['_boost'] = len(installed_ids)
+        installed = installs[addon.id]
+        d['popularity'] = d['_boost'] = installed
 
         # Calculate regional popularity for "mature regions"
         # (installs + reviews/installs from that region).
-        installs = dict(ClientData.objects.filter(installed__in=installed_ids)
-                        .annotate(region_counts=Count('region'))
-                        .values_list('region', 'region_counts').distinct())
+        counts = regions.get(addon.id, {})
         for region in mkt.regions.ALL_REGION_IDS:
-            cnt = installs.get(region, 0)
+            cnt = counts.get(region, 0)
             if cnt:
                 # Magic number (like all other scores up in this piece).
                 d['popularity_%s' % region] = d['popularity'] + cnt * 10
             else:
-                d['popularity_%s' % region] = len(installed_ids)
+                d['popularity_%s' % region] = installed
             d['_boost'] += cnt * 10
         d['app_type'] = (amo.ADDON_WEBAPP_PACKAGED if addon.is_packaged else
                          amo.ADDON_WEBAPP_HOSTED)
@@ -104,20 +139,11 @@ def extract(addon):
 
     # Indices for each language. languages is a list of locales we want to
     # index with analyzer if the string's locale matches.
-    for analyzer, languages in amo.SEARCH_ANALYZER_MAP.iteritems():
-        if (not settings.ES_USE_PLUGINS and
-            analyzer in amo.SEARCH_ANALYZER_PLUGINS):
-            continue
-
-        d['name_' + analyzer] = list(
-            set(string for locale, string in translations[addon.name_id]
-                if locale.lower() in languages))
-        d['summary_' + analyzer] = list(
-            set(string for locale, string in translations[addon.summary_id]
-                if locale.lower() in languages))
-        d['description_' + analyzer] = list(
-            set(string for locale, string in translations[addon.description_id]
-                if locale.lower() in languages))
+    for field in ('name', 'summary', 'description'):
+        strings = translations[getattr(addon, field + '_id')]
+        for analyzer, values in _analyzed_strings(strings,
+                                                  analyzers).items():
+            d['%s_%s' % (field, analyzer)] = list(values)
 
     return d
 
@@ -1,3 +1,5 @@
+from __future__ import absolute_import
+
 import hashlib
 import logging
 import os
@@ -16,6 +18,8 @@ from amo.decorators import set_modified_on, write
 from amo.storage_utils import rm_stored_dir
 from amo.utils import cache_ns_key, ImageCheck, LocalFileStorage
 from lib.es.utils import index_objects
+from search import suggestions
+from services.compat_index import log_changed
 from versions.models import Version
 
 # pulling tasks from cron
@@ -27,6 +31,11 @@ from .models import (Addon, attach_categories, attach_devices, attach_prices,
 
 log = logging.getLogger('z.task')
 
+# Transforms attaching what `search.extract_many` needs to a queryset of
+# add-ons.
+INDEX_TRANSFORMS = (Addon.transformer, attach_categories, attach_devices,
+                    attach_prices, attach_tags, attach_translations)
+
 
 @task
 @write
@@ -109,9 +118,11 @@ def delete_preview_files(id, **kw):
 @task(acks_late=True)
 def index_addons(ids, **kw):
     log.info('Indexing addons %s-%s. [%s]' % (ids[0], ids[-1], len(ids)))
-    transforms = (attach_categories, attach_devices, attach_prices,
-                  attach_tags, attach_translations)
-    index_objects(ids, Addon, search, kw.pop('index', None), transforms)
+    index = kw.pop('index', None)
+    index_objects(ids, Addon, search, index, INDEX_TRANSFORMS)
+    # A new index is being built, the suggestions are rebuilt by their cron.
+    if not index:
+        suggestions.update(ids)
 
 
 @task
@@ -119,6 +130,7 @@ def unindex_addons(ids, **kw):
     for addon in ids:
         log.info('Removing addon [%s] from search index.' % addon)
         Addon.unindex(addon)
+    suggestions.remove(ids)
 
 
 @task
@@ -266,6 +278,7 @@ def update_incompatible_appversions(data, **kw):
     # Increment namespace cache of compat versions.
     for addon_id in addon_ids:
         cache_ns_key('d2c-versions:%s' % addon_id, increment=True)
+    log_changed(addon_ids)
 
 
 def make_checksum(header_path, footer_path):
@@ -247,6 +247,49 @@ class AvgDailyUserCountTestCase(amo.tests.TestCase):
         eq_(addon.average_daily_users, 1234)
 
 
+class TestBulkUpdates(amo.tests.TestCase):
+    fixtures = ['base/addon_3615', 'base/addon_5299_gcal']
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_adu(self, index):
+        cron._update_addon_average_daily_users([(3615, 1234), (5299, 12),
+                                                (999999, 1)])
+        eq_(Addon.objects.get(pk=3615).average_daily_users, 1234)
+        eq_(Addon.objects.get(pk=5299).average_daily_users, 12)
+        eq_(index.call_count, 1)
+        eq_(sorted(index.call_args[0][0]), [3615, 5299])
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_download_totals(self, index):
+        cron._update_addon_download_totals([(3615, 12, 1000),
+                                            (5299, 3, 30),
+                                            (999999, 1, 1)])
+        addon = Addon.objects.get(pk=3615)
+        eq_(addon.average_daily_downloads, 12)
+        eq_(addon.total_downloads, 1000)
+        eq_(Addon.objects.get(pk=5299).total_downloads, 30)
+        eq_(index.call_count, 1)
+        eq_(sorted(index.call_args[0][0]), [3615, 5299])
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_no_addons(self, index):
+        cron._update_addon_download_totals([(999999, 1, 1)])
+        assert not index.called
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_hotness(self, index):
+        Addon.objects.filter(pk=5299).update(hotness=12)
+        today = datetime.date.today()
+        for days, count in ((1, 3000), (10, 1000)):
+            UpdateCount.objects.create(
+                addon_id=3615, count=count,
+                date=today - datetime.timedelta(days=days))
+        cron.deliver_hotness()
+        eq_(Addon.objects.get(pk=3615).hotness, 2)
+        eq_(Addon.objects.get(pk=5299).hotness, 0)
+        eq_(index.call_count, 1)
+
+
 class TestReindex(amo.tests.ESTestCase):
 
     @mock.patch('addons.models.update_search_index', new=mock.Mock)
@@ -25,6 +25,7 @@ import amo.tests
 from amo import set_user
 from amo.helpers import absolutify
 from amo.signals import _connect, _disconnect
+from amo.utils import cache_ns_key
 from addons.models import (Addon, AddonCategory, AddonDependency,
                            AddonDeviceType, AddonRecommendation, AddonType,
                            AddonUpsell, AddonUser, AppSupport, BlacklistedGuid,
@@ -1436,8 +1437,17 @@ class TestPersonaModel(amo.tests.TestCase):
         self.persona.header = 'header.png'
         self.persona.footer = 'footer.png'
         self.persona.save()
-        modified = int(time.mktime(self.persona.addon.modified.timetuple()))
-        self.p = lambda fn: '/15663/%s?%s' % (fn, modified)
+        # Saving the persona moves `modified`, see `update_persona_modified`.
+        modified = lambda: int(time.mktime(
+            self.persona.addon.modified.timetuple()))
+        self.p = lambda fn: '/15663/%s?%s' % (fn, modified())
+
+    def test_save_modified(self):
+        self.addon.update(modified=datetime(2013, 1, 1))
+        self.persona = Persona.objects.get(addon=self.addon)
+        self.persona.accentcolor = '123456'
+        self.persona.save()
+        assert Addon.objects.get(id=15663).modified > datetime(2013, 1, 1)
 
     def test_image_urls(self):
         # AMO-uploaded themes have `persona_id=0`.
@@ -1543,6 +1553,16 @@ class TestAddonRecommendations(amo.tests.TestCase):
             for rec in recs:
                 eq_(scores[addon][rec.other_addon_id], rec.score)
 
+    def test_scores_cached(self):
+        ids = [5299, 1843]
+        scores = AddonRecommendation.scores(ids)
+        assert scores
+        AddonRecommendation.objects.all().delete()
+        eq_(AddonRecommendation.scores(ids), scores)
+        # The recs cron drops them when it's done.
+        cache_ns_key('recs', increment=True)
+        eq_(AddonRecommendation.scores(ids), {})
+
 
 class TestAddonDependencies(amo.tests.TestCase):
     fixtures = ['base/apps',
@@ -1,9 +1,16 @@
+# -*- coding: utf-8 -*-
 from nose.tools import eq_
 
 import amo.tests
 from addons.models import (Addon, attach_categories, attach_devices,
                            attach_prices, attach_tags, attach_translations)
-from addons.search import extract
+from addons.search import extract, extract_many
+from stats.models import ClientData
+from translations.models import Translation
+from users.models import UserProfile
+
+import mkt
+from mkt.webapps.models import Installed
 
 
 class TestExtract(amo.tests.TestCase):
@@ -17,14 +24,46 @@ class TestExtract(amo.tests.TestCase):
         self.transforms = (attach_categories, attach_devices, attach_prices,
                            attach_tags, attach_translations)
 
-    def _extract(self):
-        qs = Addon.objects.filter(id__in=[3615])
+    def _addons(self, ids):
+        qs = Addon.objects.filter(id__in=ids).order_by('id')
         for t in self.transforms:
             qs = qs.transform(t)
-        self.addon = list(qs)[0]
+        return list(qs)
+
+    def _extract(self):
+        self.addon = self._addons([3615])[0]
         return extract(self.addon)
 
     def test_extract_attributes(self):
         extracted = self._extract()
         for attr in self.attrs:
             eq_(extracted[attr], getattr(self.addon, attr))
+
+    def test_extract_analyzers(self):
+        Translation.objects.create(id=Addon.objects.get(id=3615).name_id,
+                                   locale='fr', localized_string=u'Délicieux')
+        extracted = self._extract()
+        eq_(extracted['name_french'], [u'Délicieux'])
+        eq_(extracted['name_english'], [u'Delicious Bookmarks'])
+        eq_(extracted['name_german'], [])
+        eq_(sorted(extracted['name']), [u'Delicious Bookmarks', u'Délicieux'])
+
+    def test_extract_many(self):
+        app = amo.tests.app_factory()
+        user = UserProfile.objects.get(pk=999)
+        for region in (mkt.regions.BR.id, mkt.regions.BR.id, None):
+            client = ClientData.objects.create(region=region,
+                                               is_chromeless=False)
+            Installed.objects.create(addon=app, user=user,
+                                     client_data=client)
+
+        addons = self._addons([3615, app.id])
+        with self.assertNumQueries(1):
+            docs = extract_many(addons)
+        eq_(docs, [extract(addon) for addon in addons])
+
+        doc = docs[1]
+        eq_(doc['popularity'], 3)
+        eq_(doc['popularity_%s' % mkt.regions.BR.id], 13)
+        eq_(doc['popularity_%s' % mkt.regions.US.id], 3)
+        eq_(doc['_boost'], 3 + 10)
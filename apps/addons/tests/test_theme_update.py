@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 import json
 from StringIO import StringIO
+from wsgiref.handlers import format_date_time
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connection
 
 import mock
@@ -137,3 +139,74 @@ class TestThemeUpdate(amo.tests.TestCase):
 
         self.check_good(
             json.loads(self.get_update('en-US', 813, 'src=gp').get_json()))
+
+
+@mock.patch('services.theme_update.mypool', mock.Mock())
+class TestThemeUpdateCache(amo.tests.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(theme_update.settings,
+                                    'SERVICES_THEME_UPDATE_CACHE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_update(self, modified=1000, *args):
+        update = theme_update.ThemeUpdate(*(args or ('en-US', 15663)))
+        update.data['modified'] = modified
+        return update
+
+    def test_is_modified_since(self):
+        update = self.get_update()
+        assert not update.is_modified_since(format_date_time(1000))
+        assert not update.is_modified_since(format_date_time(2000))
+        assert update.is_modified_since(format_date_time(999))
+        assert update.is_modified_since('yesterday')
+
+    @mock.patch.object(theme_update.ThemeUpdate, 'build_json')
+    def test_get_json_cached(self, build_json):
+        build_json.return_value = '{"id": "15663"}'
+        eq_(self.get_update().get_json(), '{"id": "15663"}')
+        eq_(self.get_update().get_json(), '{"id": "15663"}')
+        eq_(build_json.call_count, 1)
+
+        # Another locale or `src=gp` is another response.
+        self.get_update(1000, 'fr', 15663).get_json()
+        self.get_update(1000, 'en-US', 15663, 'src=gp').get_json()
+        eq_(build_json.call_count, 3)
+
+        # The theme was modified since it was cached.
+        build_json.return_value = '{"id": "15663", "version": "1"}'
+        eq_(self.get_update(1001).get_json(),
+            '{"id": "15663", "version": "1"}')
+        eq_(build_json.call_count, 4)
+
+    @mock.patch.object(theme_update.ThemeUpdate, 'build_json')
+    def test_get_json_not_found(self, build_json):
+        eq_(self.get_update(None).get_json(), None)
+        assert not build_json.called
+
+    def test_base64_icon_cached(self):
+        update = self.get_update()
+        update.data['row'] = {'addon_id': 15663, 'persona_id': 0,
+                              'modified': 1000}
+        with mock.patch('__builtin__.open', mock.mock_open(read_data='icon'),
+                        create=True) as open_:
+            eq_(update.base64_icon(15663), 'aWNvbg==')
+            eq_(update.base64_icon(15663), 'aWNvbg==')
+        eq_(open_.call_count, 1)
+
+    def test_wsgi_not_modified(self):
+        environ = {'wsgi.input': StringIO(),
+                   'PATH_INFO': '/en-US/themes/update-check/15663',
+                   'HTTP_IF_MODIFIED_SINCE': format_date_time(1000)}
+        start_response = mock.Mock()
+        cursor = theme_update.mypool.connect.return_value.cursor.return_value
+        cursor.fetchone.return_value = (1000,)
+        with mock.patch.object(theme_update.ThemeUpdate,
+                               'get_json') as get_json:
+            eq_(theme_update.application(environ, start_response), [''])
+        assert not get_json.called
+        start_response.assert_called_with('304 Not Modified', mock.ANY)
+        headers = dict(start_response.call_args[0][1])
+        eq_(headers['Last-Modified'], format_date_time(1000))
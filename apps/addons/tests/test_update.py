@@ -2,8 +2,10 @@
 from datetime import datetime, timedelta
 from email import utils
 
+from django.core.cache import cache
 from django.db import connection
 
+import mock
 from nose.tools import eq_
 
 import amo
@@ -13,6 +15,8 @@ from addons.models import (Addon, CompatOverride, CompatOverrideRange,
 from applications.models import Application, AppVersion
 from files.models import File
 from services import update
+from services import compat_index
+from services.compat_index import CompatIndex
 import settings_local
 from versions.models import ApplicationsVersions, Version
 
@@ -793,3 +797,296 @@ class TestResponse(amo.tests.TestCase):
         data['appVersion'] = '5.0.1'
         upd = self.get(data)
         eq_(upd.get_rdf(), upd.get_no_updates_rdf())
+
+
+class IndexMixin(object):
+    """Answer the lookups from a freshly loaded compat index."""
+
+    def setUp(self):
+        super(IndexMixin, self).setUp()
+        self.old_index = update.compat_index
+        settings_local.SERVICES_UPDATE_INDEX = True
+
+    def tearDown(self):
+        update.compat_index = self.old_index
+        settings_local.SERVICES_UPDATE_INDEX = False
+        super(IndexMixin, self).tearDown()
+
+    def get(self, *args, **kw):
+        update.compat_index = CompatIndex()
+        update.compat_index.load(connection.cursor())
+        return super(IndexMixin, self).get(*args, **kw)
+
+
+class TestDefaultToCompatIndex(IndexMixin, TestDefaultToCompat):
+    """The index must give the same answers as the SQL queries."""
+
+
+class TestResponseIndex(IndexMixin, TestResponse):
+    """The index must give the same answers as the SQL queries."""
+
+
+class TestCompatIndex(amo.tests.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        self.index = CompatIndex()
+        self.index.load(connection.cursor())
+        self.guid = '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}'
+
+    def candidates(self):
+        return self.index.get_addon(self.guid)['apps'][amo.FIREFOX.id]
+
+    def test_load(self):
+        addon = self.index.get_addon(self.guid)
+        eq_(addon['id'], 3615)
+        eq_([c['file_id'] for c in self.candidates()], [67442])
+
+    def test_inactive(self):
+        Addon.objects.get(pk=3615).update(disabled_by_user=True)
+        self.index.refresh(connection.cursor(), force=True)
+        eq_(self.index.get_addon(self.guid), None)
+
+    def test_refresh(self):
+        File.objects.get(pk=67442).update(status=amo.STATUS_DISABLED)
+        eq_(self.candidates()[0]['file_status'], amo.STATUS_PUBLIC)
+        self.index.refresh(connection.cursor(), force=True)
+        eq_(self.candidates()[0]['file_status'], amo.STATUS_DISABLED)
+
+    def test_refresh_deleted(self):
+        Addon.objects.get(pk=3615).update(status=amo.STATUS_DELETED)
+        self.index.refresh(connection.cursor(), force=True)
+        eq_(self.index.get_addon(self.guid), None)
+        eq_(self.index.addons, {})
+
+    def test_refresh_logged(self):
+        # A queryset update skips the hooks, so the change isn't logged.
+        File.objects.filter(pk=67442).update(status=amo.STATUS_DISABLED)
+        self.index.refresh(connection.cursor(), force=True)
+        eq_(self.candidates()[0]['file_status'], amo.STATUS_PUBLIC)
+        compat_index.log_changed([3615])
+        self.index.refresh(connection.cursor(), force=True)
+        eq_(self.candidates()[0]['file_status'], amo.STATUS_DISABLED)
+
+    def test_refresh_log_missing(self):
+        compat_index.log_changed([3615])
+        seq = cache.get(compat_index.CHANGED_SEQ)
+        cache.delete(compat_index.CHANGED_KEY % seq)
+        with mock.patch.object(self.index, 'reload') as reload:
+            self.index.refresh(connection.cursor(), force=True)
+        assert reload.called
+        assert not self.index.ready
+
+    def test_refresh_log_too_long(self):
+        compat_index.log_changed([3615] * (compat_index.CHANGED_MAX + 1))
+        with mock.patch.object(self.index, 'reload') as reload:
+            self.index.refresh(connection.cursor(), force=True)
+        assert reload.called
+        assert not self.index.ready
+
+    def test_refresh_log_unwritten(self):
+        compat_index.log_changed([3615])
+        # A change taken by another writer but not written yet.
+        cache.incr(compat_index.CHANGED_NEXT)
+        compat_index.log_changed([5299])
+        eq_(compat_index.get_changed(0), (set([3615]), 1))
+        cache.set(compat_index.CHANGED_KEY % 2, 1843)
+        cache.incr(compat_index.CHANGED_SEQ)
+        eq_(compat_index.get_changed(1), (set([1843, 5299]), 3))
+
+    def test_refresh_full_interval(self):
+        self.index.loaded = 0
+        File.objects.get(pk=67442).update(status=amo.STATUS_DISABLED)
+        with mock.patch.object(self.index, 'reload') as reload:
+            self.index.refresh(connection.cursor(), force=True)
+        assert reload.called
+        eq_(self.candidates()[0]['file_status'], amo.STATUS_DISABLED)
+
+    def test_refresh_not_loaded(self):
+        index = CompatIndex()
+        with mock.patch.object(index, 'reload') as reload:
+            index.refresh(connection.cursor())
+        assert reload.called
+        assert not index.ready
+        eq_(index.get_addon(self.guid), None)
+
+    def test_reload(self):
+        conn = mock.Mock()
+        conn.cursor.return_value = connection.cursor()
+        index = CompatIndex(connect=lambda: conn)
+        with mock.patch('services.compat_index.threading.Thread') as thread:
+            index.reload()
+            index.reload()
+        eq_(thread.call_count, 1)
+        thread.call_args[1]['target']()
+        eq_(index.get_addon(self.guid)['id'], 3615)
+        assert conn.close.called
+        assert not index.loading
+
+    def test_refresh_interval(self):
+        File.objects.get(pk=67442).update(status=amo.STATUS_DISABLED)
+        self.index.refresh(connection.cursor())
+        eq_(self.candidates()[0]['file_status'], amo.STATUS_PUBLIC)
+
+    def test_index_disabled(self):
+        up = update.Update({'id': self.guid, 'version': '2.0.58',
+                            'reqVersion': 1, 'appVersion': '3.7a1pre',
+                            'appID': amo.FIREFOX.guid})
+        up.cursor = connection.cursor()
+        eq_(up.get_index(), None)
+
+
+class TestResponseCache(amo.tests.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        cache.clear()
+        self.addon = Addon.objects.get(pk=3615)
+        self.data = {
+            'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
+            'version': '2.0.58',
+            'reqVersion': 1,
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+        settings_local.SERVICES_UPDATE_CACHE = True
+
+    def tearDown(self):
+        settings_local.SERVICES_UPDATE_CACHE = False
+        super(TestResponseCache, self).tearDown()
+
+    def get(self, data=None):
+        up = update.Update(data or self.data)
+        up.cursor = connection.cursor()
+        return up
+
+    def test_cached(self):
+        rdf = self.get().get_rdf()
+        with mock.patch.object(update.Update, 'get_update') as get_update:
+            eq_(self.get().get_rdf(), rdf)
+            assert not get_update.called
+
+    def test_different_query(self):
+        self.get().get_rdf()
+        data = dict(self.data, appVersion='5.0.1')
+        up = self.get(data)
+        eq_(up.get_rdf(), up.get_no_updates_rdf())
+
+    def test_invalidated(self):
+        self.get().get_rdf()
+        self.addon.invalidate_d2c_versions()
+        with mock.patch.object(update.Update, 'get_update') as get_update:
+            get_update.return_value = False
+            up = self.get()
+            eq_(up.get_rdf(), up.get_no_updates_rdf())
+
+    def test_invalidated_by_status(self):
+        up = self.get()
+        up.is_valid()
+        key = up.get_cache_key()
+        self.addon.update(status=amo.STATUS_LITE)
+        up = self.get()
+        up.is_valid()
+        assert up.get_cache_key() != key
+
+    def test_invalidated_by_file(self):
+        up = self.get()
+        up.is_valid()
+        key = up.get_cache_key()
+        File.objects.get(pk=67442).update(hash='sha256:abc')
+        up = self.get()
+        up.is_valid()
+        assert up.get_cache_key() != key
+
+    def test_beta_version(self):
+        up = self.get()
+        up.is_valid()
+        key = up.get_cache_key()
+        up = self.get(dict(self.data, version='2.0.58'))
+        up.is_valid()
+        eq_(up.get_cache_key(), key)
+        up = self.get(dict(self.data, version='2.0.59b1'))
+        up.is_valid()
+        assert up.get_cache_key() != key
+
+    def test_timeout_mirror_delay(self):
+        up = self.get()
+        up.is_valid()
+        up.get_update()
+        eq_(up.get_cache_timeout(),
+            settings_local.SERVICES_UPDATE_CACHE_TIMEOUT)
+
+        File.objects.get(pk=67442).update(datestatuschanged=datetime.now())
+        up = self.get()
+        up.is_valid()
+        up.get_update()
+        assert up.get_cache_timeout() <= settings_local.MIRROR_DELAY * 60
+
+
+class TestBatchResponse(amo.tests.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms',
+                'base/seamonkey']
+
+    def setUp(self):
+        self.data = {
+            'reqVersion': 1,
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+        self.guid = '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}'
+
+    def get(self, items, data=None):
+        up = update.BatchUpdate(data or self.data, items)
+        up.cursor = connection.cursor()
+        return up
+
+    def get_single(self, guid, version, data=None):
+        up = update.Update(dict(data or self.data, id=guid, version=version))
+        up.cursor = connection.cursor()
+        return up.get_rdf()
+
+    def test_no_items(self):
+        up = self.get([])
+        eq_(up.get_rdf(), up.get_bad_rdf())
+
+    def test_bad_app(self):
+        up = self.get([(self.guid, '2.0.58')],
+                      dict(self.data, appID='garbage'))
+        eq_(up.get_rdf(), up.get_bad_rdf())
+
+    def test_single(self):
+        eq_(self.get([(self.guid, '2.0.58')]).get_rdf(),
+            self.get_single(self.guid, '2.0.58'))
+
+    def test_no_updates(self):
+        data = dict(self.data, appVersion='5.0.1')
+        eq_(self.get([(self.guid, '2.0.58')], data).get_rdf(),
+            self.get_single(self.guid, '2.0.58', data))
+
+    def test_skips_bad_guid(self):
+        rdf = self.get([('garbage', '1.0'), (self.guid, '2.0.58')]).get_rdf()
+        eq_(rdf, self.get_single(self.guid, '2.0.58'))
+
+    def test_multiple(self):
+        sea_monkey = 'bettergmail2@ginatrapani.org'
+        rdf = self.get([(self.guid, '2.0.58'), (sea_monkey, '1')]).get_rdf()
+        assert ':%s:' % self.guid in rdf
+        assert ':%s"' % sea_monkey in rdf
+        eq_(rdf.count('<?xml'), 1)
+
+    def test_num_queries(self):
+        with self.assertNumQueries(4):
+            self.get([(self.guid, '2.0.58')]).get_rdf()
+        with self.assertNumQueries(4):
+            self.get([(self.guid, '2.0.58'),
+                      ('bettergmail2@ginatrapani.org', '1'),
+                      ('garbage', '1.0')]).get_rdf()
+
+    def test_batch_size(self):
+        with mock.patch.object(settings_local, 'SERVICES_UPDATE_BATCH_SIZE',
+                               1):
+            up = self.get([(self.guid, '2.0.58'), ('garbage', '1.0')])
+        eq_(len(up.items), 1)
@@ -1,7 +1,11 @@
+import hashlib
+import json
 import logging
+import time
 from operator import itemgetter
 
 from django.conf import settings as dj_settings
+from django.core.cache import cache
 
 from django_statsd.clients import statsd
 from elasticutils import S as EU_S
@@ -75,7 +79,57 @@ def get_es(hosts=None, default_indexes=None, timeout=None, dump_curl=None,
     return es
 
 
+def query_cache_key(qs, index, doc_type):
+    """The cache key of the results of `qs`, the same for equal queries."""
+    query = json.dumps([index, doc_type, qs], sort_keys=True, default=unicode)
+    return 'es:query:%s' % hashlib.md5(query).hexdigest()
+
+
+def cached_search(key, timeout, search):
+    """
+    Return the results of `search()`, cached under `key` for `timeout`
+    seconds.
+
+    Expired results are kept for another `ES_QUERY_CACHE_STALE` seconds: the
+    worker that takes the lock refreshes them while the others keep serving
+    the stale copy. On a cold miss, the workers that don't get the lock wait
+    for the one that did instead of all sending the same query to ES.
+    """
+    wait = getattr(dj_settings, 'ES_TIMEOUT', DEFAULT_TIMEOUT)
+    lock = key + ':lock'
+    entry = cache.get(key)
+    if entry is not None:
+        expires, hits = entry
+        if time.time() < expires:
+            statsd.incr('search.es.cache.hit')
+            return hits
+        if not cache.add(lock, 1, wait):
+            statsd.incr('search.es.cache.stale')
+            return hits
+    elif not cache.add(lock, 1, wait):
+        statsd.incr('search.es.cache.coalesced')
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+        # The worker holding the lock is taking too long, do it ourselves.
+        return search()
+
+    statsd.incr('search.es.cache.miss')
+    try:
+        # Store plain dicts, pyes wraps the results in its own classes.
+        hits = json.loads(json.dumps(search()))
+        cache.set(key, (time.time() + timeout, hits),
+                  timeout + dj_settings.ES_QUERY_CACHE_STALE)
+    finally:
+        cache.delete(lock)
+    return hits
+
+
 class ES(object):
+    cache_timeout = None
 
     def __init__(self, type_, index):
         self.type = type_
@@ -93,6 +147,13 @@ class ES(object):
             new.steps.append(next_step)
         new.start = self.start
         new.stop = self.stop
+        new.cache_timeout = self.cache_timeout
+        return new
+
+    def cache(self, timeout):
+        """Cache the results of this search for `timeout` seconds."""
+        new = self._clone()
+        new.cache_timeout = timeout
         return new
 
     def values(self, *fields):
@@ -258,6 +319,13 @@ class ES(object):
         return self._results_cache
 
     def raw(self):
+        if self.cache_timeout:
+            qs = self._build_query()
+            key = query_cache_key(qs, self.index, self.type._meta.db_table)
+            return cached_search(key, self.cache_timeout, self._raw)
+        return self._raw()
+
+    def _raw(self):
         qs = self._build_query()
         es = get_es()
         try:
@@ -339,6 +407,26 @@ class ObjectSearchResults(SearchResults):
 class TempS(EU_S):
     # Temporary class override to mimic ElasticUtils v0.5 behavior.
     # TODO: Remove this when we've moved mkt to its own index.
+    cache_timeout = None
+
+    def _clone(self, next_step=None):
+        new = super(TempS, self)._clone(next_step)
+        new.cache_timeout = self.cache_timeout
+        return new
+
+    def cache(self, timeout):
+        """Cache the results of this search for `timeout` seconds."""
+        new = self._clone()
+        new.cache_timeout = timeout
+        return new
+
+    def raw(self):
+        raw = super(TempS, self).raw
+        if self.cache_timeout:
+            key = query_cache_key(self._build_query(), self.get_indexes(),
+                                  self.get_doctypes())
+            return cached_search(key, self.cache_timeout, raw)
+        return raw()
 
     def get_es(self, **kwargs):
         """Returns the pyelasticsearch ElasticSearch object to use.
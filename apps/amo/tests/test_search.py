@@ -1,4 +1,7 @@
+import time
+
 from django.core import paginator
+from django.core.cache import cache
 
 import mock
 from nose import SkipTest
@@ -48,6 +51,58 @@ class TestNoESIndexing(amo.tests.TestCase):
         assert issubclass(es.__class__, mock.Mock)
 
 
+class TestCachedSearch(amo.tests.TestCase):
+
+    def setUp(self):
+        self.search = mock.Mock(return_value={'took': 1, 'hits': {}})
+        self.key = amo.search.query_cache_key({'query': 1}, 'addons', 'x')
+
+    def cached(self):
+        return amo.search.cached_search(self.key, 60, self.search)
+
+    def test_key(self):
+        eq_(amo.search.query_cache_key({'a': 1, 'b': [1, 2]}, 'i', 't'),
+            amo.search.query_cache_key({'b': [1, 2], 'a': 1}, 'i', 't'))
+        assert self.key != amo.search.query_cache_key({'query': 1},
+                                                      'addons', 'y')
+
+    def test_hit(self):
+        eq_(self.cached(), {'took': 1, 'hits': {}})
+        eq_(self.cached(), {'took': 1, 'hits': {}})
+        eq_(self.search.call_count, 1)
+        assert not cache.get(self.key + ':lock')
+
+    def test_expired_refreshed(self):
+        cache.set(self.key, (time.time() - 1, 'stale'), 60)
+        eq_(self.cached(), {'took': 1, 'hits': {}})
+        eq_(self.search.call_count, 1)
+
+    def test_expired_served_stale_while_refreshing(self):
+        cache.set(self.key, (time.time() - 1, 'stale'), 60)
+        cache.add(self.key + ':lock', 1)
+        eq_(self.cached(), 'stale')
+        assert not self.search.called
+
+    @mock.patch('amo.search.time.sleep')
+    def test_coalesced(self, sleep):
+        cache.add(self.key + ':lock', 1)
+        sleep.side_effect = lambda s: cache.set(
+            self.key, (time.time() + 60, 'fresh'), 60)
+        eq_(self.cached(), 'fresh')
+        assert not self.search.called
+
+    @mock.patch('amo.search.ES._raw')
+    def test_es_cache(self, raw):
+        raw.return_value = {'took': 1, 'hits': {'total': 3}}
+        qs = Addon.search().filter(type=1).cache(60)
+        eq_(qs.filter(status=4).cache_timeout, 60)
+        eq_(qs.count(), 3)
+        eq_(qs.count(), 3)
+        eq_(raw.call_count, 1)
+        eq_(Addon.search().filter(type=1).count(), 3)
+        eq_(raw.call_count, 2)
+
+
 class TestES(amo.tests.ESTestCase):
     test_es = True
 
@@ -28,6 +28,7 @@ from django.core.files.storage import (FileSystemStorage,
                                        default_storage as storage)
 from django.core.serializers import json
 from django.core.validators import ValidationError, validate_slug
+from django.db import connections, transaction
 from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.forms.fields import Field
 from django.http import HttpRequest
@@ -55,6 +56,7 @@ import amo.search
 from amo import ADDON_ICON_SIZES
 from amo.urlresolvers import get_outgoing_url, reverse
 from translations.models import Translation
+from translations.transformer import LOCALE, STRING, get_translations
 from users.models import UserNotification
 from users.utils import UnsubscribeCode
 
@@ -336,6 +338,35 @@ def chunked(seq, n):
         yield rv
 
 
+def bulk_update(model, fields, rows, using='default'):
+    """
+    Update `fields` of many `model` rows with a single UPDATE statement.
+
+    `rows` is a list of (pk, value, value, ...) tuples, with a value for each
+    of `fields`. No signals are sent, so the caller is responsible for cache
+    invalidation and reindexing.
+
+    >>> bulk_update(Addon, ['hotness'], [(3615, 0.5), (5299, 0.1)])
+    """
+    if not rows:
+        return
+    opts = model._meta
+    pk = opts.pk.column
+    when = ' '.join(['WHEN %s THEN %s'] * len(rows))
+    sets, params = [], []
+    for idx, field in enumerate(fields, 1):
+        column = opts.get_field(field).column
+        sets.append('`%s` = CASE `%s` %s END' % (column, pk, when))
+        for row in rows:
+            params.extend([row[0], row[idx]])
+    params.extend(row[0] for row in rows)
+    sql = 'UPDATE `%s` SET %s WHERE `%s` IN (%s)' % (
+        opts.db_table, ', '.join(sets), pk, ','.join(['%s'] * len(rows)))
+    cursor = connections[using].cursor()
+    cursor.execute(sql, params)
+    transaction.commit_unless_managed(using=using)
+
+
 def urlencode(items):
     """A Unicode-safe URLencoder."""
     try:
@@ -978,12 +1009,11 @@ def attach_trans_dict(model, addons):
         ids.update((getattr(addon, field.attname, None), addon)
                    for field in fields)
     ids.pop(None, None)
-    qs = (Translation.objects
-          .filter(id__in=ids, localized_string__isnull=False)
-          .values_list('id', 'locale', 'localized_string'))
-    for id, translations in sorted_groupby(qs, lambda x: x[0]):
-        ids[id].translations[id] = [(locale, string)
-                                    for id, locale, string in translations]
+    for id, rows in get_translations(ids).items():
+        strings = [(row[LOCALE], row[STRING]) for row in rows
+                   if row[STRING] is not None]
+        if strings:
+            ids[id].translations[id] = strings
 
 
 def rm_local_tmp_dir(path):
@@ -0,0 +1,107 @@
+import atexit
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import IntegrityError
+from django.db.models import F
+
+import commonware.log
+
+from amo.utils import sorted_groupby
+
+log = commonware.log.getLogger('z.discovery')
+
+
+class SyncedCounts(object):
+    """
+    Collect the changes to the counts of SyncedCollections seen by the
+    discovery pane in memory, and write them together once there are `size`
+    of them or `interval` seconds have passed.
+
+    The buffer is flushed when a request has finished and when the process
+    exits. The counts are a sample to begin with, so those that can't be
+    written are logged and dropped.
+    """
+
+    def __init__(self, size, interval):
+        self.size = size
+        self.interval = interval
+        self.counts = collections.defaultdict(int)
+        self.addons = {}
+        self.pending = 0
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+
+    def add(self, index, addon_ids):
+        """Count one more user with the add-ons `addon_ids`, of `index`."""
+        with self.lock:
+            self.counts[index] += 1
+            self.addons[index] = addon_ids
+            self.pending += 1
+        if self.size <= 1:
+            self.flush()
+
+    def remove(self, index):
+        """Count one less user of the collection `index`."""
+        with self.lock:
+            self.counts[index] -= 1
+            self.pending += 1
+        if self.size <= 1:
+            self.flush()
+
+    def due(self):
+        return bool(self.pending) and (
+            self.pending >= self.size or
+            time.time() - self.last_flush >= self.interval)
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, collections.defaultdict(int)
+            addons, self.addons = self.addons, {}
+            self.pending = 0
+            self.last_flush = time.time()
+        if counts:
+            self.write(counts, addons)
+
+    def write(self, counts, addons):
+        from .models import SyncedCollection
+        qs = SyncedCollection.objects.no_cache()
+        existing = set(qs.filter(addon_index__in=counts.keys())
+                       .values_list('addon_index', flat=True))
+        for index, addon_ids in addons.items():
+            if index in existing or counts[index] <= 0:
+                continue
+            # There's a unique constraint on addon_index, so if another
+            # process created it since we looked we update it below.
+            try:
+                c = SyncedCollection.objects.create(addon_index=index,
+                                                    count=counts[index])
+                c.set_addons(addon_ids)
+                del counts[index]
+            except IntegrityError:
+                pass
+        changes = [(count, index) for index, count in counts.items() if count]
+        for count, rows in sorted_groupby(changes, key=lambda x: x[0]):
+            indexes = [index for _, index in rows]
+            try:
+                (qs.filter(addon_index__in=indexes)
+                 .update(count=F('count') + count))
+            except Exception, e:
+                log.error(u'Could not count %+d for %s synced collections '
+                          '(%s).' % (count, len(indexes), e))
+
+
+synced_counts = SyncedCounts(settings.SYNCED_COLLECTIONS_BUFFER_SIZE,
+                             settings.SYNCED_COLLECTIONS_BUFFER_INTERVAL)
+
+
+def flush_when_due(sender, **kw):
+    if synced_counts.due():
+        synced_counts.flush()
+
+
+request_finished.connect(flush_when_due, dispatch_uid='synced_counts_flush')
+atexit.register(synced_counts.flush)
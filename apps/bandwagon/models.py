@@ -1,10 +1,12 @@
 import collections
 import hashlib
+import heapq
 import os
 import re
 import time
 import uuid
 from datetime import datetime
+from operator import itemgetter
 
 from django.conf import settings
 from django.core.cache import cache
@@ -84,14 +86,19 @@ class CollectionBase:
 
     @classmethod
     def get_recs_from_ids(cls, addons, app, version, compat_mode='strict'):
-        vint = compare.version_int(version)
         recs = RecommendedCollection.build_recs(addons)
+        return recs, cls.get_recs_addons(recs, app, version, compat_mode)
+
+    @classmethod
+    def get_recs_addons(cls, recs, app, version, compat_mode='strict'):
+        """The public add-ons of `recs` that support `app` `version`."""
+        vint = compare.version_int(version)
         qs = (Addon.objects.public()
               .filter(id__in=recs, appsupport__app=app.id,
                       appsupport__min__lte=vint))
         if compat_mode == 'strict':
             qs = qs.filter(appsupport__max__gte=vint)
-        return recs, qs
+        return qs
 
 
 class Collection(CollectionBase, amo.models.ModelBase):
@@ -564,15 +571,23 @@ class RecommendedCollection(Collection):
         return super(RecommendedCollection, self).save(**kw)
 
     @classmethod
-    def build_recs(cls, addon_ids):
-        """Get the top ranking add-ons according to recommendation scores."""
+    def build_recs(cls, addon_ids, limit=None):
+        """
+        Get the top ranking add-ons according to recommendation scores, only
+        the `limit` best if it is given.
+        """
         scores = AddonRecommendation.scores(addon_ids)
         d = collections.defaultdict(int)
         for others in scores.values():
             for addon, score in others.items():
                 d[addon] += score
-        addons = sorted(d.items(), key=lambda x: x[1], reverse=True)
-        return [addon for addon, score in addons if addon not in addon_ids]
+        for addon in addon_ids:
+            d.pop(addon, None)
+        if limit is None:
+            addons = sorted(d.items(), key=itemgetter(1), reverse=True)
+        else:
+            addons = heapq.nlargest(limit, d.items(), key=itemgetter(1))
+        return [addon for addon, score in addons]
 
 
 class FeaturedCollection(amo.models.ModelBase):
@@ -9,8 +9,9 @@ import amo
 import amo.tests
 from access.models import Group
 from addons.models import Addon, AddonRecommendation
+from bandwagon.buffer import SyncedCounts
 from bandwagon.models import (Collection, CollectionUser, CollectionWatcher,
-                              RecommendedCollection)
+                              RecommendedCollection, SyncedCollection)
 from devhub.models import ActivityLog
 from bandwagon import tasks
 from users.models import UserProfile
@@ -204,6 +205,10 @@ class TestRecommendations(amo.tests.TestCase):
     def test_build_recs(self):
         eq_(RecommendedCollection.build_recs(self.ids), self.expected_recs())
 
+    def test_build_recs_limit(self):
+        eq_(RecommendedCollection.build_recs(self.ids, 3),
+            self.expected_recs()[:3])
+
     @mock.patch('bandwagon.models.AddonRecommendation.scores')
     def test_no_dups(self, scores):
         # The inner dict is the recommended addons for addon 7.
@@ -211,3 +216,43 @@ class TestRecommendations(amo.tests.TestCase):
         recs = RecommendedCollection.build_recs([7, 3, 8])
         # 3 should not be in the list since we already have it.
         eq_(recs, [1, 2])
+
+
+class TestSyncedCounts(amo.tests.TestCase):
+    fixtures = ['base/addon_3615', 'base/addon_5299_gcal']
+
+    def setUp(self):
+        self.counts = SyncedCounts(size=3, interval=60)
+
+    def count(self, index):
+        return SyncedCollection.objects.get(addon_index=index).count
+
+    def test_buffered(self):
+        self.counts.add('a', [3615])
+        self.counts.add('a', [3615])
+        assert not self.counts.due()
+        eq_(SyncedCollection.objects.count(), 0)
+        self.counts.add('b', [3615, 5299])
+        assert self.counts.due()
+        self.counts.flush()
+        assert not self.counts.due()
+        eq_(self.count('a'), 2)
+        eq_(self.count('b'), 1)
+        eq_(sorted(SyncedCollection.objects.get(addon_index='b')
+                   .addons.values_list('id', flat=True)), [3615, 5299])
+
+    def test_existing(self):
+        SyncedCollection.objects.create(addon_index='a', count=5)
+        SyncedCollection.objects.create(addon_index='b', count=5)
+        self.counts.add('a', [3615])
+        self.counts.remove('b')
+        self.counts.remove('b')
+        self.counts.flush()
+        eq_(self.count('a'), 6)
+        eq_(self.count('b'), 3)
+
+    def test_interval(self):
+        self.counts.add('a', [3615])
+        assert not self.counts.due()
+        self.counts.last_flush -= 60
+        assert self.counts.due()
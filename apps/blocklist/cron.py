@@ -0,0 +1,12 @@
+import cronjobs
+
+from .tasks import build_blocklist
+
+
+@cronjobs.register
+def blocklist_snapshots():
+    """
+    Rebuild the blocklist snapshots, in case memcached lost them since the
+    blocklist last changed.
+    """
+    build_blocklist.delay(flush=False)
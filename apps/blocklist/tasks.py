@@ -0,0 +1,15 @@
+import commonware.log
+from celeryutils import task
+
+from amo.tasks import flush_front_end_cache_urls
+from .views import build_snapshots
+
+log = commonware.log.getLogger('z.task')
+
+
+@task
+def build_blocklist(flush=True, **kw):
+    log.info('Building blocklist snapshots.')
+    build_snapshots()
+    if flush:
+        flush_front_end_cache_urls.delay(['/blocklist/*'])
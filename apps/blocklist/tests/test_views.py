@@ -5,6 +5,7 @@ from xml.dom import minidom
 from django.conf import settings
 from django.core.cache import cache
 
+import mock
 from nose.tools import eq_
 
 import amo
@@ -122,21 +123,52 @@ class BlocklistItemTest(BlocklistViewTest):
         eq_(self.client.get(self.fx4_url + 'other/junk/').status_code, 200)
 
     def test_app_guid(self):
+        def items(url):
+            return self.dom(url).getElementsByTagName('emItem')
+
         # There's one item for Firefox.
-        r = self.client.get(self.fx4_url)
-        eq_(r.status_code, 200)
-        eq_(len(r.context['items']), 1)
+        eq_(len(items(self.fx4_url)), 1)
 
         # There are no items for mobile.
-        r = self.client.get(self.mobile_url)
-        eq_(r.status_code, 200)
-        eq_(len(r.context['items']), 0)
+        eq_(len(items(self.mobile_url)), 0)
 
         # Without the app constraint we see the item.
         self.app.delete()
-        r = self.client.get(self.mobile_url)
+        eq_(len(items(self.mobile_url)), 1)
+
+    def test_etag(self):
+        etag = self.client.get(self.fx4_url)['ETag']
+        r = self.client.get(self.fx4_url, HTTP_IF_NONE_MATCH=etag)
+        eq_(r.status_code, 304)
+
+        self.item.update(os='WINNT')
+        r = self.client.get(self.fx4_url, HTTP_IF_NONE_MATCH=etag)
+        eq_(r.status_code, 200)
+        assert r['ETag'] != etag
+
+    def test_etag_deleted(self):
+        etag = self.client.get(self.fx4_url)['ETag']
+        self.item.delete()
+        r = self.client.get(self.fx4_url, HTTP_IF_NONE_MATCH=etag)
         eq_(r.status_code, 200)
-        eq_(len(r.context['items']), 1)
+        assert r['ETag'] != etag
+
+    def test_no_last_modified(self):
+        r = self.client.get(self.fx4_url)
+        assert not r.has_header('Last-Modified')
+        since = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        r = self.client.get(self.fx4_url, HTTP_IF_MODIFIED_SINCE=since)
+        eq_(r.status_code, 200)
+
+    @mock.patch('blocklist.views.render_snapshot')
+    def test_served_from_snapshots(self, render_snapshot):
+        eq_(len(self.dom(self.fx4_url).getElementsByTagName('emItem')), 1)
+        eq_(len(self.dom(self.fx2_url).getElementsByTagName('emItem')), 1)
+        assert not render_snapshot.called
+
+    def test_unknown_app(self):
+        url = reverse('blocklist', args=[3, 'unknown@app', '1.0'])
+        eq_(self.client.get(url).status_code, 200)
 
     def test_item_guid(self):
         items = self.dom(self.fx4_url).getElementsByTagName('emItem')
@@ -444,6 +476,16 @@ class BlocklistPluginTest(BlocklistViewTest):
         eq_(e.getAttribute('severity'), '2')
         eq_(e.getElementsByTagName('targetApplication'), [])
 
+    def test_plugin_apiver_lt_3_snapshots(self):
+        # Each range of versions has its snapshot, built with the others.
+        self.app.update(min='3.0', max='4.0')
+        url = lambda v: reverse('blocklist', args=[2, amo.FIREFOX.guid, v])
+        with mock.patch('blocklist.views.render_snapshot') as render_snapshot:
+            self.assertRaises(IndexError, self.dom, url('3.0'))
+            self.assertRaises(IndexError, self.dom, url('4.0'))
+            assert self.dom(url('3.5'))
+        assert not render_snapshot.called
+
 
 class BlocklistGfxTest(BlocklistViewTest):
 
@@ -5,51 +5,128 @@ from datetime import datetime
 from operator import attrgetter
 import time
 
+from django import http
 from django.core.cache import cache
 from django.db.models import Q, signals as db_signals
 from django.shortcuts import get_object_or_404
 from django.utils.cache import patch_cache_control
 from django.utils.encoding import smart_str
+from django.views.decorators.http import condition
 
+import commonware.log
 import jingo
 
+import amo
 from amo.utils import sorted_groupby
-from amo.tasks import flush_front_end_cache_urls
 from versions.compare import version_int
 from .models import (BlocklistApp, BlocklistCA, BlocklistDetail, BlocklistGfx,
                      BlocklistItem, BlocklistPlugin)
 
 
+log = commonware.log.getLogger('z.blocklist')
+
 App = collections.namedtuple('App', 'guid min max')
 BlItem = collections.namedtuple('BlItem', 'rows os modified block_id')
 
+# Clients below this API version are only sent the plugins blocked for their
+# application version.
+LEGACY_APIVER = 3
+# Snapshots are rebuilt whenever the blocklist changes, keep them as long as
+# memcached lets us.
+SNAPSHOT_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def blocklist_etag(request, apiver, app, appver):
+    return get_snapshot(request, apiver, app, appver)['etag']
 
+
+# No Last-Modified: deleted entries, CAs and details don't move the dates of
+# the rendered rows, only the ETag tells if the blocklist changed.
+@condition(etag_func=blocklist_etag)
 def blocklist(request, apiver, app, appver):
+    snapshot = get_snapshot(request, apiver, app, appver)
+    response = http.HttpResponse(snapshot['content'], content_type='text/xml')
+    patch_cache_control(response, max_age=60 * 60)
+    return response
+
+
+def get_snapshot(request, apiver, app, appver):
+    """The snapshot answering this request, looked up once per request."""
+    if not hasattr(request, '_blocklist_snapshot'):
+        request._blocklist_snapshot = _get_snapshot(int(apiver), app, appver)
+    return request._blocklist_snapshot
+
+
+def _get_snapshot(apiver, app, appver):
+    snapshot = None
+    if apiver < LEGACY_APIVER:
+        ranges = cache.get(snapshot_key(app, 'ranges'))
+        if ranges is not None:
+            snapshot = cache.get(
+                snapshot_key(app, legacy_variant(ranges, appver)))
+    else:
+        snapshot = cache.get(snapshot_key(app, 'current'))
+    if snapshot is not None:
+        return snapshot
+
+    # Not built yet, evicted, or an application we don't build snapshots
+    # for: render it here, until the blocklist changes.
     key = 'blocklist:%s:%s:%s' % (apiver, app, appver)
     # Use md5 to make sure the memcached key is clean.
     key = hashlib.md5(smart_str(key)).hexdigest()
     cache.add('blocklist:keyversion', 1)
     version = cache.get('blocklist:keyversion')
-    response = cache.get(key, version=version)
-    if response is None:
-        response = _blocklist(request, apiver, app, appver)
-        cache.set(key, response, 60 * 60, version=version)
-    patch_cache_control(response, max_age=60 * 60)
-    return response
+    snapshot = cache.get(key, version=version)
+    if snapshot is None:
+        snapshot = render_snapshot(apiver, app, appver)
+        cache.set(key, snapshot, 60 * 60, version=version)
+    return snapshot
 
 
-def _blocklist(request, apiver, app, appver):
-    apiver = int(apiver)
-    items = get_items(apiver, app, appver)[0]
-    plugins = get_plugins(apiver, app, appver)
-    gfxs = BlocklistGfx.objects.filter(Q(guid__isnull=True) | Q(guid=app))
-    cas = None
+def snapshot_key(app, variant):
+    key = 'blocklist:snapshot:%s:%s' % (app, variant)
+    return hashlib.md5(smart_str(key)).hexdigest()
+
+
+def plugin_range(plugin):
+    """
+    The application versions a legacy client must be strictly between to be
+    sent `plugin`, or None if it is sent to every version.
+    """
+    if not (plugin.app_min and plugin.app_max):
+        return None
+    return version_int(plugin.app_min), version_int(plugin.app_max)
 
-    try:
-        cas = BlocklistCA.objects.all()[0]
-        cas = base64.b64encode(cas.data)
-    except IndexError:
-        pass
+
+def in_ranges(ranges, app_version):
+    """The indexes of the `plugin_range`s that include `app_version`."""
+    return [i for i, r in enumerate(ranges)
+            if r is None or r[0] < app_version < r[1]]
+
+
+def legacy_variant(ranges, appver):
+    """
+    The name of the legacy snapshot for `appver`: which plugins, given the
+    `plugin_range` of each, the client gets.
+    """
+    return 'legacy:%s' % ','.join(map(str, in_ranges(ranges,
+                                                     version_int(appver))))
+
+
+def render_snapshot(apiver, app, appver, items=None, plugins=None, gfxs=None,
+                    cas=None):
+    """
+    Render the blocklist and return it with its ETag and last update time.
+    Whatever is not passed in is looked up.
+    """
+    if items is None:
+        items = get_items(apiver, app, appver)[0]
+    if plugins is None:
+        plugins = get_plugins(apiver, app, appver)
+    if gfxs is None:
+        gfxs = get_gfxs(app)
+    if cas is None:
+        cas = get_cas()
 
     # Find the latest created/modified date across all sections.
     all_ = list(items.values()) + list(plugins) + list(gfxs)
@@ -58,15 +135,57 @@ def _blocklist(request, apiver, app, appver):
     last_update = int(time.mktime(last_update.timetuple()) * 1000)
     data = dict(items=items, plugins=plugins, gfxs=gfxs, apiver=apiver,
                 appguid=app, appver=appver, last_update=last_update, cas=cas)
-    return jingo.render(request, 'blocklist/blocklist.xml', data,
-                        content_type='text/xml')
+    content = smart_str(
+        jingo.env.get_template('blocklist/blocklist.xml').render(data))
+    return {'content': content, 'etag': hashlib.md5(content).hexdigest(),
+            'last_update': last_update}
 
 
-def clear_blocklist(*args, **kw):
-    # Something in the blocklist changed; invalidate all responses.
+def build_snapshots():
+    """
+    Render the blocklist of every application that has blocklist entries or
+    sends blocklist pings, for current clients and for each set of plugins a
+    legacy client can get, and store them all at once. Requests are then
+    served from these snapshots until the next build.
+    """
+    guids = set(a.guid for a in amo.APP_USAGE)
+    guids.update(BlocklistApp.uncached.filter(guid__isnull=False)
+                 .values_list('guid', flat=True))
+    cas = get_cas()
+    snapshots = {}
+    for app in guids:
+        items = get_items(LEGACY_APIVER, app)[0]
+        plugins = get_plugins(LEGACY_APIVER, app)
+        gfxs = get_gfxs(app)
+        snapshots[snapshot_key(app, 'current')] = render_snapshot(
+            LEGACY_APIVER, app, None, items, plugins, gfxs, cas)
+
+        # Legacy clients only get the plugins blocked for their version, so
+        # there is a snapshot for each range of versions between the bounds
+        # of the plugins.
+        ranges = map(plugin_range, plugins)
+        bounds = set(v for r in ranges if r for v in r)
+        versions = set(v + d for v in bounds for d in (-1, 0, 1)) or set([0])
+        for version in versions:
+            included = in_ranges(ranges, version)
+            key = snapshot_key(app, 'legacy:%s' % ','.join(map(str, included)))
+            if key not in snapshots:
+                snapshots[key] = render_snapshot(
+                    LEGACY_APIVER - 1, app, None, items,
+                    [plugins[i] for i in included], gfxs, cas)
+        snapshots[snapshot_key(app, 'ranges')] = ranges
+
+    cache.set_many(snapshots, SNAPSHOT_TIMEOUT)
+    # Drop what requests rendered for applications we don't build for.
     cache.add('blocklist:keyversion', 1)
     cache.incr('blocklist:keyversion')
-    flush_front_end_cache_urls.delay(['/blocklist/*'])
+    log.info('Built blocklist snapshots for %s applications.' % len(guids))
+
+
+def clear_blocklist(*args, **kw):
+    # Something in the blocklist changed; rebuild all responses.
+    from .tasks import build_blocklist  # Circular import.
+    build_blocklist.delay()
 
 
 for m in (BlocklistItem, BlocklistPlugin, BlocklistGfx, BlocklistApp,
@@ -112,17 +231,25 @@ def get_plugins(apiver, app, appver=None):
                .extra(select={'app_guid': 'blapps.guid',
                               'app_min': 'blapps.min',
                               'app_max': 'blapps.max'}))
-    if apiver < 3 and appver is not None:
-        def between(ver, min, max):
-            if not (min and max):
-                return True
-            return version_int(min) < ver < version_int(max)
-        app_version = version_int(appver)
-        plugins = [p for p in plugins if between(app_version, p.app_min,
-                                                 p.app_max)]
+    if apiver < LEGACY_APIVER and appver is not None:
+        plugins = list(plugins)
+        included = in_ranges(map(plugin_range, plugins), version_int(appver))
+        plugins = [plugins[i] for i in included]
     return list(plugins)
 
 
+def get_gfxs(app):
+    return list(BlocklistGfx.uncached.filter(Q(guid__isnull=True) |
+                                             Q(guid=app)))
+
+
+def get_cas():
+    try:
+        return base64.b64encode(BlocklistCA.uncached.all()[0].data)
+    except IndexError:
+        return None
+
+
 def blocked_list(request, apiver=3):
     app = request.APP.guid
     objs = get_items(apiver, app)[1].values() + get_plugins(apiver, app)
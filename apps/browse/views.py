@@ -216,7 +216,8 @@ def es_extensions(request, category=None, template=None):
 
     if category:
         qs = qs.filter(category=category.id)
-    addons = amo.utils.paginate(request, qs)
+    # The same listings are asked for all the time, don't hit ES every time.
+    addons = amo.utils.paginate(request, qs.cache(60))
 
     return jingo.render(request, template,
                         {'section': 'extensions', 'addon_type': TYPE,
@@ -3,6 +3,7 @@ import json
 from django import test
 from django.core.cache import cache
 
+import mock
 from nose.tools import eq_
 from pyquery import PyQuery as pq
 import waffle
@@ -12,8 +13,10 @@ import amo.tests
 from amo.tests import addon_factory
 import addons.signals
 from amo.urlresolvers import reverse
-from addons.models import (Addon, AddonDependency, AddonUpsell, CompatOverride,
-                           CompatOverrideRange, Preview)
+from amo.utils import cache_ns_key
+from addons.models import (Addon, AddonDependency, AddonRecommendation,
+                           AddonUpsell, CompatOverride, CompatOverrideRange,
+                           Preview)
 from applications.models import Application, AppVersion
 from bandwagon.models import MonthlyPick, SyncedCollection
 from bandwagon.tests.test_models import TestRecommendations as Recs
@@ -116,6 +119,16 @@ class TestRecs(amo.tests.TestCase):
         eq_(ids, Recs.expected_recs()[1:10])
         assert unpublic not in ids
 
+    @mock.patch.object(views, 'RECS_CANDIDATES', 9)
+    def test_incompatible_candidates(self):
+        # The add-ons left out are made up from the next candidates.
+        unpublic = self.expected_recs[0]
+        Addon.objects.filter(id=unpublic).update(status=amo.STATUS_LITE)
+        response = self.client.post(self.url, self.json,
+                                    content_type='application/json')
+        ids = [a['id'] for a in json.loads(response.content)['addons']]
+        eq_(ids, Recs.expected_recs()[1:10])
+
     def test_app_support_filter(self):
         # The fixture doesn't contain valid add-ons for the provided URL args.
         url = reverse('discovery.recs', args=['5.0', 'Darwin'])
@@ -147,6 +160,21 @@ class TestRecs(amo.tests.TestCase):
         ids = [a['id'] for a in data['addons']]
         eq_(ids, self.expected_recs)
 
+    def test_cached(self):
+        one = self.client.post(self.url, self.json,
+                               content_type='application/json').content
+        AddonRecommendation.objects.all().delete()
+        two = self.client.post(self.url, self.json,
+                               content_type='application/json')
+        eq_(two['Content-type'], 'application/json')
+        eq_(two.content, one)
+
+        # The recs cron invalidates them.
+        cache_ns_key('recs', increment=True)
+        r = self.client.post(self.url, self.json,
+                             content_type='application/json')
+        eq_(json.loads(r.content)['addons'], [])
+
     def test_update_same_index(self):
         response = self.client.post(self.url, self.json,
                                     content_type='application/json')
@@ -1,14 +1,17 @@
 import collections
+import hashlib
 import itertools
 import json
 import urlparse
 
 from django import http
+from django.conf import settings
 from django.contrib import admin
-from django.db import IntegrityError
-from django.db.models import F
+from django.core.cache import cache
 from django.forms.models import modelformset_factory
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import translation
+from django.utils.encoding import smart_str
 from django.views.decorators.csrf import csrf_exempt
 
 import commonware.log
@@ -22,11 +25,13 @@ import api.views
 from amo.decorators import post_required
 from amo.models import manual_order
 from amo.urlresolvers import reverse
+from amo.utils import cache_ns_key
 from addons.decorators import addon_view_factory
 from addons.models import Addon, AddonRecommendation
 from addons.utils import get_featured_ids
 from browse.views import personas_listing
-from bandwagon.models import Collection, SyncedCollection
+from bandwagon.buffer import synced_counts
+from bandwagon.models import Collection, RecommendedCollection
 from discovery.modules import PromoVideoCollection
 from reviews.models import Review
 from stats.models import GlobalStat
@@ -41,6 +46,10 @@ addon_view = addon_view_factory(Addon.objects.valid)
 
 log = commonware.log.getLogger('z.disco')
 
+# Number of recommended add-ons looked through at a time to find the few that
+# are compatible with the client.
+RECS_CANDIDATES = 100
+
 
 def get_compat_mode(version):
     # Returns appropriate compat mode based on app version.
@@ -203,10 +212,18 @@ def recommendations(request, version, platform, limit=9, compat_mode=None):
     addon_ids = get_addon_ids(guids)
     index = Collection.make_index(addon_ids)
 
-    ids, recs = Collection.get_recs_from_ids(addon_ids, request.APP, version,
-                                             compat_mode)
-    recs = _recommendations(request, version, platform, limit, index, ids,
-                            recs, compat_mode)
+    # Lots of users have the same add-ons, the recommendations they get are
+    # the same until the recs cron computes new scores.
+    key = recs_cache_key(request, index, version, platform, compat_mode,
+                         limit)
+    content = cache.get(key)
+    if content is None:
+        ids = RecommendedCollection.build_recs(addon_ids)
+        recs = _recommendations(request, version, platform, limit, index, ids,
+                                compat_mode)
+        cache.set(key, recs.content, settings.RECS_CACHE_TIMEOUT)
+    else:
+        recs = http.HttpResponse(content, content_type='application/json')
 
     # We're only storing a percentage of the collections we see because the db
     # can't keep up with 100%.
@@ -223,34 +240,40 @@ def recommendations(request, version, platform, limit=9, compat_mode=None):
         elif token != index:
             # We've seen them before and their add-ons changed. Remove the
             # reference to their old synced collection.
-            (SyncedCollection.objects.filter(addon_index=index)
-             .update(count=F('count') - 1))
+            synced_counts.remove(token)
 
-    # Try to create the SyncedCollection. There's a unique constraint on
-    # addon_index so it will fail if this addon_index already exists. If we
-    # checked for existence first and then created a collection there would
-    # be a race condition between multiple users with the same addon_index.
-    try:
-        c = SyncedCollection.objects.create(addon_index=index, count=1)
-        c.set_addons(addon_ids)
-    except IntegrityError:
-        try:
-            (SyncedCollection.objects.filter(addon_index=index)
-             .update(count=F('count') + 1))
-        except Exception, e:
-            log.error(u'Could not count++ "%s" (%s).' % (index, e))
+    # The SyncedCollection is created or its count incremented along with
+    # the others when the buffer is flushed.
+    synced_counts.add(index, addon_ids)
     return recs
 
 
-def _recommendations(request, version, platform, limit, token, ids, qs,
+def recs_cache_key(request, index, version, platform, compat_mode, limit):
+    parts = (index, request.APP.id, version_int(version), platform.lower(),
+             compat_mode, translation.get_language(), limit)
+    return '%s:%s' % (cache_ns_key('recs'),
+                      hashlib.md5(smart_str(parts)).hexdigest())
+
+
+def _recommendations(request, version, platform, limit, token, ids,
                      compat_mode='strict'):
-    """Return a JSON response for the recs view."""
-    addons = api.views.addon_filter(qs, 'ALL', 0, request.APP, platform,
-                                    version, compat_mode, shuffle=False)
-    addons = dict((a.id, a) for a in addons)
-    addons = [api.utils.addon_to_dict(addons[i], disco=True,
+    """
+    Return a JSON response for the recs view with the `limit` best of `ids`
+    that are compatible with the client, looked for RECS_CANDIDATES at a time.
+    """
+    found = []
+    for candidates in amo.utils.chunked(ids, RECS_CANDIDATES):
+        qs = Collection.get_recs_addons(candidates, request.APP, version,
+                                        compat_mode)
+        addons = api.views.addon_filter(qs, 'ALL', 0, request.APP, platform,
+                                        version, compat_mode, shuffle=False)
+        addons = dict((a.id, a) for a in addons)
+        found.extend(addons[i] for i in candidates if i in addons)
+        if len(found) >= limit:
+            break
+    addons = [api.utils.addon_to_dict(addon, disco=True,
                                       src='discovery-personalrec')
-              for i in ids if i in addons][:limit]
+              for addon in found[:limit]]
     data = {'token2': token, 'addons': addons}
     content = json.dumps(data, cls=amo.utils.JSONEncoder)
     return http.HttpResponse(content, content_type='application/json')
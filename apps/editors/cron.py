@@ -0,0 +1,14 @@
+import commonware.log
+import cronjobs
+
+from .models import editor_queues
+
+log = commonware.log.getLogger('z.cron')
+
+
+@cronjobs.register
+def editor_queue_stats():
+    """Rebuild the counts of the editor queues from the queues themselves."""
+    snapshot = editor_queues.rebuild()
+    log.info('Editor queues: %s.' % ', '.join(
+        '%s %s' % (k, len(v)) for k, v in sorted(snapshot.items())))
@@ -18,10 +18,13 @@ from amo.urlresolvers import reverse
 from amo.utils import cache_ns_key, send_mail
 from addons.models import Addon, Persona
 from devhub.models import ActivityLog
+from editors.queue_stats import QueueStats, queryset_members
 from editors.sql_model import RawSQLModel
+from files.models import File
+from reviews.models import Review, ReviewFlag
 from translations.fields import save_signal, TranslatedField
 from users.models import UserProfile
-from versions.models import version_uploaded
+from versions.models import Version, version_uploaded
 
 import commonware.log
 
@@ -682,3 +685,37 @@ class RereviewQueueTheme(amo.models.ModelBase):
     @property
     def footer_url(self):
         return self.theme._image_url(self.footer or self.theme.footer)
+
+
+def view_queue_members(view):
+    """The members of a `ViewQueue`, see `QueueStats`."""
+    def members(addons):
+        qs = view.objects.all()
+        if addons is not None:
+            qs = qs.filter_raw('id IN', list(addons))
+        now = datetime.datetime.now()
+        return [(row.id, row.id,
+                 now - datetime.timedelta(minutes=row.waiting_time_min))
+                for row in qs]
+    return members
+
+
+# The counts and ages of the queues of the editor tools.
+editor_queues = QueueStats('editors', {
+    'pending': view_queue_members(ViewPendingQueue),
+    'nominated': view_queue_members(ViewFullReviewQueue),
+    'prelim': view_queue_members(ViewPreliminaryQueue),
+    'fast_track': view_queue_members(ViewFastTrackQueue),
+    'moderated': queryset_members(
+        Review.uncached.exclude(addon__type=amo.ADDON_WEBAPP)
+                       .filter(reviewflag__isnull=False, editorreview=True),
+        'addon'),
+})
+
+# The marketplace has its own queues, see mkt.reviewers.
+if not settings.MARKETPLACE:
+    editor_queues.watch(Addon, lambda addon: addon.id)
+    editor_queues.watch(Version)
+    editor_queues.watch(File, lambda file: file.version.addon_id)
+    editor_queues.watch(Review)
+    editor_queues.watch(ReviewFlag, lambda flag: flag.review.addon_id)
@@ -0,0 +1,155 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import signals
+
+from django_statsd.clients import statsd
+
+from amo.models import use_master
+
+log = logging.getLogger('z.editors')
+
+
+def queryset_members(qs, addon, since='created'):
+    """
+    The members of a queue that is a queryset: the id of each row with its
+    `addon` and `since` fields. See `QueueStats`.
+    """
+    def members(addons):
+        rows = qs
+        if addons is not None:
+            rows = rows.filter(**{'%s__in' % addon: list(addons)})
+        return rows.values_list('id', addon, since)
+    return members
+
+
+class QueueStats(object):
+    """
+    The entries of some review queues, kept in the cache so the reviewer
+    pages can show how many there are and how long they have been waiting
+    without a query.
+
+    `queues` maps the name of each queue to a function returning its entries
+    as (key, add-on id, date it entered the queue) tuples, only those of the
+    add-ons in the list it gets unless that is None.
+
+    The snapshot is built on the first read and rebuilt by a cron, in between
+    the models passed to `watch` update the entries of an add-on whenever they
+    are saved or deleted.
+
+    Writers take a lock. A refresh that finds it taken can't merge with what
+    the holder is writing, so it drops the snapshot and marks it dirty, and
+    the holder then drops what it built instead of storing it.
+    """
+    # Seconds before a lock held by a writer that died is given up on.
+    lock_timeout = 60
+
+    def __init__(self, name, queues):
+        self.name = name
+        self.queues = queues
+        self.key = 'queue-stats:%s' % name
+        self.lock = '%s:lock' % self.key
+        self.dirty = '%s:dirty' % self.key
+
+    def build(self, addons=None):
+        if addons is not None:
+            # The changes of `addons` were just written, the slaves may not
+            # have them yet.
+            with use_master():
+                return self._build(addons)
+        return self._build(addons)
+
+    def _build(self, addons):
+        return dict((queue, dict((key, (addon, since)) for key, addon, since
+                                 in members(addons)))
+                    for queue, members in self.queues.items())
+
+    def store(self, snapshot):
+        """Store `snapshot`, unless a refresh was dropped meanwhile."""
+        if cache.get(self.dirty):
+            cache.delete(self.key)
+        else:
+            cache.set(self.key, snapshot, settings.QUEUE_STATS_TIMEOUT)
+
+    def rebuild(self):
+        if not cache.add(self.lock, 1, self.lock_timeout):
+            # Another writer has it, let it store its own.
+            return self.build()
+        try:
+            cache.delete(self.dirty)
+            snapshot = self.build()
+            self.store(snapshot)
+            return snapshot
+        finally:
+            cache.delete(self.lock)
+
+    def get(self):
+        snapshot = cache.get(self.key)
+        if snapshot is None:
+            statsd.incr('editors.queue_stats.miss')
+            snapshot = self.rebuild()
+        return snapshot
+
+    def refresh(self, addons):
+        """Update the entries of `addons` in the snapshot, if there is one."""
+        addons = set(addons)
+        addons.discard(None)
+        if not addons:
+            return
+        if not cache.add(self.lock, 1, self.lock_timeout):
+            log.info('Dropping the %s queue stats, they were busy.'
+                     % self.name)
+            cache.set(self.dirty, 1, settings.QUEUE_STATS_TIMEOUT)
+            cache.delete(self.key)
+            return
+        try:
+            snapshot = cache.get(self.key)
+            if snapshot is None:
+                return
+            fresh = self.build(addons)
+            for queue, entries in snapshot.items():
+                for key, (addon, since) in entries.items():
+                    if addon in addons:
+                        del entries[key]
+                entries.update(fresh.get(queue, {}))
+            self.store(snapshot)
+        finally:
+            cache.delete(self.lock)
+
+    def counts(self):
+        return dict((queue, len(entries))
+                    for queue, entries in self.get().items())
+
+    def progress(self, queues, buckets):
+        """
+        Return the number of entries of each of `queues` in each of `buckets`,
+        a dict of name -> function taking how long an entry has been waiting
+        as a timedelta.
+        """
+        snapshot = self.get()
+        now = datetime.datetime.now()
+        progress = {}
+        for queue in queues:
+            ages = [now - since for addon, since in snapshot[queue].values()]
+            progress[queue] = dict((name, len(filter(bucket, ages)))
+                                   for name, bucket in buckets.items())
+        return progress
+
+    def watch(self, sender, addon=lambda obj: obj.addon_id):
+        """Refresh the entries of `addon(obj)` when `obj` changes."""
+        def refresh(sender, instance, **kw):
+            if kw.get('raw'):
+                return
+            try:
+                self.refresh([addon(instance)])
+            except ObjectDoesNotExist:
+                # Its add-on is gone too, the next rebuild will notice.
+                pass
+        uid = 'queue-stats-%s-%s' % (self.name, sender.__name__)
+        signals.post_save.connect(refresh, sender=sender, weak=False,
+                                  dispatch_uid=uid)
+        signals.post_delete.connect(refresh, sender=sender, weak=False,
+                                    dispatch_uid=uid)
@@ -3,6 +3,7 @@ import datetime
 import time
 
 from django.core import mail
+from django.core.cache import cache
 
 from nose.tools import eq_
 
@@ -12,10 +13,12 @@ from addons.models import Addon
 from versions.models import Version, version_uploaded, ApplicationsVersions
 from files.models import Platform, File
 from applications.models import Application, AppVersion
-from editors.models import (EditorSubscription, RereviewQueue, ReviewerScore,
-                            send_notifications, ViewFastTrackQueue,
-                            ViewFullReviewQueue, ViewPendingQueue,
-                            ViewPreliminaryQueue)
+from editors.cron import editor_queue_stats
+from editors.models import (editor_queues, EditorSubscription, RereviewQueue,
+                            ReviewerScore, send_notifications,
+                            ViewFastTrackQueue, ViewFullReviewQueue,
+                            ViewPendingQueue, ViewPreliminaryQueue)
+from editors.views import _editor_progress, queue_counts
 from users.models import UserProfile
 
 
@@ -318,6 +321,55 @@ class TestFastTrackQueue(TestQueue):
         eq_(self.query(), ['full'])
 
 
+class TestEditorQueues(amo.tests.TestCase):
+
+    def setUp(self):
+        self.file = create_addon_file('Pending', '1.0', amo.STATUS_PUBLIC,
+                                      amo.STATUS_UNREVIEWED)['file']
+
+    def test_counts(self):
+        eq_(editor_queues.counts()['pending'], 1)
+        with self.assertNumQueries(0):
+            eq_(queue_counts(['pending', 'nominated']),
+                {'pending': 1, 'nominated': 0})
+
+    def test_refreshed_on_save(self):
+        eq_(editor_queues.counts()['pending'], 1)
+        self.file.update(status=amo.STATUS_PUBLIC)
+        eq_(editor_queues.counts()['pending'], 0)
+
+    def test_refresh_other_addons_untouched(self):
+        eq_(editor_queues.counts()['pending'], 1)
+        create_addon_file('Other', '1.0', amo.STATUS_PUBLIC,
+                          amo.STATUS_UNREVIEWED)
+        eq_(editor_queues.counts()['pending'], 2)
+
+    def test_refresh_busy(self):
+        eq_(editor_queues.counts()['pending'], 1)
+        cache.add(editor_queues.lock, 1)
+        self.file.update(status=amo.STATUS_PUBLIC)
+        eq_(cache.get(editor_queues.key), None)
+        # A writer holding the lock drops what it has.
+        editor_queues.store({'pending': {}})
+        eq_(cache.get(editor_queues.key), None)
+        cache.delete(editor_queues.lock)
+        eq_(editor_queues.counts()['pending'], 0)
+        assert cache.get(editor_queues.key) is not None
+
+    def test_rebuild(self):
+        eq_(editor_queues.counts()['pending'], 1)
+        File.objects.filter(id=self.file.id).update(status=amo.STATUS_PUBLIC)
+        eq_(editor_queues.counts()['pending'], 1)
+        editor_queue_stats()
+        eq_(editor_queues.counts()['pending'], 0)
+
+    def test_progress(self):
+        progress, percentage = _editor_progress()
+        eq_(progress['new']['pending'], 1)
+        eq_(progress['old']['pending'], 0)
+        eq_(percentage['pending']['new'], 100)
+
+
 class TestEditorSubscription(amo.tests.TestCase):
     fixtures = ['base/addon_3615', 'base/users']
 
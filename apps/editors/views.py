@@ -26,11 +26,9 @@ from amo.utils import paginate
 from amo.urlresolvers import reverse
 from devhub.models import ActivityLog, CommentLog
 from editors import forms
-from editors.models import (AddonCannedResponse, EditorSubscription, EventLog,
-                            PerformanceGraph, ReviewerScore,
-                            ViewFastTrackQueue, ViewFullReviewQueue,
-                            ViewPendingQueue, ViewPreliminaryQueue,
-                            ViewQueue)
+from editors.models import (AddonCannedResponse, EditorSubscription,
+                            editor_queues, EventLog, PerformanceGraph,
+                            ReviewerScore, ViewQueue)
 from editors.helpers import (ViewFastTrackQueueTable, ViewFullReviewQueueTable,
                              ViewPendingQueueTable, ViewPreliminaryQueueTable)
 from reviews.forms import ReviewFlagFormSet
@@ -133,15 +131,24 @@ def home(request):
     return jingo.render(request, 'editors/home.html', data)
 
 
+# How long the add-ons of each bucket of the dashboard have been waiting, in
+# whole days like the waiting time of the queues.
+PROGRESS_BUCKETS = {
+    'new': lambda age: age.days <= 4,
+    'med': lambda age: 5 <= age.days <= 10,
+    'old': lambda age: age.days >= 11,
+    'week': lambda age: age.days <= 7,
+}
+
+
 def _editor_progress():
     """Return the progress (number of add-ons still unreviewed for a given
        period of time) and the percentage (out of all add-ons of that type)."""
 
     types = ['nominated', 'prelim', 'pending']
-    progress = {'new': queue_counts(types, days_max=4),
-                'med': queue_counts(types, days_min=5, days_max=10),
-                'old': queue_counts(types, days_min=11),
-                'week': queue_counts(types, days_max=7)}
+    by_queue = editor_queues.progress(types, PROGRESS_BUCKETS)
+    progress = dict((bucket, dict((t, by_queue[t][bucket]) for t in types))
+                    for bucket in PROGRESS_BUCKETS)
 
     # Return the percent of (p)rogress out of (t)otal.
     pct = lambda p, t: (p / float(t)) * 100 if p > 0 else 0
@@ -352,36 +359,12 @@ def _queue(request, TableObj, tab, qs=None):
                                 point_types=amo.REVIEWED_AMO))
 
 
-def queue_counts(type=None, **kw):
-    def construct_query(query_type, days_min=None, days_max=None):
-        def apply_query(query, *args):
-            query = query.having(*args)
-            return query
-
-        query = query_type.objects
-
-        if days_min:
-            query = apply_query(query, 'waiting_time_days >=', days_min)
-        if days_max:
-            query = apply_query(query, 'waiting_time_days <=', days_max)
-
-        return query.count
-
-    counts = {'pending': construct_query(ViewPendingQueue, **kw),
-              'nominated': construct_query(ViewFullReviewQueue, **kw),
-              'prelim': construct_query(ViewPreliminaryQueue, **kw),
-              'fast_track': construct_query(ViewFastTrackQueue, **kw),
-              'moderated': (
-                  Review.objects.exclude(addon__type=amo.ADDON_WEBAPP)
-                                .filter(reviewflag__isnull=False,
-                                        editorreview=1).count)}
-    rv = {}
+def queue_counts(type=None):
+    counts = editor_queues.counts()
     if isinstance(type, basestring):
-        return counts[type]()
-    for k, v in counts.items():
-        if not isinstance(type, list) or k in type:
-            rv[k] = v()
-    return rv
+        return counts[type]
+    return dict((k, v) for k, v in counts.items()
+                if not isinstance(type, list) or k in type)
 
 
 @reviewer_required
@@ -1,24 +1,32 @@
 import codecs
+import collections
+import contextlib
+import hashlib
 import json
 import mimetypes
 import os
 import stat
+import tempfile
+import time
+import zipfile
 
+from django import forms
 from django.conf import settings
 from django.core.files.storage import default_storage as storage
 from django.utils.datastructures import SortedDict
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_str, smart_unicode
 from django.template.defaultfilters import filesizeformat
 
 import jinja2
 import commonware.log
+import waffle
 from jingo import register, env
 from tower import ugettext as _
 
 import amo
 from amo.utils import memoize, Message, rm_local_tmp_dir
 from amo.urlresolvers import reverse
-from files.utils import extract_xpi, get_md5
+from files.utils import extract_xpi, get_md5, NestedZip
 from validator.testcases.packagelayout import (blacklisted_extensions,
                                                blacklisted_magic_numbers)
 
@@ -65,6 +73,10 @@ class FileViewer(object):
     Provide access to a storage-managed file by copying it locally and
     extracting info from it. `src` is a storage-managed path and `dest` is a
     local temp path.
+
+    With the file-viewer-zip-index switch, the files are listed from the zip
+    central directories instead, and only the selected file is read. Files
+    served as they are get extracted to a small LRU in `members`.
     """
 
     def __init__(self, file_obj, is_webapp=False):
@@ -76,7 +88,9 @@ class FileViewer(object):
                     else file_obj.file_path)
         self.dest = os.path.join(settings.TMP_PATH, 'file_viewer',
                                  str(file_obj.pk))
+        self.members = os.path.join(settings.TMP_PATH, 'file_viewer_members')
         self._files, self.selected = None, None
+        self._zip_error = None
 
     def __str__(self):
         return str(self.file.id)
@@ -118,21 +132,39 @@ class FileViewer(object):
         """Is our file for a search engine?"""
         return self.file.version.addon.type == amo.ADDON_SEARCH
 
+    @property
+    def from_zip(self):
+        """If the files are read from the archive instead of extracted."""
+        if not hasattr(self, '_from_zip'):
+            self._from_zip = (
+                waffle.switch_is_active('file-viewer-zip-index') and
+                not (self.is_search_engine() and self.src.endswith('.xml')))
+        return self._from_zip
+
     def is_extracted(self):
         """If the file has been extracted or not."""
+        if self.from_zip:
+            # There is nothing to extract, unless the archive can't be read.
+            self.get_files()
+            return not self._zip_error
         return (os.path.exists(self.dest) and not
                 Message(self._extraction_cache_key()).get())
 
-    def _is_binary(self, mimetype, path):
-        """Uses the filename to see if the file can be shown in HTML or not."""
+    def _is_binary(self, mimetype, path, head=None):
+        """
+        Uses the filename to see if the file can be shown in HTML or not, and
+        the first bytes of the file, `head` or read from `path`.
+        """
         # Re-use the blacklisted data from amo-validator to spot binaries.
         ext = os.path.splitext(path)[1][1:]
         if ext in blacklisted_extensions:
             return True
 
-        if os.path.exists(path) and not os.path.isdir(path):
+        if head is None and os.path.exists(path) and not os.path.isdir(path):
             with storage.open(path, 'r') as rfile:
-                bytes = tuple(map(ord, rfile.read(4)))
+                head = rfile.read(4)
+        if head is not None:
+            bytes = tuple(map(ord, head[:4]))
             if any(bytes[:len(x)] == x for x in blacklisted_magic_numbers):
                 return True
 
@@ -173,7 +205,7 @@ class FileViewer(object):
             self.selected['msg'] = msg
             return ''
 
-        with storage.open(self.selected['full'], 'r') as opened:
+        with self._open(self.selected) as opened:
             cont = opened.read()
             codec = 'utf-16' if cont.startswith(codecs.BOM_UTF16) else 'utf-8'
             try:
@@ -221,6 +253,70 @@ class FileViewer(object):
 
     def select(self, file_):
         self.selected = self.get_files().get(file_)
+        if (self.selected and self.selected.get('members') and
+                not self.selected['directory'] and
+                not self.selected['md5']):
+            self._inspect(self.selected)
+
+    @contextlib.contextmanager
+    def _open(self, file_):
+        """A file object to read `file_`, from the archive if it's in it."""
+        if file_.get('members'):
+            with NestedZip(self.src).open(file_['members']) as opened:
+                yield opened
+        else:
+            with storage.open(file_['full'], 'r') as opened:
+                yield opened
+
+    def _inspect(self, file_):
+        """Fill in the md5 and binary of a file in the zip index."""
+        hash_ = hashlib.md5()
+        head = None
+        with self._open(file_) as opened:
+            while True:
+                data = opened.read(2 ** 16)
+                if head is None:
+                    head = data
+                if not data:
+                    break
+                hash_.update(data)
+        file_['md5'] = hash_.hexdigest()
+        file_['binary'] = self._is_binary(file_['mimetype'], file_['short'],
+                                          head)
+
+    def get_path(self, file_):
+        """
+        A local path to `file_`, for it to be served. Files of the zip index
+        are extracted to the `members` LRU first.
+        """
+        path = file_['full']
+        if not file_.get('members'):
+            return path
+        if os.path.exists(path):
+            os.utime(path, None)
+            return path
+        if not os.path.exists(self.members):
+            os.makedirs(self.members)
+        fd, tmp = tempfile.mkstemp(dir=self.members)
+        with os.fdopen(fd, 'wb') as dest:
+            with self._open(file_) as opened:
+                copyfileobj(opened, dest)
+        os.rename(tmp, path)
+        self._prune_members()
+        return path
+
+    def _prune_members(self):
+        """Remove the least recently served files of the LRU."""
+        paths = [os.path.join(self.members, name)
+                 for name in os.listdir(self.members)]
+        extra = len(paths) - settings.FILE_VIEWER_MEMBERS
+        if extra > 0:
+            paths.sort(key=lambda path: os.stat(path)[stat.ST_MTIME])
+            for path in paths[:extra]:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
 
     def is_binary(self):
         if self.selected:
@@ -257,15 +353,38 @@ class FileViewer(object):
         if self._files:
             return self._files
 
-        if not self.is_extracted():
+        if self._zip_error or not (self.from_zip or self.is_extracted()):
             return {}
         # In case a cron job comes along and deletes the files
         # mid tree building.
         try:
-            self._files = self._get_files()
-            return self._files
+            if self.from_zip:
+                files = self._get_zip_files()
+            else:
+                files = self._get_files()
         except (OSError, IOError):
             return {}
+        except (zipfile.BadZipfile, forms.ValidationError), err:
+            # Reported like a failed extraction, see files.tasks.extract_file.
+            self._zip_error = err
+            task_log.error('Error (%s) listing %s' % (err, self.src))
+            if settings.DEBUG:
+                msg = (_('There was an error accessing file %s. %s.') %
+                       (self, err))
+            else:
+                msg = _('There was an error accessing file %s.') % self
+            Message('file-viewer:%s' % self).save(msg)
+            return {}
+
+        # The listings are cached for every locale, the urls are not.
+        url_prefix = 'mkt.%s' if self.is_webapp else '%s'
+        for short, file in files.items():
+            file['url'] = reverse(url_prefix % 'files.list',
+                                  args=[self.file.id, 'file', short])
+            file['url_serve'] = reverse(url_prefix % 'files.redirect',
+                                        args=[self.file.id, short])
+        self._files = files
+        return files
 
     def truncate(self, filename, pre_length=15,
                  post_length=10, ellipsis=u'..'):
@@ -322,35 +441,91 @@ class FileViewer(object):
 
         iterate(self.dest)
 
-        url_prefix = 'mkt.%s' if self.is_webapp else '%s'
         for path in all_files:
-            filename = smart_unicode(os.path.basename(path), errors='replace')
             short = smart_unicode(path[len(self.dest) + 1:], errors='replace')
-            mime, encoding = mimetypes.guess_type(filename)
-            if not mime and filename == 'manifest.webapp':
-                mime = 'application/x-web-app-manifest+json'
             directory = os.path.isdir(path)
+            stats = os.stat(path)
+            res[short] = self._get_file(
+                short, path, directory, stats[stat.ST_SIZE],
+                stats[stat.ST_MTIME],
+                md5=get_md5(path) if not directory else '')
+
+        return res
 
-            res[short] = {
-                'binary': self._is_binary(mime, path),
-                'depth': short.count(os.sep),
-                'directory': directory,
-                'filename': filename,
-                'full': path,
-                'md5': get_md5(path) if not directory else '',
-                'mimetype': mime or 'application/octet-stream',
-                'syntax': self.get_syntax(filename),
-                'modified': os.stat(path)[stat.ST_MTIME],
-                'short': short,
-                'size': os.stat(path)[stat.ST_SIZE],
-                'truncated': self.truncate(filename),
-                'url': reverse(url_prefix % 'files.list',
-                               args=[self.file.id, 'file', short]),
-                'url_serve': reverse(url_prefix % 'files.redirect',
-                                     args=[self.file.id, short]),
-                'version': self.file.version.version,
-            }
+    @memoize(prefix='file-viewer-zip', time=60 * 60)
+    def _get_zip_files(self):
+        # The archives may not have entries for their directories, the
+        # nested archives are directories too.
+        found = {}
+        for path, info, members, directory in NestedZip(self.src).walk():
+            short = smart_unicode(path, errors='replace')
+            found[short] = (info, members, directory)
+            parent = os.path.dirname(short)
+            while parent and parent not in found:
+                found[parent] = (None, (), True)
+                parent = os.path.dirname(parent)
+
+        children = collections.defaultdict(list)
+        for short in found:
+            children[os.path.dirname(short)].append(short)
+
+        res = SortedDict()
+
+        # In the same order as `_get_files`.
+        def iterate(parent):
+            shorts = sorted(children[parent])
+            for short in shorts:
+                info, members, directory = found[short]
+                if directory:
+                    res[short] = self._get_zip_file(short, info, True)
+                    iterate(short)
+            for short in shorts:
+                info, members, directory = found[short]
+                if not directory:
+                    res[short] = self._get_zip_file(short, info, False,
+                                                    members=members)
+
+        iterate('')
+        return res
 
+    def _get_zip_file(self, short, info, directory, members=()):
+        full = os.path.join(self.members, hashlib.md5(
+            '%s:%s' % (self.file.pk, smart_str(short))).hexdigest())
+        modified = (time.mktime(info.date_time + (0, 0, -1)) if info
+                    else time.time())
+        size = info.file_size if info and not directory else 0
+        # The CRC is enough to tell if files differ, the md5 and the magic
+        # numbers are only looked at for the selected file, see `select`.
+        crc = '%08x' % (info.CRC & 0xffffffff) if info else ''
+        return self._get_file(short, full, directory, size, modified,
+                              head='', md5='', crc=crc, members=members)
+
+    def _get_file(self, short, full, directory, size, modified, head=None,
+                  **kw):
+        """
+        The info of a file for `get_files`. Its content is only looked at to
+        tell if it's binary if `head` is None, otherwise `head` is.
+        """
+        filename = os.path.basename(short)
+        mime, encoding = mimetypes.guess_type(filename)
+        if not mime and filename == 'manifest.webapp':
+            mime = 'application/x-web-app-manifest+json'
+        res = {
+            'binary': self._is_binary(mime, full if head is None else short,
+                                      head),
+            'depth': short.count(os.sep),
+            'directory': directory,
+            'filename': filename,
+            'full': full,
+            'mimetype': mime or 'application/octet-stream',
+            'syntax': self.get_syntax(filename),
+            'modified': modified,
+            'short': short,
+            'size': size,
+            'truncated': self.truncate(filename),
+            'version': self.file.version.version,
+        }
+        res.update(kw)
         return res
 
 
@@ -391,10 +566,12 @@ class DiffHelper(object):
         """
         left_files = self.left.get_files()
         right_files = self.right.get_files()
+        # Files from the zip index only have an md5 once selected.
+        checksum = lambda f: f.get('crc') or f.get('md5')
         different = []
         for key, file in left_files.items():
             file['url'] = self.get_url(file['short'])
-            diff = file['md5'] != right_files.get(key, {}).get('md5')
+            diff = checksum(file) != checksum(right_files.get(key, {}))
             file['diff'] = diff
             if diff:
                 different.append(file)
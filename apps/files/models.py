@@ -481,7 +481,9 @@ def check_file(old_attr, new_attr, instance, sender, **kw):
 @File.on_change
 def clear_d2c_version(old_attr, new_attr, instance, sender, **kw):
     do_clear = False
-    fields = ['status', 'strict_compatibility', 'binary_components']
+    fields = ['status', 'strict_compatibility', 'binary_components',
+              # These end up in the responses of services/update.py.
+              'hash', 'filename', 'platform_id']
 
     for field in fields:
         if old_attr[field] != new_attr[field]:
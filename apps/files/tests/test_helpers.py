@@ -11,9 +11,11 @@ from django import forms
 
 from mock import Mock, patch
 from nose.tools import eq_
+from waffle.models import Switch
 
 import amo.tests
 from amo.urlresolvers import reverse
+from amo.utils import Message
 from files.helpers import FileViewer, DiffHelper
 from files.models import File
 from files.utils import SafeUnzip
@@ -348,6 +350,117 @@ class TestDiffHelper(amo.tests.TestCase):
         open(path, 'w').write(data)
 
 
+class TestZipFileHelper(amo.tests.TestCase):
+
+    def setUp(self):
+        Switch.objects.create(name='file-viewer-zip-index', active=True)
+        self.viewer = self.get_viewer('dictionary-test.xpi')
+
+    def tearDown(self):
+        self.viewer.cleanup()
+
+    def get_viewer(self, filename, pk=1):
+        return FileViewer(make_file(pk, get_file(filename)))
+
+    def extracted(self, filename, pk=2):
+        viewer = self.get_viewer(filename, pk=pk)
+        viewer._from_zip = False
+        viewer.extract()
+        self.addCleanup(viewer.cleanup)
+        return viewer
+
+    def test_extracted(self):
+        eq_(self.viewer.is_extracted(), True)
+        assert not os.path.exists(self.viewer.dest)
+
+    def test_search_engine_xml(self):
+        self.viewer.file.version.addon.type = amo.ADDON_SEARCH
+        self.viewer.src = get_file('search.xml')
+        eq_(self.viewer.from_zip, False)
+
+    def test_same_files(self):
+        # The listings are memoized on the file id, so each archive gets its
+        # own ids.
+        for pk, filename in [(10, 'dictionary-test.xpi'), (20, 'recurse.xpi')]:
+            viewer = self.get_viewer(filename, pk=pk)
+            files = viewer.get_files()
+            extracted = self.extracted(filename, pk=pk + 1).get_files()
+            eq_(files.keys(), extracted.keys())
+            for key, file_ in files.items():
+                for attr in ('directory', 'depth', 'mimetype'):
+                    eq_(file_[attr], extracted[key][attr])
+                if not file_['directory']:
+                    eq_(file_['size'], extracted[key]['size'])
+
+    def test_nested(self):
+        files = self.get_viewer('recurse.xpi', pk=3).get_files()
+        nested = 'recurse/somejar.jar/recurse/recurse.xpi/chrome/test.jar'
+        eq_(files[nested]['directory'], True)
+        eq_(files[nested + '/test/test.text']['directory'], False)
+        eq_(len(files[nested + '/test/test.text']['members']), 4)
+        eq_(files['recurse/notazip.jar']['directory'], False)
+
+    def test_bad_zip(self):
+        viewer = self.get_viewer('search.xml', pk=4)
+        eq_(viewer.get_files(), {})
+        eq_(viewer.is_extracted(), False)
+        assert Message('file-viewer:%s' % viewer).get()
+
+    @patch.object(settings, 'FILE_UNZIP_SIZE_LIMIT', 5)
+    def test_invalid_zip(self):
+        viewer = self.get_viewer('recurse.xpi', pk=5)
+        eq_(viewer.get_files(), {})
+        eq_(viewer.is_extracted(), False)
+        assert Message('file-viewer:%s' % viewer).get()
+
+    def test_urls_localized(self):
+        with self.activate(locale='fr'):
+            assert self.viewer.get_files()['install.js']['url'].startswith(
+                '/fr/')
+        viewer = self.get_viewer('dictionary-test.xpi')
+        with self.activate(locale='de'):
+            files = viewer.get_files()
+        assert files['install.js']['url'].startswith('/de/')
+        assert files['install.js']['url_serve'].startswith('/de/')
+
+    def test_select(self):
+        files = self.viewer.get_files()
+        eq_(files['install.js']['md5'], '')
+        self.viewer.select('install.js')
+        extracted = self.extracted('dictionary-test.xpi').get_files()
+        eq_(self.viewer.selected['md5'], extracted['install.js']['md5'])
+        eq_(self.viewer.selected['binary'], False)
+
+    def test_read_file(self):
+        self.viewer.select('install.js')
+        path = os.path.join(self.extracted('dictionary-test.xpi').dest,
+                            'install.js')
+        eq_(self.viewer.read_file(), open(path).read().decode('utf-8'))
+
+    def test_get_path(self):
+        self.viewer.select('install.js')
+        path = self.viewer.get_path(self.viewer.selected)
+        assert path.startswith(self.viewer.members)
+        eq_(open(path).read(), self.viewer._read_file())
+
+    def test_get_path_lru(self):
+        get = lambda key: self.viewer.get_path(self.viewer.get_files()[key])
+        with patch.object(settings, 'FILE_VIEWER_MEMBERS', 1):
+            first, second = get('install.js'), get('install.rdf')
+        assert not os.path.exists(first)
+        assert os.path.exists(second)
+
+    def test_diff(self):
+        helper = DiffHelper(make_file(1, get_file('dictionary-test.xpi')),
+                            make_file(2, get_file('dictionary-test.xpi')))
+        assert not any(f['diff'] for f in helper.get_files().values())
+        helper = DiffHelper(make_file(3, get_file('recurse.xpi')),
+                            make_file(2, get_file('dictionary-test.xpi')))
+        files = helper.get_files()
+        assert 'recurse/somejar.jar/recurse/recurse.xpi' in files
+        assert all(f['diff'] for f in files.values())
+
+
 class TestSafeUnzipFile(amo.tests.TestCase, amo.tests.AMOPaths):
 
     #TODO(andym): get full coverage for existing SafeUnzip methods, most
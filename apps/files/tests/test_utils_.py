@@ -1,12 +1,23 @@
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django import forms
+from django.conf import settings
+
+from mock import patch
 from nose.tools import eq_
 
 import amo.tests
 import files.utils
 from addons.models import Addon
 from files.models import File
-from files.utils import find_jetpacks
+from files.utils import extract_xpi, find_jetpacks
 from versions.models import Version
 
+root = os.path.join(settings.ROOT, 'apps/files/fixtures/files')
+
 
 class TestFindJetpacks(amo.tests.TestCase):
     fixtures = ['base/addon_3615']
@@ -62,3 +73,63 @@ class TestFindJetpacks(amo.tests.TestCase):
         File.objects.update(builder_version='2.0.1')
         files = find_jetpacks('.1', '1.0', from_builder_only=True)
         eq_(files, [self.file])
+
+
+class TestExtractXpi(amo.tests.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dest = os.path.join(self.tmp, 'extracted', 'dest')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def extract(self, name, expand=True):
+        extract_xpi(os.path.join(root, name), self.dest, expand=expand)
+
+    def path(self, name):
+        return os.path.join(self.dest, name)
+
+    def test_extract(self):
+        self.extract('dictionary-test.xpi', expand=False)
+        zip = zipfile.ZipFile(os.path.join(root, 'dictionary-test.xpi'))
+        for info in zip.infolist():
+            if not info.filename.endswith('/'):
+                eq_(open(self.path(info.filename)).read(),
+                    zip.read(info.filename))
+        eq_(os.listdir(os.path.dirname(self.dest)), ['dest'])
+
+    def test_not_expanded(self):
+        self.extract('recurse.xpi', expand=False)
+        assert os.path.isfile(self.path('recurse/somejar.jar'))
+
+    def test_expanded(self):
+        self.extract('recurse.xpi')
+        nested = 'recurse/somejar.jar/recurse/recurse.xpi/chrome/test.jar'
+        assert os.path.isdir(self.path(nested))
+        assert os.path.isfile(self.path(nested + '/test/test.text'))
+        assert os.path.isfile(self.path('recurse/recurse.xpi/chrome/'
+                                        'test-root.txt'))
+
+    def test_not_a_zip(self):
+        self.extract('recurse.xpi')
+        eq_(open(self.path('recurse/notazip.jar')).read(), 'not a zip\n')
+
+    def test_replace(self):
+        os.makedirs(self.path('old'))
+        self.extract('recurse.xpi')
+        assert not os.path.exists(self.path('old'))
+        assert os.path.isdir(self.path('recurse'))
+
+    @patch.object(settings, 'FILE_UNZIP_SIZE_LIMIT', 5)
+    def test_too_big(self):
+        with self.assertRaises(forms.ValidationError):
+            self.extract('recurse.xpi')
+        eq_(os.listdir(os.path.dirname(self.dest)), [])
+
+    @patch('files.utils.NestedZip.max_depth', 1)
+    def test_max_depth(self):
+        self.extract('recurse.xpi')
+        assert os.path.isdir(self.path('recurse/somejar.jar/recurse'))
+        assert os.path.isfile(self.path('recurse/somejar.jar/recurse/'
+                                        'recurse.xpi'))
@@ -1,4 +1,5 @@
 import collections
+import contextlib
 import glob
 import hashlib
 import json
@@ -39,6 +40,9 @@ class ParseError(forms.ValidationError):
     pass
 
 
+# Nested archives bigger than this many bytes are spooled to disk.
+SPOOL_SIZE = 2 ** 22
+
 VERSION_RE = re.compile('^[-+*.\w]{,32}$')
 SIGNED_RE = re.compile('^META\-INF/(\w+)\.(rsa|sf)$')
 # The default update URL.
@@ -388,6 +392,85 @@ class SafeUnzip(object):
         self.zip.close()
 
 
+class NestedZip(object):
+    """
+    Read a zip file and the .jar and .xpi files inside it as the tree
+    `extract_xpi(source, path, expand=True)` would extract, without
+    extracting anything. Every archive goes through the SafeUnzip checks.
+
+    The nested archives are spooled, they are only written to disk when they
+    are bigger than SPOOL_SIZE.
+    """
+    expand = ('.jar', '.xpi')
+    # extract_xpi doesn't expand more than 10 levels either.
+    max_depth = 10
+
+    def __init__(self, source):
+        self.source = source
+
+    def walk(self):
+        """
+        Yield (path, ZipInfo, members, directory) for every member of the
+        archives. `members` are the names to go through to get to the member
+        from the outer archive, see `open`. The nested archives are
+        directories.
+        """
+        zip = SafeUnzip(self.source)
+        zip.is_valid(fatal=True)
+        try:
+            for found in self._walk(zip, (), ''):
+                yield found
+        finally:
+            zip.close()
+
+    def _walk(self, zip, members, prefix):
+        for info in zip.info:
+            name = info.filename
+            path = prefix + name.rstrip('/')
+            if name.endswith('/'):
+                yield path, info, members + (name,), True
+                continue
+            nested = None
+            if (os.path.splitext(name)[1] in self.expand and
+                    len(members) < self.max_depth):
+                nested = self._open_nested(zip, info)
+            if not nested:
+                yield path, info, members + (name,), False
+                continue
+            yield path, info, members + (name,), True
+            try:
+                for found in self._walk(nested, members + (name,),
+                                        path + '/'):
+                    yield found
+            finally:
+                nested.close()
+
+    def _open_nested(self, zip, info):
+        """The SafeUnzip of the archive at `info`, None if it isn't one."""
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        shutil.copyfileobj(zip.zip.open(info), spooled)
+        nested = SafeUnzip(spooled)
+        if nested.is_valid(fatal=False):
+            return nested
+        spooled.close()
+
+    @contextlib.contextmanager
+    def open(self, members):
+        """A file object reading the member at the end of `members`."""
+        opened = [zipfile.ZipFile(self.source)]
+        try:
+            for name in members[:-1]:
+                spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+                shutil.copyfileobj(opened[-1].open(name), spooled)
+                opened.append(zipfile.ZipFile(spooled))
+            member = opened[-1].open(members[-1])
+            yield member
+            member.close()
+        finally:
+            for zip in reversed(opened):
+                zip.close()
+
+
 def extract_zip(source, remove=False, fatal=True):
     """Extracts the zip file. If remove is given, removes the source file."""
     tempdir = tempfile.mkdtemp()
@@ -420,31 +503,92 @@ def extract_xpi(xpi, path, expand=False):
     """
     If expand is given, will look inside the expanded file
     and find anything in the whitelist and try and expand it as well.
-    It will do up to 10 iterations, after that you are on your own.
+    It will go down up to 10 levels, after that you are on your own.
 
     It will replace the expanded file with a directory and the expanded
     contents. If you have 'foo.jar', that contains 'some-image.jpg', then
     it will create a folder, foo.jar, with an image inside.
+
+    Everything is extracted in one pass to a directory next to `path`, which
+    is then moved in place. The nested archives are read from memory, or
+    from disk when they are bigger than SPOOL_SIZE, so only their members
+    are written.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    tempdir = tempfile.mkdtemp(dir=parent)
+    try:
+        zip = SafeUnzip(xpi)
+        zip.is_valid(fatal=True)
+        try:
+            _extract_members(zip, tempdir, expand, 0)
+        finally:
+            zip.close()
+    except:
+        rm_local_tmp_dir(tempdir)
+        raise
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tempdir, path)
+
+
+def _extract_members(zip, dest, expand, depth):
+    """Extract the SafeUnzip `zip` to `dest`, and its archives if `expand`."""
+    for info in zip.info:
+        target = os.path.join(dest, info.filename)
+        if info.filename.endswith('/'):
+            if not os.path.isdir(target):
+                os.makedirs(target)
+            continue
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+
+        nested = (expand and depth < NestedZip.max_depth and
+                  os.path.splitext(info.filename)[1] in NestedZip.expand)
+        if not nested:
+            with contextlib.closing(zip.zip.open(info)) as source:
+                with open(target, 'wb') as f:
+                    _copy_member(zip, info, source, f)
+            continue
+
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        try:
+            with contextlib.closing(zip.zip.open(info)) as source:
+                _copy_member(zip, info, source, spooled)
+            archive = SafeUnzip(spooled)
+            if archive.is_valid(fatal=False):
+                os.makedirs(target)
+                try:
+                    _extract_members(archive, target, expand, depth + 1)
+                finally:
+                    archive.close()
+            else:
+                # Not an archive after all, it is extracted as it is.
+                spooled.seek(0)
+                with open(target, 'wb') as f:
+                    shutil.copyfileobj(spooled, f)
+        finally:
+            spooled.close()
+
+
+def _copy_member(zip, info, source, dest):
+    """
+    Copy the member `info` of `zip` from `source` to `dest`, checking that
+    it has the size the archive says it has.
     """
-    expand_whitelist = ['.jar', '.xpi']
-    tempdir = extract_zip(xpi)
-
-    if expand:
-        for x in xrange(0, 10):
-            flag = False
-            for root, dirs, files in os.walk(tempdir):
-                for name in files:
-                    if os.path.splitext(name)[1] in expand_whitelist:
-                        src = os.path.join(root, name)
-                        if not os.path.isdir(src):
-                            dest = extract_zip(src, remove=True, fatal=False)
-                            if dest:
-                                copy_over(dest, src)
-                                flag = True
-            if not flag:
-                break
-
-    copy_over(tempdir, path)
+    size = 0
+    while True:
+        data = source.read(2 ** 16)
+        if not data:
+            break
+        size += len(data)
+        dest.write(data)
+    if size != info.file_size:
+        log.error('Extraction error, uncompressed size: %s, %s not %s'
+                  % (zip.source, size, info.file_size))
+        raise forms.ValidationError(_('Invalid archive.'))
 
 
 def parse_xpi(xpi, addon=None):
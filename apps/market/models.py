@@ -13,7 +13,7 @@ from tower import ugettext_lazy as _
 import amo
 import amo.models
 from amo.decorators import write
-from amo.utils import get_locale_from_lang, memoize_key
+from amo.utils import cache_ns_key, get_locale_from_lang, memoize_key
 from constants.payments import (CARRIER_CHOICES, PAYMENT_METHOD_ALL,
                                 PAYMENT_METHOD_CHOICES, PROVIDER_BANGO,
                                 PROVIDER_CHOICES)
@@ -178,6 +178,28 @@ class AddonPurchase(amo.models.ModelBase):
         return u'%s: %s' % (self.addon, self.user)
 
 
+def receipt_ns(addon_id, user_id):
+    """
+    The cache namespace services/verify.py keeps the install and purchase
+    checks of the receipts of `user_id` for `addon_id` in.
+    """
+    return 'receipt-verify:%s:%s' % (addon_id, user_id)
+
+
+def invalidate_receipt_checks(sender, instance, **kw):
+    """Refunds, chargebacks and uninstalls must reach verified receipts."""
+    cache_ns_key(receipt_ns(instance.addon_id, instance.user_id),
+                 increment=True)
+
+
+models.signals.post_save.connect(invalidate_receipt_checks,
+                                 sender=AddonPurchase,
+                                 dispatch_uid='addon_purchase_receipts')
+models.signals.post_delete.connect(invalidate_receipt_checks,
+                                   sender=AddonPurchase,
+                                   dispatch_uid='addon_purchase_receipts')
+
+
 @write
 @receiver(models.signals.post_save, sender=Contribution,
           dispatch_uid='create_addon_purchase')
@@ -0,0 +1,18 @@
+import commonware.log
+import cronjobs
+from celery.task.sets import TaskSet
+
+from amo.utils import chunked
+from addons.models import Addon
+from .tasks import update_reviews
+
+log = commonware.log.getLogger('z.cron')
+
+
+@cronjobs.register
+def review_aggregates():
+    """Recompute the review denorms and aggregates of every add-on."""
+    ids = list(Addon.uncached.values_list('id', flat=True).order_by('id'))
+    log.info('Updating reviews of %s add-ons.' % len(ids))
+    ts = [update_reviews.subtask(args=[chunk]) for chunk in chunked(ids, 500)]
+    TaskSet(ts).apply_async()
@@ -1,6 +1,7 @@
 import logging
 
-from django.db.models import Count, Avg, F
+from django.db import connections, transaction
+from django.db.models import Avg
 
 import caching.base as caching
 from celeryutils import task
@@ -11,6 +12,135 @@ from .models import Review, GroupedRating
 log = logging.getLogger('z.task')
 
 
+# The denormalized fields of the reviews matching {where}: how many reviews
+# the user wrote for the add-on before this one and whether there is none
+# after it. Ties on `created` are broken by id.
+denorm_sql = """
+    SELECT r.id,
+           SUM(q.created < r.created OR
+               (q.created = r.created AND q.id < r.id)),
+           SUM(q.created > r.created OR
+               (q.created = r.created AND q.id > r.id)) = 0
+    FROM reviews r
+    INNER JOIN reviews q
+        ON q.addon_id = r.addon_id AND q.user_id = r.user_id
+        AND q.reply_to IS NULL
+    WHERE r.reply_to IS NULL AND ({where})
+    GROUP BY r.id"""
+
+# The number of latest reviews and the average rating of all the reviews of
+# the add-ons in {ids}. Add-ons without any review get 0 for both.
+aggregates_sql = """
+    SELECT addons.id, COUNT(IF(r.is_latest, 1, NULL)),
+           IF(COUNT(r.id), AVG(r.rating), 0)
+    FROM addons
+    LEFT JOIN reviews r ON r.addon_id = addons.id AND r.reply_to IS NULL
+    WHERE addons.id IN ({ids})
+    GROUP BY addons.id"""
+
+# Add-ons without an average rating are left alone.
+bayesian_sql = """
+    SELECT id, IF(totalreviews,
+                  (%s + totalreviews * averagerating) / (%s + totalreviews),
+                  0)
+    FROM addons
+    WHERE id IN ({ids}) AND averagerating IS NOT NULL"""
+
+
+def _ids(ids):
+    return ','.join(str(int(i)) for i in ids)
+
+
+def _bulk_update(cursor, target, columns, select, params=()):
+    """
+    Stage the rows of `select` in a temporary table, an id followed by a value
+    for each of `columns` of `target` (name, type), then copy them to the
+    rows of `target` that differ in a single UPDATE. Returns their ids.
+    """
+    table = '%s_tmp' % target
+    cursor.execute('DROP TEMPORARY TABLE IF EXISTS %s' % table)
+    cursor.execute('CREATE TEMPORARY TABLE %s (id int unsigned PRIMARY KEY, '
+                   '%s)' % (table, ', '.join('%s %s' % c for c in columns)))
+    cursor.execute('INSERT INTO %s %s' % (table, select), params)
+
+    join = '%s INNER JOIN %s t ON %s.id = t.id' % (target, table, target)
+    cursor.execute('SELECT t.id FROM %s WHERE NOT (%s)' % (join, ' AND '.join(
+        '%s.%s <=> t.%s' % (target, name, name) for name, type in columns)))
+    ids = [row[0] for row in cursor.fetchall()]
+    if ids:
+        cursor.execute('UPDATE %s SET %s WHERE t.id IN (%s)' % (
+            join, ', '.join('%s.%s = t.%s' % (target, name, name)
+                            for name, type in columns), _ids(ids)))
+    cursor.execute('DROP TEMPORARY TABLE %s' % table)
+    return ids
+
+
+def bulk_denorm(where, using='default'):
+    """
+    Set previous_count and is_latest of the reviews matching `where` (a
+    condition on the `r` alias) with one grouped query and one UPDATE of the
+    reviews that changed, which are then invalidated at once. Returns their
+    ids.
+    """
+    cursor = connections[using].cursor()
+    ids = _bulk_update(cursor, 'reviews',
+                       [('previous_count', 'int unsigned'),
+                        ('is_latest', 'bool')],
+                       denorm_sql.format(where=where))
+    transaction.commit_unless_managed(using=using)
+    if ids:
+        # All our updates were sql, so invalidate manually.
+        Review.objects.invalidate(
+            *Review.objects.no_cache().using(using).filter(id__in=ids))
+    return ids
+
+
+def bayesian_averages():
+    """The average rating and number of reviews of all the add-ons."""
+    f = lambda: Addon.objects.aggregate(rating=Avg('average_rating'),
+                                        reviews=Avg('total_reviews'))
+    return caching.cached(f, 'task.bayes.avg', 60 * 60 * 60)
+
+
+def _bulk_bayesian(cursor, addons):
+    avg = bayesian_averages()
+    # Rating can be NULL in the DB, so don't update it if it's not there.
+    if avg['rating'] is None:
+        return []
+    return _bulk_update(cursor, 'addons', [('bayesianrating', 'float')],
+                        bayesian_sql.format(ids=_ids(addons)),
+                        [avg['reviews'] * avg['rating'], avg['reviews']])
+
+
+def _invalidate_addons(ids, using):
+    from addons.tasks import index_addons
+    if ids:
+        Addon.objects.invalidate(*Addon.uncached.using(using)
+                                 .filter(id__in=ids).no_transforms())
+        index_addons.delay(ids)
+
+
+def bulk_aggregates(addons, using='default'):
+    """
+    Set total_reviews, average_rating and then bayesian_rating of `addons`
+    with grouped queries and one UPDATE each of the add-ons that changed,
+    which are then invalidated and reindexed at once. Returns their ids.
+    """
+    if not addons:
+        return []
+    cursor = connections[using].cursor()
+    ids = _bulk_update(cursor, 'addons',
+                       [('totalreviews', 'int unsigned'),
+                        ('averagerating', 'float')],
+                       aggregates_sql.format(ids=_ids(addons)))
+    transaction.commit_unless_managed(using=using)
+    # The averages include the aggregates we just updated.
+    ids = sorted(set(ids).union(_bulk_bayesian(cursor, addons)))
+    transaction.commit_unless_managed(using=using)
+    _invalidate_addons(ids, using)
+    return ids
+
+
 @task(rate_limit='50/m')
 def update_denorm(*pairs, **kw):
     """
@@ -19,46 +149,19 @@ def update_denorm(*pairs, **kw):
     """
     log.info('[%s@%s] Updating review denorms.' %
              (len(pairs), update_denorm.rate_limit))
-    using = kw.get('using')
-    for addon, user in pairs:
-        reviews = list(Review.objects.valid().no_cache().using(using)
-                       .filter(addon=addon, user=user).order_by('created'))
-        if not reviews:
-            continue
-
-        for idx, review in enumerate(reviews):
-            review.previous_count = idx
-            review.is_latest = False
-        reviews[-1].is_latest = True
-
-        for review in reviews:
-            review.save()
+    if not pairs:
+        return
+    where = ' OR '.join('(r.addon_id = %s AND r.user_id = %s)'
+                        % (int(addon), int(user)) for addon, user in pairs)
+    bulk_denorm(where, using=kw.get('using') or 'default')
 
 
 @task
 def addon_review_aggregates(*addons, **kw):
-    log.info('[%s@%s] Updating total reviews.' %
+    log.info('[%s@%s] Updating review aggregates.' %
              (len(addons), addon_review_aggregates.rate_limit))
     using = kw.get('using')
-    addon_objs = list(Addon.objects.filter(pk__in=addons))
-    stats = dict(Review.objects.valid().no_cache().using(using)
-                 .filter(addon__in=addons, is_latest=True)
-                 .values_list('addon')
-                 .annotate(Count('addon')))
-    for addon in addon_objs:
-        addon.update(total_reviews=stats.get(addon.id, 0))
-
-    log.info('[%s@%s] Updating average ratings.' %
-             (len(addons), addon_review_aggregates.rate_limit))
-    stats = dict(Review.objects.valid().no_cache().using(using)
-                 .filter(addon__in=addons)
-                 .values_list('addon')
-                 .annotate(Avg('rating')))
-    for addon in addon_objs:
-        addon.update(average_rating=stats.get(addon.id, 0))
-
-    # Delay bayesian calculations to avoid slave lag.
-    addon_bayesian_rating.apply_async(args=addons, countdown=5)
+    bulk_aggregates(addons, using=using or 'default')
     addon_grouped_rating.apply_async(args=addons, kwargs={'using': using})
 
 
@@ -66,25 +169,11 @@ def addon_review_aggregates(*addons, **kw):
 def addon_bayesian_rating(*addons, **kw):
     log.info('[%s@%s] Updating bayesian ratings.' %
              (len(addons), addon_bayesian_rating.rate_limit))
-    f = lambda: Addon.objects.aggregate(rating=Avg('average_rating'),
-                                        reviews=Avg('total_reviews'))
-    avg = caching.cached(f, 'task.bayes.avg', 60 * 60 * 60)
-    # Rating can be NULL in the DB, so don't update it if it's not there.
-    if avg['rating'] is None:
+    if not addons:
         return
-    mc = avg['reviews'] * avg['rating']
-    for addon in Addon.uncached.filter(id__in=addons):
-        if addon.average_rating is None:
-            # Ignoring addons with no average rating.
-            continue
-
-        q = Addon.objects.filter(id=addon.id)
-        if addon.total_reviews:
-            num = mc + F('total_reviews') * F('average_rating')
-            denom = avg['reviews'] + F('total_reviews')
-            q.update(bayesian_rating=num / denom)
-        else:
-            q.update(bayesian_rating=0)
+    ids = _bulk_bayesian(connections['default'].cursor(), addons)
+    transaction.commit_unless_managed(using='default')
+    _invalidate_addons(ids, 'default')
 
 
 @task
@@ -96,3 +185,14 @@ def addon_grouped_rating(*addons, **kw):
     using = kw.get('using')
     for addon in addons:
         GroupedRating.set(addon, using=using)
+
+
+@task
+def update_reviews(ids, **kw):
+    """Recompute the review denorms and aggregates of the add-ons `ids`."""
+    log.info('[%s@%s] Updating reviews of add-ons %s-%s.' %
+             (len(ids), update_reviews.rate_limit, ids[0], ids[-1]))
+    reviews = bulk_denorm('r.addon_id IN (%s)' % _ids(ids))
+    addons = bulk_aggregates(ids)
+    log.info('Updated %s reviews and %s add-ons.'
+             % (len(reviews), len(addons)))
@@ -1,5 +1,6 @@
 from django.utils import translation
 
+import mock
 from nose.tools import eq_
 import test_utils
 
@@ -57,6 +58,53 @@ class TestGroupedRating(amo.tests.TestCase):
         eq_(GroupedRating.get(1865, update_none=True), self.grouped_ratings)
 
 
+class TestReviewTasks(amo.tests.TestCase):
+    fixtures = ['base/apps', 'base/platforms', 'reviews/test_models']
+
+    def setUp(self):
+        patcher = mock.patch('addons.tasks.index_addons.delay')
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def denorms(self):
+        return list(Review.objects.no_cache().order_by('id')
+                    .values_list('id', 'previous_count', 'is_latest'))
+
+    def test_update_denorm(self):
+        Review.objects.update(previous_count=5, is_latest=True)
+        tasks.update_denorm((4, 1))
+        eq_(self.denorms(), [(1, 0, False), (2, 1, True)])
+
+    def test_review_aggregates(self):
+        tasks.update_denorm((4, 1))
+        tasks.addon_review_aggregates(4)
+        addon = Addon.objects.no_cache().get(id=4)
+        eq_(addon.total_reviews, 1)
+        eq_(addon.average_rating, 4)
+        eq_(addon.bayesian_rating, 4)
+        self.index.assert_called_with([4])
+
+    def test_update_reviews(self):
+        Review.objects.update(previous_count=0, is_latest=True)
+        tasks.update_reviews([4])
+        eq_(self.denorms(), [(1, 0, False), (2, 1, True)])
+        eq_(Addon.objects.no_cache().get(id=4).total_reviews, 1)
+
+        # Nothing changed, nothing is written or reindexed.
+        self.index.reset_mock()
+        eq_(tasks.bulk_denorm('r.addon_id = 4'), [])
+        eq_(tasks.bulk_aggregates([4]), [])
+        assert not self.index.called
+
+    def test_no_reviews(self):
+        Review.objects.all().delete()
+        Addon.objects.filter(id=4).update(total_reviews=3, average_rating=2)
+        tasks.update_reviews([4])
+        addon = Addon.objects.no_cache().get(id=4)
+        eq_(addon.total_reviews, 0)
+        eq_(addon.average_rating, 0)
+
+
 class TestSpamTest(amo.tests.TestCase):
     fixtures = ['base/apps', 'base/platforms', 'reviews/test_models']
 
@@ -0,0 +1,9 @@
+import cronjobs
+
+from . import suggestions
+
+
+@cronjobs.register
+def build_suggestions():
+    """Build the search suggestions index from all the public add-ons."""
+    suggestions.rebuild()
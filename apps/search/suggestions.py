@@ -0,0 +1,259 @@
+"""
+A prefix index of the names, slugs and authors of the public add-ons and
+apps, kept in the cache so the search suggestions are answered without
+Elasticsearch or the database.
+
+Terms are lowercased and kept in buckets keyed on their locale and first
+PREFIX characters, as sorted lists of (term, -popularity, id, type), so a
+lookup is a bisect in the bucket of the user's language and in the one for
+names in the default locale, slugs and authors. The suggestion itself (name
+in each locale, url, icon and rating) is precomputed under its own key.
+
+Everything is written under a generation set by `rebuild`, which a cron runs
+every hour. In between, the indexing tasks call `update` and `remove` for
+the add-ons they index, which are retried later by `update_suggestions` if
+another writer holds the index. Until there is a generation, `search`
+returns None and the callers fall back to Elasticsearch.
+"""
+import bisect
+import collections
+import hashlib
+import logging
+import time
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.encoding import smart_str
+
+from django_statsd.clients import statsd
+
+import amo
+from addons.models import Addon, attach_translations
+from amo.urlresolvers import get_url_prefix
+from amo.utils import chunked
+
+log = logging.getLogger('z.search')
+
+# Number of characters the buckets are keyed on, the shortest query we answer.
+PREFIX = 3
+# Number of entries kept in a bucket, the least popular are dropped.
+BUCKET_SIZE = 1000
+
+GENERATION = 'suggest:generation'
+LOCK = 'suggest:lock'
+# Times an update finding the index busy is retried, RETRY_DELAY apart.
+RETRIES = 3
+RETRY_DELAY = 60
+
+# The add-on properties the payloads stand in for, by the name
+# `BaseAjaxSearch` gives them.
+FIELDS = {'id': 'id', 'name': 'name', 'url': 'get_url_path',
+          'icon': 'icon_url', 'rating': 'average_rating'}
+
+
+def bucket_key(generation, locale, prefix):
+    return 'suggest:%s:%s:%s' % (generation, locale,
+                                 hashlib.md5(smart_str(prefix)).hexdigest())
+
+
+def payload_key(generation, id):
+    return 'suggest:%s:addon:%s' % (generation, id)
+
+
+def public(ids):
+    """The add-ons of `ids` that should be suggested."""
+    addons = list(Addon.objects.no_cache().filter(
+        id__in=ids, status__in=amo.REVIEWED_STATUSES, disabled_by_user=False))
+    attach_translations(addons)
+    return addons
+
+
+def popularity(addon):
+    if addon.type in (amo.ADDON_WEBAPP, amo.ADDON_PERSONA):
+        return addon.weekly_downloads or 0
+    return addon.average_daily_users or 0
+
+
+def terms(addon):
+    """The (locale, term) pairs `addon` can be found by."""
+    default = addon.default_locale.lower()
+    found = set()
+    for locale, name in addon.translations[addon.name_id]:
+        locale = locale.lower()
+        locale = '' if locale == default else locale
+        name = name.strip().lower()
+        found.update((locale, term) for term in [name] + name.split())
+    others = [addon.slug, addon.app_slug]
+    others += [a.name for a in addon.listed_authors]
+    found.update(('', unicode(term).lower()) for term in others if term)
+    return sorted((locale, term) for locale, term in found
+                  if len(term) >= PREFIX)
+
+
+def payload(addon):
+    return {'id': addon.id, 'type': addon.type,
+            'names': dict((locale.lower(), name) for locale, name
+                          in addon.translations[addon.name_id]),
+            'default_locale': addon.default_locale.lower(),
+            'url': addon.get_url_path(add_prefix=False),
+            'icon': addon.icon_url, 'rating': addon.average_rating,
+            'popularity': popularity(addon), 'terms': terms(addon)}
+
+
+def entries(generation, payload):
+    """The (bucket key, entry) of each term of `payload`."""
+    for locale, term in payload['terms']:
+        yield (bucket_key(generation, locale, term[:PREFIX]),
+               (term, -payload['popularity'], payload['id'], payload['type']))
+
+
+def trim(bucket):
+    if len(bucket) > BUCKET_SIZE:
+        bucket = sorted(bucket, key=itemgetter(1))[:BUCKET_SIZE]
+    return sorted(bucket)
+
+
+def rebuild():
+    generation = int(time.time())
+    ids = (Addon.objects.filter(status__in=amo.REVIEWED_STATUSES,
+                                disabled_by_user=False)
+           .values_list('id', flat=True))
+    buckets = collections.defaultdict(list)
+    for chunk in chunked(list(ids), 300):
+        payloads = {}
+        for addon in public(chunk):
+            p = payloads[payload_key(generation, addon.id)] = payload(addon)
+            for key, entry in entries(generation, p):
+                buckets[key].append(entry)
+        cache.set_many(payloads, settings.SUGGESTIONS_TIMEOUT)
+    for chunk in chunked(buckets.keys(), 300):
+        cache.set_many(dict((key, trim(buckets[key])) for key in chunk),
+                       settings.SUGGESTIONS_TIMEOUT)
+    cache.set(GENERATION, generation, settings.SUGGESTIONS_TIMEOUT)
+    log.info('Built the suggestions index %s with %s terms.'
+             % (generation, len(buckets)))
+
+
+def lock():
+    """Take the index for writing, return False if another writer has it."""
+    return cache.add(LOCK, 1, 30)
+
+
+def update(ids):
+    """Replace the entries of the add-ons `ids` in the index, if there is
+    one. Those that are no longer public are removed."""
+    _replace(ids, False)
+
+
+def remove(ids):
+    """Remove the add-ons `ids` from the index, if there is one."""
+    _replace(ids, True)
+
+
+def _replace(ids, removing):
+    if not replace(ids, removing):
+        # We can't merge with what the other writer has, so try again later.
+        from search.tasks import update_suggestions
+        update_suggestions.apply_async(args=[ids], countdown=RETRY_DELAY,
+                                       kwargs={'remove': removing})
+
+
+def drop(ids):
+    """Remove the add-ons `ids` from the suggestions without the lock, for
+    when the index stayed busy. Their terms are left until the next
+    rebuild, but `search` skips the add-ons without a payload."""
+    generation = cache.get(GENERATION)
+    if generation is None:
+        return
+    log.info('Dropping %s add-ons from the suggestions index, it was busy.'
+             % len(ids))
+    for id in ids:
+        cache.delete(payload_key(generation, id))
+
+
+def replace(ids, removing=False):
+    """
+    Replace the entries of the add-ons `ids` in the index, or remove them if
+    `removing`. Return False, without waiting, if another writer holds the
+    index.
+    """
+    generation = cache.get(GENERATION)
+    if generation is None or not ids:
+        return True
+    if not lock():
+        return False
+    try:
+        keys = dict((payload_key(generation, id), id) for id in ids)
+        old = cache.get_many(keys.keys()).values()
+        fresh = dict((payload_key(generation, addon.id), payload(addon))
+                     for addon in ([] if removing else public(ids)))
+        added = collections.defaultdict(list)
+        for p in fresh.values():
+            for key, entry in entries(generation, p):
+                added[key].append(entry)
+        changed = set(added)
+        for p in old:
+            changed.update(key for key, entry in entries(generation, p))
+        buckets = cache.get_many(list(changed))
+        ids = set(keys.values())
+        for key in changed:
+            bucket = [e for e in buckets.get(key, []) if e[2] not in ids]
+            buckets[key] = trim(bucket + added[key])
+        cache.set_many(buckets, settings.SUGGESTIONS_TIMEOUT)
+        cache.set_many(fresh, settings.SUGGESTIONS_TIMEOUT)
+        for key in set(keys) - set(fresh):
+            cache.delete(key)
+    finally:
+        cache.delete(LOCK)
+    return True
+
+
+def search(q, types, limit, excluded_ids=()):
+    """
+    The suggestions for `q`, at most `limit` add-ons of `types`, most popular
+    first. Each is a dict with the keys of FIELDS, the name in the current
+    language and the url with its prefix.
+
+    Return None if there is no index to search.
+    """
+    generation = cache.get(GENERATION)
+    if generation is None:
+        statsd.incr('search.suggestions.miss')
+        return None
+    q = q.strip().lower()
+    lang = (translation.get_language() or '').lower()
+    if q.isdigit():
+        ids = [int(q)]
+    elif len(q) >= PREFIX:
+        ranks = {}
+        keys = [bucket_key(generation, locale, q[:PREFIX])
+                for locale in ('', lang)]
+        for bucket in cache.get_many(keys).values():
+            for term, rank, id, type in bucket[bisect.bisect_left(bucket,
+                                                                  (q,)):]:
+                if not term.startswith(q):
+                    break
+                if type in types and id not in excluded_ids:
+                    ranks[id] = min(rank, ranks.get(id, rank))
+        ids = sorted(ranks, key=lambda id: (ranks[id], id))[:limit]
+    else:
+        return []
+
+    payloads = cache.get_many([payload_key(generation, id) for id in ids])
+    prefixer = get_url_prefix()
+    results = []
+    for id in ids:
+        p = payloads.get(payload_key(generation, id))
+        if not p or p['type'] not in types or id in excluded_ids:
+            continue
+        url = p['url']
+        if prefixer and url.startswith('/'):
+            url = prefixer.fix(url)
+        names = p['names']
+        results.append({'id': id, 'url': url, 'icon': p['icon'],
+                         'rating': p['rating'],
+                         'name': (names.get(lang) or
+                                  names.get(p['default_locale']) or '')})
+    return results
@@ -0,0 +1,17 @@
+from celery.exceptions import MaxRetriesExceededError
+from celeryutils import task
+
+from . import suggestions
+
+
+@task(max_retries=suggestions.RETRIES)
+def update_suggestions(ids, remove=False, **kw):
+    """Retry a suggestions update that found the index busy."""
+    if suggestions.replace(ids, remove):
+        return
+    try:
+        update_suggestions.retry(args=[ids], kwargs={'remove': remove},
+                                 countdown=suggestions.RETRY_DELAY)
+    except MaxRetriesExceededError:
+        # Past that, only these add-ons are dropped until the next rebuild.
+        suggestions.drop(ids)
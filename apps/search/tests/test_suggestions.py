@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.core.cache import cache
+
+import mock
+from nose.tools import eq_
+
+import amo
+import amo.tests
+from addons.models import Addon
+from addons.tasks import index_addons
+from amo.urlresolvers import reverse
+from search import suggestions
+from search.views import AddonSuggestionsAjax
+
+
+class TestSuggestions(amo.tests.TestCase):
+
+    def setUp(self):
+        self.firebug = amo.tests.addon_factory(name='Firebug', slug='bugfire',
+                                               average_daily_users=10)
+        self.firefly = amo.tests.addon_factory(name='Firefly dark',
+                                               average_daily_users=100)
+        self.theme = amo.tests.addon_factory(name='Fire theme',
+                                             type=amo.ADDON_PERSONA)
+        suggestions.rebuild()
+        self.types = AddonSuggestionsAjax.types
+
+    def search(self, q, types=None, **kw):
+        return suggestions.search(q, types or self.types, 10, **kw)
+
+    def ids(self, q, **kw):
+        return [s['id'] for s in self.search(q, **kw)]
+
+    def test_no_index(self):
+        cache.delete(suggestions.GENERATION)
+        eq_(self.search('fire'), None)
+
+    def test_prefix_by_popularity(self):
+        eq_(self.ids('fire'), [self.firefly.id, self.firebug.id])
+        eq_(self.ids('fireb'), [self.firebug.id])
+        eq_(self.ids('FIREFLY '), [self.firefly.id])
+        eq_(self.ids('firefox'), [])
+
+    def test_words_and_slug(self):
+        eq_(self.ids('dark'), [self.firefly.id])
+        eq_(self.ids('bugf'), [self.firebug.id])
+
+    def test_short(self):
+        eq_(self.search('fi'), [])
+
+    def test_types(self):
+        eq_(self.ids('fire', types=[amo.ADDON_PERSONA]), [self.theme.id])
+
+    def test_excluded(self):
+        eq_(self.ids('fire', excluded_ids=[self.firefly.id]),
+            [self.firebug.id])
+
+    def test_by_id(self):
+        eq_(self.ids(str(self.firebug.id)), [self.firebug.id])
+        eq_(self.ids(str(self.theme.id)), [])
+
+    def test_payload(self):
+        found = self.search('firebug')[0]
+        eq_(found['name'], u'Firebug')
+        eq_(found['url'], self.firebug.get_url_path())
+        eq_(found['icon'], self.firebug.icon_url)
+        eq_(found['rating'], self.firebug.average_rating)
+
+    def test_localized_name(self):
+        self.firebug.name = {'fr': u'Insecte de feu'}
+        self.firebug.save()
+        eq_(self.ids('insecte'), [])
+        with self.activate('fr'):
+            found = self.search('insecte')
+            eq_([s['id'] for s in found], [self.firebug.id])
+            eq_(found[0]['name'], u'Insecte de feu')
+            eq_(self.search('firebug')[0]['name'], u'Insecte de feu')
+
+    def test_updated(self):
+        self.firebug.name = 'Lightbug'
+        self.firebug.save()
+        eq_(self.ids('fire'), [self.firefly.id])
+        eq_(self.ids('light'), [self.firebug.id])
+
+    def test_hidden(self):
+        self.firebug.update(disabled_by_user=True)
+        eq_(self.ids('fire'), [self.firefly.id])
+        eq_(self.ids(str(self.firebug.id)), [])
+
+    def test_deleted(self):
+        suggestions.remove([self.firefly.id])
+        eq_(self.ids('fire'), [self.firebug.id])
+
+    @mock.patch('search.tasks.update_suggestions.apply_async')
+    def test_busy(self, apply_async):
+        cache.add(suggestions.LOCK, 1)
+        suggestions.update([self.firebug.id])
+        apply_async.assert_called_with(
+            args=[[self.firebug.id]], countdown=suggestions.RETRY_DELAY,
+            kwargs={'remove': False})
+        # The index is still there for everything else.
+        eq_(self.ids('fire'), [self.firefly.id, self.firebug.id])
+
+    @mock.patch('search.suggestions.replace')
+    def test_busy_retried(self, replace):
+        replace.return_value = False
+        # The retries run right away here, and find the index busy too.
+        suggestions.remove([self.firefly.id])
+        eq_(replace.call_count, suggestions.RETRIES + 2)
+        eq_(self.ids('fire'), [self.firebug.id])
+
+    @mock.patch('search.suggestions.lock')
+    def test_busy_freed(self, lock):
+        lock.side_effect = [False, True]
+        suggestions.remove([self.firefly.id])
+        eq_(lock.call_count, 2)
+        eq_(self.ids('fire'), [self.firebug.id])
+
+    @mock.patch('addons.tasks.index_objects')
+    @mock.patch('addons.tasks.suggestions')
+    def test_reindexing(self, suggestions_, index_objects):
+        index_addons([self.firebug.id], index='addons-new')
+        assert not suggestions_.update.called
+        index_addons([self.firebug.id])
+        suggestions_.update.assert_called_with([self.firebug.id])
+
+    def test_view(self):
+        Addon.objects.filter(id=self.firebug.id).update(slug='changed')
+        r = self.client.get(reverse('search.suggestions'), {'q': 'fireb'})
+        data = json.loads(r.content)
+        eq_(len(data), 1)
+        eq_(data[0]['id'], unicode(self.firebug.id))
+        eq_(data[0]['name'], u'Firebug')
+        # The url comes from the index, not the database.
+        assert data[0]['url'].endswith('/addon/bugfire/?src=ss'), (
+            data[0]['url'])
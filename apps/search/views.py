@@ -20,6 +20,7 @@ from amo.utils import sorted_groupby
 from bandwagon.models import Collection
 from versions.compare import dict_from_int, version_dict, version_int
 
+from . import suggestions
 from .forms import ESSearchForm, SecondarySearchForm
 
 
@@ -171,8 +172,30 @@ class BaseAjaxSearch(object):
                                     status__in=amo.REVIEWED_STATUSES)
         return results
 
+    def suggestions(self):
+        """Get the results from the suggestions index, None if it can't
+        answer, which is also the case for fields it doesn't have."""
+        q = self.request.GET.get(self.key)
+        if not q or any(suggestions.FIELDS.get(key) != prop
+                        for key, prop in self.fields.iteritems()):
+            return None
+        found = suggestions.search(q, self.types, self.limit,
+                                   self.excluded_ids)
+        if found is None:
+            return None
+        results = []
+        for item in found:
+            d = dict((key, unicode(item[key])) for key in self.fields)
+            if self.src and 'url' in d:
+                d['url'] = urlparams(d['url'], src=self.src)
+            results.append(d)
+        return results
+
     def build_list(self):
         """Populate a list of dictionaries based on label => property."""
+        found = self.suggestions()
+        if found is not None:
+            return found
         results = []
         for item in self.queryset()[:self.limit]:
             if item.id in self.excluded_ids:
@@ -86,13 +86,7 @@ def addon_total_contributions():
 
 @cronjobs.register
 def index_latest_stats(index=None, aliased=True):
+    """Index the stats added or changed since the last run."""
     raise_if_reindex_in_progress()
-    latest = UpdateCount.search(index).order_by('-date').values_dict()
-    if latest:
-        latest = latest[0]['date']
-    else:
-        latest = datetime.date.today() - datetime.timedelta(days=1)
-    fmt = lambda d: d.strftime('%Y-%m-%d')
-    date_range = '%s:%s' % (fmt(latest), fmt(datetime.date.today()))
-    cron_log.info('index_stats --date=%s' % date_range)
-    call_command('index_stats', addons=None, date=date_range)
+    cron_log.info('index_stats --incremental')
+    call_command('index_stats', addons=None, date=None, incremental=True)
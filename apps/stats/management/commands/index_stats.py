@@ -1,9 +1,11 @@
+import datetime
+import json
 import logging
 from datetime import date, timedelta
 from optparse import make_option
 
 from django.core.management.base import BaseCommand
-from django.db.models import Max, Min
+from django.db.models import Count, Max, Min, Q, Sum
 
 from celery.task.sets import TaskSet
 
@@ -12,11 +14,25 @@ from stats.models import (CollectionCount, DownloadCount, ThemeUserCount,
                           UpdateCount)
 from stats.tasks import (index_collection_counts, index_download_counts,
                          index_theme_user_counts, index_update_counts)
+from zadmin.models import set_config, unmemoized_get_config
 
 log = logging.getLogger('z.stats')
 
 # Number of days of stats to process in one chunk if we're indexing everything.
 STEP = 5
+# Config key holding the high-water marks of each stats model.
+MARKS = 'stats_index_marks'
+# Stats of the last few days are rewritten in place when late logs come in,
+# so `--incremental` also reindexes rows that recent.
+LOOKBACK = 3
+# The stats models, their index task, which takes row ids, and the field
+# holding the ES `id` of the documents, for the checksums.
+MODELS = [
+    (UpdateCount, index_update_counts, 'id'),
+    (DownloadCount, index_download_counts, 'id'),
+    (ThemeUserCount, index_theme_user_counts, 'id'),
+    (CollectionCount, index_collection_counts, 'collection'),
+]
 HELP = """\
 Start tasks to index stats. Without constraints, everything will be
 processed.
@@ -29,6 +45,16 @@ To limit the add-ons:
 To limit the  date range:
 
     `--date=2011-08-15` or `--date=2011-08-15:2011-08-22`
+
+To only index the rows added since the last run, and the rows of the last
+`--lookback` days:
+
+    `--incremental`
+
+To compare the daily totals of MySQL and ES and reindex the days that differ
+(limited to `--date` if given):
+
+    `--reconcile`
 """
 
 
@@ -42,16 +68,27 @@ class Command(BaseCommand):
                          'YYYY-MM-DD for a single date or '
                          'YYYY-MM-DD:YYYY-MM-DD to index a range of dates '
                          '(inclusive).'),
-        make_option('--fixup', action='store_true',
-                    help='Find and index rows we missed.'),
+        make_option('--incremental', action='store_true',
+                    help='Only index the rows that are new or changed since '
+                         'the last run.'),
+        make_option('--lookback', type='int', default=LOOKBACK,
+                    help='Number of days of stats --incremental reindexes '
+                         'even if they were already indexed.'),
+        make_option('--reconcile', action='store_true',
+                    help='Find and index the days that differ between the '
+                         'database and ES.'),
     )
     help = HELP
 
     def handle(self, *args, **kw):
-        if kw.get('fixup'):
-            fixup()
+        addons, dates = kw.get('addons'), kw.get('date')
 
-        addons, dates = kw['addons'], kw['date']
+        if kw.get('incremental'):
+            incremental(kw.get('lookback', LOOKBACK))
+            return
+        if kw.get('reconcile'):
+            reconcile(*parse_dates(dates))
+            return
 
         queries = [
             (UpdateCount.objects, index_update_counts,
@@ -106,25 +143,139 @@ class Command(BaseCommand):
             else:
                 create_tasks(task, list(qs))
 
+        if not (dates or addons):
+            # Everything is indexed, the next incremental run can start here.
+            set_marks(dict((model._meta.db_table, get_mark(model))
+                           for model, task, field in MODELS))
+
 
 def create_tasks(task, qs):
     ts = [task.subtask(args=[chunk]) for chunk in chunked(qs, 50)]
     TaskSet(ts).apply_async()
 
 
-def fixup():
-    queries = [(UpdateCount, index_update_counts),
-               (DownloadCount, index_download_counts),
-               (ThemeUserCount, index_theme_user_counts)]
-
-    for model, task in queries:
-        all_addons = model.objects.distinct().values_list('addon', flat=True)
-        for addon in all_addons:
-            qs = model.objects.filter(addon=addon)
-            search = model.search().filter(addon=addon)
-            if qs.count() != search.count():
-                all_ids = list(qs.values_list('id', flat=True))
-                search_ids = list(search.values()[:5000])
-                ids = set(all_ids) - set(search_ids)
-                log.info('Missing %s rows for %s.' % (len(ids), addon))
-                create_tasks(task, list(ids))
+def parse_dates(dates):
+    """The (start, end) dates of a `--date` option, or (None, None)."""
+    if not dates:
+        return None, None
+    dates = [datetime.datetime.strptime(d, '%Y-%m-%d').date()
+             for d in dates.split(':')]
+    return dates[0], dates[-1]
+
+
+def get_marks():
+    marks = unmemoized_get_config(MARKS)
+    return json.loads(marks) if marks else {}
+
+
+def set_marks(marks):
+    set_config(MARKS, json.dumps(marks))
+
+
+def get_mark(model):
+    limits = model.objects.aggregate(id=Max('id'), date=Max('date'))
+    return {'last_id': limits['id'] or 0,
+            'last_date': (limits['date'] or date.today()).isoformat()}
+
+
+def incremental(lookback=LOOKBACK):
+    """
+    Index the stats rows added since the last run, and the rows of the last
+    `lookback` days before the last indexed date, which get updated in place
+    by late logs. The stats tables have no `modified` column, so the date of
+    the rows stands in for it.
+
+    The high-water marks (last id and date seen) are saved per model once
+    the tasks are started. Tasks that fail after that are caught by
+    `reconcile`.
+    """
+    marks = get_marks()
+    for model, task, field in MODELS:
+        name = model._meta.db_table
+        # Without a mark, start from the latest rows.
+        mark = marks.get(name) or get_mark(model)
+        last_id = mark['last_id']
+        last_date = datetime.datetime.strptime(mark['last_date'],
+                                               '%Y-%m-%d').date()
+        since = last_date - timedelta(days=lookback)
+        qs = model.objects.filter(Q(id__gt=last_id) | Q(date__gte=since))
+        rows = list(qs.order_by('-date').values_list('id', 'date'))
+
+        log.info('Indexing %s new or changed %s since id %s and %s.'
+                 % (len(rows), name, last_id, since))
+        if rows:
+            create_tasks(task, [r[0] for r in rows])
+            last_id = max([last_id] + [r[0] for r in rows])
+            last_date = max([last_date] + [r[1] for r in rows])
+        marks[name] = {'last_id': last_id,
+                       'last_date': last_date.isoformat()}
+    set_marks(marks)
+
+
+def db_checksums(model, field, start, end):
+    """The number of rows, the total count and the sum of ids per day."""
+    qs = (model.objects.filter(date__range=(start, end)).values('date')
+          .annotate(rows=Count('id'), total=Sum('count'), ids=Sum(field))
+          .order_by())
+    return dict((r['date'], (r['rows'], int(r['total'] or 0),
+                             int(r['ids'] or 0)))
+                for r in qs)
+
+
+def es_checksums(model, start, end):
+    """The number of documents, the total count and the sum of ids per day."""
+    def stats(field):
+        return {'terms_stats': {'key_field': 'date', 'value_field': field,
+                                'size': 0}}
+
+    # Facets ignore filters, the date range has to be part of the query.
+    qs = (model.search().query(date__gte=start.isoformat(),
+                               date__lte=end.isoformat())
+          .facet(total=stats('count'), ids=stats('id')))
+    facets = qs[:0].raw_facets()
+
+    def day(term):
+        # ES gives dates back as milliseconds since the epoch.
+        return datetime.datetime.utcfromtimestamp(term / 1000).date()
+
+    ids = dict((day(t['term']), int(t['total']))
+               for t in facets.get('ids', {}).get('terms', []))
+    return dict((day(t['term']), (t['count'], int(t['total']),
+                                  ids.get(day(t['term']), 0)))
+                for t in facets.get('total', {}).get('terms', []))
+
+
+def reconcile(start=None, end=None):
+    """
+    Compare per-day checksums of each stats model between the database and
+    ES, and reindex the rows of the days that differ. Returns the number of
+    days reindexed.
+    """
+    fixed = 0
+    for model, task, field in MODELS:
+        name = model._meta.db_table
+        if start is None:
+            limits = (model.objects.exclude(date__isnull=True)
+                      .aggregate(min=Min('date'), max=Max('date')))
+            if not limits['min']:
+                continue
+            first, last = limits['min'], limits['max']
+        else:
+            first, last = start, end
+
+        db = db_checksums(model, field, first, last)
+        es = es_checksums(model, first, last)
+        for day in sorted(set(db) | set(es)):
+            if db.get(day) == es.get(day):
+                continue
+            if day not in db:
+                log.warning('%s has stats in ES for %s but none in the '
+                            'database.' % (name, day))
+                continue
+            log.info('Reindexing %s for %s: database %s, ES %s.'
+                     % (name, day, db[day], es.get(day)))
+            create_tasks(task, list(model.objects.filter(date=day)
+                                    .values_list('id', flat=True)))
+            fixed += 1
+    log.info('Reconciled stats, reindexed %s days.' % fixed)
+    return fixed
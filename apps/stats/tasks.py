@@ -362,7 +362,7 @@ def index_collection_counts(ids, **kw):
     indices = get_indices(index)
 
     es = amo.search.get_es()
-    qs = CollectionCount.objects.filter(collection__in=ids)
+    qs = CollectionCount.objects.filter(id__in=ids)
     if qs:
         log.info('Indexing %s addon collection counts: %s'
                  % (qs.count(), qs[0].date))
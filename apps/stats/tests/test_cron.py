@@ -12,8 +12,10 @@ from bandwagon.models import CollectionAddon, Collection
 from mkt.webapps.models import Installed
 from reviews.models import Review
 from stats import cron, tasks
-from stats.models import (AddonCollectionCount, Contribution, DownloadCount,
-                          GlobalStat, ThemeUserCount, UpdateCount)
+from stats.management.commands import index_stats
+from stats.models import (AddonCollectionCount, CollectionCount, Contribution,
+                          DownloadCount, GlobalStat, ThemeUserCount,
+                          UpdateCount)
 from users.models import UserProfile
 
 
@@ -223,22 +225,79 @@ class TestIndexStats(amo.tests.TestCase):
             1 + (updates[0] - updates[-1]).days / 5)
         eq_(len([c for c in calls if c[0][0] == tasks.index_download_counts]),
             1 + (downloads[0] - downloads[-1]).days / 5)
-
-
-class TestIndexLatest(amo.tests.ESTestCase):
-    test_es = True
+        eq_(index_stats.get_marks()['download_counts'],
+            {'last_id': 10, 'last_date': '2009-10-03'})
+
+    def calls(self, tasks_mock, task):
+        return [sorted(c[0][1]) for c in tasks_mock.call_args_list
+                if c[0][0] == task]
+
+    def test_incremental(self, tasks_mock):
+        index_stats.set_marks({
+            'download_counts': {'last_id': 8, 'last_date': '2009-09-03'}})
+        call_command('index_stats', incremental=True, lookback=3)
+        # Row 8 is within the lookback, 9 and 10 are new.
+        eq_(self.calls(tasks_mock, tasks.index_download_counts),
+            [[8, 9, 10]])
+        # Without a mark, the last days of stats are indexed.
+        eq_(self.calls(tasks_mock, tasks.index_update_counts), [[1, 2]])
+
+        marks = index_stats.get_marks()
+        eq_(marks['download_counts'],
+            {'last_id': 10, 'last_date': '2009-10-03'})
+        eq_(marks['update_counts'], {'last_id': 3, 'last_date': '2009-06-02'})
+
+    def test_incremental_collections(self, tasks_mock):
+        collection = Collection.objects.create(name='collection')
+        old, last, new = [CollectionCount.objects.create(
+            collection=collection, count=1, date=date)
+            for date in (datetime.date(2008, 6, 1), datetime.date(2009, 1, 1),
+                         datetime.date(2009, 1, 30))]
+        index_stats.set_marks({
+            'stats_collections_counts': {'last_id': last.id,
+                                         'last_date': '2009-01-01'}})
+        call_command('index_stats', incremental=True, lookback=3)
+        # The older days of the collection are not indexed again.
+        eq_(self.calls(tasks_mock, tasks.index_collection_counts),
+            [sorted([last.id, new.id])])
+
+    def test_incremental_nothing_new(self, tasks_mock):
+        index_stats.set_marks({
+            'download_counts': {'last_id': 10, 'last_date': '2010-01-01'}})
+        call_command('index_stats', incremental=True)
+        eq_(self.calls(tasks_mock, tasks.index_download_counts), [])
+
+    @mock.patch('stats.management.commands.index_stats.es_checksums')
+    def test_reconcile(self, es_checksums, tasks_mock):
+        def checksums(model, start, end):
+            if model != DownloadCount:
+                return {}
+            rv = index_stats.db_checksums(model, 'id', start, end)
+            # A missing day and a day with a wrong total.
+            del rv[datetime.date(2009, 6, 7)]
+            day = datetime.date(2009, 10, 3)
+            rv[day] = (rv[day][0], rv[day][1] - 1, rv[day][2])
+            return rv
+        es_checksums.side_effect = checksums
+
+        call_command('index_stats', reconcile=True,
+                     date='2009-06-01:2009-12-31')
+        eq_(self.calls(tasks_mock, tasks.index_download_counts),
+            [[2], [9, 10]])
+        # ES has no update counts at all, every day is reindexed.
+        eq_(self.calls(tasks_mock, tasks.index_update_counts), [[1], [2]])
+        es_checksums.assert_any_call(DownloadCount,
+                                     datetime.date(2009, 6, 1),
+                                     datetime.date(2009, 12, 31))
+
+
+class TestIndexLatest(amo.tests.TestCase):
 
     def test_index_latest(self):
-        latest = datetime.date.today() - datetime.timedelta(days=5)
-        UpdateCount.index({'date': latest})
-        self.refresh('update_counts')
-
-        start = latest.strftime('%Y-%m-%d')
-        finish = datetime.date.today().strftime('%Y-%m-%d')
         with mock.patch('stats.cron.call_command') as call:
             cron.index_latest_stats()
-            call.assert_called_with('index_stats', addons=None,
-                                    date='%s:%s' % (start, finish))
+            call.assert_called_with('index_stats', addons=None, date=None,
+                                    incremental=True)
 
 
 class TestUpdateDownloads(amo.tests.TestCase):
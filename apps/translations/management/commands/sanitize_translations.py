@@ -0,0 +1,73 @@
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from translations.fields import PurifiedField
+from translations.models import SANITIZER_VERSION, save_sanitized
+from zadmin.models import set_config, unmemoized_get_config
+
+log = logging.getLogger('z.translations')
+
+# The SANITIZER_VERSION every row was last cleaned with.
+VERSION = 'translations_sanitizer_version'
+
+rows_sql = """
+    SELECT DISTINCT t.autoid, t.id, t.localized_string
+    FROM translations t INNER JOIN {table} m ON m.{column} = t.id
+    WHERE t.autoid > %s AND t.localized_string IS NOT NULL {filter}
+    ORDER BY t.autoid LIMIT %s"""
+
+missing = """AND (t.localized_string_clean IS NULL
+                  OR t.localized_string_clean = '')"""
+
+
+def sanitized_fields():
+    """The (sanitizer, table, column) of every purified or linkified field."""
+    fields = set()
+    for model in models.get_models():
+        for field in getattr(model._meta, 'translated_fields', []):
+            if isinstance(field, PurifiedField):
+                fields.add((field.rel.to.sanitizer, model._meta.db_table,
+                            field.column))
+    return sorted(fields)
+
+
+def sanitize_field(sanitizer, table, column, everything, batch_size):
+    """Clean the rows of a field, a batch at a time. Returns the row count."""
+    qn = connection.ops.quote_name
+    sql = rows_sql.format(table=qn(table), column=qn(column),
+                          filter='' if everything else missing)
+    cursor = connection.cursor()
+    last, count = 0, 0
+    while True:
+        cursor.execute(sql, [last, batch_size])
+        rows = cursor.fetchall()
+        if not rows:
+            return count
+        save_sanitized(sanitizer, rows)
+        count += len(rows)
+        last = rows[-1][0]
+
+
+class Command(BaseCommand):
+    help = ('Fill localized_string_clean for the translations of purified '
+            'and linkified fields. Every row is cleaned again when '
+            'SANITIZER_VERSION changed since the last run.')
+    option_list = BaseCommand.option_list + (
+        make_option('--all', action='store_true', default=False,
+                    help='Clean every row, not only those missing it.'),
+        make_option('--batch-size', action='store', type='int',
+                    default=1000, help='Number of rows per batch.'),
+    )
+
+    def handle(self, *args, **options):
+        version = unmemoized_get_config(VERSION)
+        everything = options['all'] or version != str(SANITIZER_VERSION)
+        for sanitizer, table, column in sanitized_fields():
+            count = sanitize_field(sanitizer, table, column, everything,
+                                   options['batch_size'])
+            log.info('Sanitized %s translations of %s.%s with %s.'
+                     % (count, table, column, sanitizer))
+        set_config(VERSION, str(SANITIZER_VERSION))
@@ -1,7 +1,12 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models, connection
 from django.utils import encoding
 
 import bleach
+import jinja2
 
 import amo.models
 from amo import urlresolvers
@@ -52,7 +57,13 @@ class Translation(amo.models.ModelBase):
 
     def save(self, **kwargs):
         self.clean()
-        return super(Translation, self).save(**kwargs)
+        rv = super(Translation, self).save(**kwargs)
+        cache.delete(rows_cache_key(self.id))
+        return rv
+
+    def delete(self, using=None):
+        super(Translation, self).delete(using=using)
+        cache.delete(rows_cache_key(self.id))
 
     @property
     def cache_key(self):
@@ -103,27 +114,81 @@ class Translation(amo.models.ModelBase):
         return trans
 
 
+# Bump this when the output of the sanitizers changes (e.g. a new bleach
+# whitelist): it drops the cached output and makes `sanitize_translations`
+# clean every row again.
+SANITIZER_VERSION = 1
+
+
+def sanitized_key(sanitizer, string):
+    """The key holding the output of `sanitizer` for `string`."""
+    hash = hashlib.md5(encoding.smart_str(string)).hexdigest()
+    return 'sanitized:%s:%s:%s' % (SANITIZER_VERSION, sanitizer, hash)
+
+
 class PurifiedTranslation(Translation):
     """Run the string through bleach to get a safe, linkified version."""
+    sanitizer = 'purified'
 
     class Meta:
         proxy = True
 
     def __unicode__(self):
         if not self.localized_string_clean:
-            self.clean()
+            if not self.localized_string:
+                return u''
+            if self.autoid is None:
+                # Not saved yet, we are the ones creating it.
+                self.clean()
+            else:
+                clean = self.sanitized()
+                if clean is None:
+                    return unicode(jinja2.escape(self.localized_string))
+                self.localized_string_clean = clean
         return unicode(self.localized_string_clean)
 
     def __html__(self):
         return unicode(self)
 
     def clean(self):
-        from amo.utils import clean_nl
         super(PurifiedTranslation, self).clean()
-        cleaned = bleach.clean(self.localized_string)
+        self.localized_string_clean = self.sanitize(self.localized_string)
+
+    def sanitized(self):
+        """
+        The clean string of a saved row that is missing it, without running
+        bleach: the output cached for the same string, if any. Otherwise the
+        row is cleaned in the background and None is returned.
+        """
+        key = sanitized_key(self.sanitizer, self.localized_string)
+        clean = cache.get(key)
+        if clean is None:
+            from .tasks import sanitize_translations
+            if cache.add('sanitize-pending:%s' % self.autoid, 1, 60):
+                sanitize_translations.delay([self.autoid], self.sanitizer)
+                # The task may have run already.
+                clean = cache.get(key)
+        return clean
+
+    @classmethod
+    def sanitize(cls, string):
+        """The output of `_sanitize` for `string`, cached on its content."""
+        if not string:
+            return string
+        key = sanitized_key(cls.sanitizer, string)
+        clean = cache.get(key)
+        if clean is None:
+            clean = cls._sanitize(string)
+            cache.set(key, clean, settings.SANITIZER_CACHE_TIMEOUT)
+        return clean
+
+    @classmethod
+    def _sanitize(cls, string):
+        from amo.utils import clean_nl
+        cleaned = bleach.clean(string)
         linkified = bleach.linkify(cleaned, nofollow=True,
                 filter_url=urlresolvers.get_outgoing_url)
-        self.localized_string_clean = clean_nl(linkified).strip()
+        return clean_nl(linkified).strip()
 
     def __truncate__(self, length, killwords, end):
         return utils.truncate(unicode(self), length, killwords, end)
@@ -131,16 +196,42 @@ class PurifiedTranslation(Translation):
 
 class LinkifiedTranslation(PurifiedTranslation):
     """Run the string through bleach to get a linkified version."""
+    sanitizer = 'linkified'
 
     class Meta:
         proxy = True
 
     def clean(self):
-        linkified = bleach.linkify(self.localized_string,
+        self.localized_string_clean = self.sanitize(self.localized_string)
+
+    @classmethod
+    def _sanitize(cls, string):
+        linkified = bleach.linkify(string,
                 filter_url=urlresolvers.get_outgoing_url)
-        clean = bleach.clean(linkified, tags=['a'],
-                             attributes={'a': ['href', 'rel']})
-        self.localized_string_clean = clean
+        return bleach.clean(linkified, tags=['a'],
+                            attributes={'a': ['href', 'rel']})
+
+
+SANITIZERS = dict((cls.sanitizer, cls) for cls in
+                  (PurifiedTranslation, LinkifiedTranslation))
+
+
+def save_sanitized(sanitizer, rows):
+    """
+    Store the output of `sanitizer` for `rows` of (autoid, id, string) in
+    localized_string_clean.
+    """
+    cls = SANITIZERS[sanitizer]
+    rows = list(rows)
+    for autoid, id, string in rows:
+        (Translation.objects.filter(autoid=autoid)
+         .update(localized_string_clean=cls.sanitize(string)))
+    cache.delete_many([rows_cache_key(id) for autoid, id, string in rows])
+
+
+def rows_cache_key(id):
+    """The key holding the rows of translation `id` in every locale."""
+    return 'translations:rows:%s' % id
 
 
 class TranslationSequence(models.Model):
@@ -159,3 +250,4 @@ def delete_translation(obj, fieldname):
     obj.update(**{field.name: None})
     if trans:
         Translation.objects.filter(id=trans.id).delete()
+        cache.delete(rows_cache_key(trans.id))
@@ -0,0 +1,16 @@
+import commonware.log
+from celeryutils import task
+
+from .models import Translation, save_sanitized
+
+log = commonware.log.getLogger('z.task')
+
+
+@task
+def sanitize_translations(ids, sanitizer, **kw):
+    """Fill localized_string_clean for the translations with these autoids."""
+    log.info('Sanitizing %s translations with %s.' % (len(ids), sanitizer))
+    rows = (Translation.objects.filter(autoid__in=ids)
+            .exclude(localized_string=None)
+            .values_list('autoid', 'id', 'localized_string'))
+    save_sanitized(sanitizer, rows)
@@ -1,17 +1,24 @@
 # -*- coding: utf-8 -*-
 from django.conf import settings
 from django import test
+from django.core.cache import cache
+from django.core.management import call_command
 from django.utils import translation
 from django.utils.functional import lazy
 
+import bleach
 import jinja2
+import mock
 from nose.tools import eq_
 from test_utils import ExtraAppTestCase, trans_eq
 
 from testapp.models import TranslatedModel, UntranslatedModel, FancyModel
 from translations.models import (Translation, PurifiedTranslation,
-                                 TranslationSequence)
+                                 TranslationSequence, delete_translation)
+from translations.models import SANITIZER_VERSION
 from translations import widgets
+from translations.transformer import LOCALE, STRING, get_translations
+from zadmin.models import set_config, unmemoized_get_config
 from translations.query import order_by_translation
 
 
@@ -72,6 +79,7 @@ class TranslationTestCase(ExtraAppTestCase):
         settings.REDIRECT_URL = None
         settings.REDIRECT_SECRET_KEY = 'sekrit'
         translation.activate('en-US')
+        cache.clear()
 
     def tearDown(self):
         super(TranslationTestCase, self).tearDown()
@@ -316,6 +324,64 @@ class TranslationTestCase(ExtraAppTestCase):
         eq_(s, u'%s==%s' % (m.purified.localized_string_clean,
                             m.linkified.localized_string_clean))
 
+    def test_sanitize_cached_on_content(self):
+        s = '<i>x</i> http://yyy.com'
+        with mock.patch('bleach.clean', wraps=bleach.clean) as clean:
+            eq_(PurifiedTranslation.sanitize(s),
+                PurifiedTranslation.sanitize(s))
+            eq_(clean.call_count, 1)
+
+    def unclean(self, id):
+        Translation.objects.filter(id=id).update(localized_string_clean=None)
+        return FancyModel.objects.get(id=1)
+
+    @mock.patch('translations.tasks.sanitize_translations.delay')
+    def test_str_without_clean_is_escaped(self, delay):
+        m = self.unclean(20)
+        with mock.patch('bleach.clean') as clean:
+            eq_(u'%s' % m.purified, '&lt;i&gt;x&lt;/i&gt; http://yyy.com')
+            eq_(u'%s' % m.purified, '&lt;i&gt;x&lt;/i&gt; http://yyy.com')
+            assert not clean.called
+        delay.assert_called_once_with([m.purified.autoid], 'purified')
+
+    @mock.patch('translations.tasks.sanitize_translations.delay')
+    def test_str_without_clean_uses_cache(self, delay):
+        m = self.unclean(20)
+        expected = PurifiedTranslation.sanitize(m.purified.localized_string)
+        with mock.patch('bleach.clean') as clean:
+            eq_(u'%s' % m.purified, expected)
+            assert not clean.called
+        assert not delay.called
+
+    def test_sanitize_translations(self):
+        self.unclean(20)
+        self.unclean(30)
+        call_command('sanitize_translations', batch_size=1)
+        m = FancyModel.objects.get(id=1)
+        eq_(m.purified.localized_string_clean,
+            '<i>x</i> '
+            '<a href="http://yyy.com" rel="nofollow">http://yyy.com</a>')
+        eq_(m.linkified.localized_string_clean,
+            '&lt;i&gt;x&lt;/i&gt; '
+            '<a href="http://yyy.com" rel="nofollow">http://yyy.com</a>')
+        eq_(unmemoized_get_config('translations_sanitizer_version'),
+            str(SANITIZER_VERSION))
+
+    def test_sanitize_translations_only_missing(self):
+        call_command('sanitize_translations')
+        Translation.objects.filter(id=20).update(localized_string_clean='x')
+        self.unclean(30)
+        call_command('sanitize_translations')
+        m = FancyModel.objects.get(id=1)
+        eq_(m.purified.localized_string_clean, 'x')
+        assert m.linkified.localized_string_clean
+
+        # A new sanitizer version cleans everything again.
+        set_config('translations_sanitizer_version', '0')
+        call_command('sanitize_translations')
+        m = FancyModel.objects.get(id=1)
+        assert m.purified.localized_string_clean != 'x'
+
     def test_outgoing_url(self):
         """
         Make sure linkified field is properly bounced off our outgoing URL
@@ -346,6 +412,38 @@ class TranslationTestCase(ExtraAppTestCase):
         eq_(unicode(obj.no_locale), 'blammo')
         eq_(obj.no_locale.locale, 'fr')
 
+    def strings(self, id):
+        return sorted((row[LOCALE], row[STRING])
+                      for row in get_translations([id])[id])
+
+    def test_get_translations(self):
+        rows = get_translations([1, 2, None])
+        eq_(sorted(rows), [1, 2])
+        eq_(self.strings(1), [('de', 'German!! (unst unst)'),
+                              ('en-US', 'some name')])
+        # Everything comes from the cache now, including unknown ids.
+        get_translations([999])
+        with self.assertNumQueries(0):
+            eq_(get_translations([1, 2, 999])[999], [])
+
+    def test_get_translations_invalidated_on_save(self):
+        eq_(self.strings(2), [('en-US', 'some description')])
+        t = Translation.objects.get(id=2, locale='en-US')
+        t.localized_string = 'new description'
+        t.save()
+        eq_(self.strings(2), [('en-US', 'new description')])
+        Translation.new('neue Beschreibung', 'de', id=2).save()
+        eq_(self.strings(2), [('de', 'neue Beschreibung'),
+                              ('en-US', 'new description')])
+
+    def test_get_translations_invalidated_on_delete(self):
+        obj = TranslatedModel.objects.get(id=1)
+        id = obj.description_id
+        eq_(len(self.strings(id)), 1)
+        delete_translation(obj, 'description')
+        eq_(self.strings(id), [])
+        eq_(TranslatedModel.objects.get(id=1).description, None)
+
 
 def test_translation_bool():
     t = lambda s: Translation(localized_string=s)
@@ -1,26 +1,82 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connections, models
 from django.utils import translation
 
 import multidb
+from django_statsd.clients import statsd
 
-from translations.models import Translation
+from translations.models import Translation, rows_cache_key
 from translations.fields import TranslatedField
 
-isnull = """IF(!ISNULL({t1}.localized_string), {t1}.{col}, {t2}.{col})
-            AS {name}_{col}"""
-join = """LEFT OUTER JOIN translations {t}
-          ON ({t}.id={model}.{name} AND {t}.locale={locale})"""
-no_locale_join = """LEFT OUTER JOIN translations {t}
-                    ON {t}.id={model}.{name}"""
-
 trans_fields = [f.name for f in Translation._meta.fields]
+ID = trans_fields.index('id')
+LOCALE = trans_fields.index('locale')
+STRING = trans_fields.index('localized_string')
+
+rows_sql = """SELECT {cols} FROM translations
+              WHERE id IN ({ids}) ORDER BY autoid"""
+
+
+def get_translations(ids):
+    """
+    Return a dict of translation id -> the rows of that translation in every
+    locale, as tuples in `trans_fields` order.
+
+    Rows are kept in the cache per translation id, so one multi-get serves
+    every locale. The ids that are not cached are fetched with a single query
+    on the translations table and cached for the next time.
+    """
+    ids = set(ids)
+    ids.discard(None)
+    if not ids:
+        return {}
+
+    keys = dict((rows_cache_key(id), id) for id in ids)
+    rows = dict((keys[key], value) for key, value
+                in cache.get_many(keys.keys()).items())
+    missing = ids.difference(rows)
+    statsd.incr('translations.cache.hit', len(rows))
+    if not missing:
+        return rows
+
+    statsd.incr('translations.cache.miss', len(missing))
+    connection = connections[multidb.get_slave()]
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute(rows_sql.format(
+        cols=','.join(qn(f.column) for f in Translation._meta.fields),
+        ids=','.join(str(int(id)) for id in missing)))
+    fetched = dict((id, []) for id in missing)
+    for row in cursor.fetchall():
+        fetched[row[ID]].append(tuple(row))
+    # Translations without any row are cached too, they don't need a query.
+    cache.set_many(dict((rows_cache_key(id), value)
+                        for id, value in fetched.items()),
+                   settings.TRANSLATIONS_CACHE_TIMEOUT)
+    rows.update(fetched)
+    return rows
+
+
+def find_row(rows, locales, require_locale=True):
+    """
+    The row in the first of `locales` that has one. If `require_locale` is
+    False, any row will do after that. Rows without a string are skipped.
+    """
+    rows = [row for row in rows if row[STRING] is not None]
+    by_locale = dict((row[LOCALE].lower(), row) for row in reversed(rows))
+    for locale in locales:
+        if locale and locale.lower() in by_locale:
+            return by_locale[locale.lower()]
+    if not require_locale and rows:
+        return rows[0]
 
 
-def build_query(model, connection):
-    qn = connection.ops.quote_name
-    selects, joins, params = [], [], []
+def get_trans(items):
+    if not items:
+        return
 
+    model = items[0].__class__
     # The model can define a fallback locale (which may be a Field).
     if hasattr(model, 'get_fallback'):
         fallback = model.get_fallback()
@@ -30,58 +86,23 @@ def build_query(model, connection):
     if not hasattr(model._meta, 'translated_fields'):
         model._meta.translated_fields = [f for f in model._meta.fields
                                          if isinstance(f, TranslatedField)]
+    fields = model._meta.translated_fields
 
-    # Add the selects and joins for each translated field on the model.
-    for field in model._meta.translated_fields:
+    rows = get_translations(getattr(item, field.attname, None)
+                            for item in items for field in fields)
+    lang = translation.get_language()
+    for item in items:
         if isinstance(fallback, models.Field):
-            fallback_str = '%s.%s' % (qn(model._meta.db_table),
-                                      qn(fallback.column))
-        else:
-            fallback_str = '%s'
-
-        name = field.column
-        d = {'t1': 't1_' + name, 't2': 't2_' + name,
-             'model': qn(model._meta.db_table), 'name': name}
-
-        selects.extend(isnull.format(col=f, **d) for f in trans_fields)
-
-        joins.append(join.format(t=d['t1'], locale='%s', **d))
-        params.append(translation.get_language())
-
-        if field.require_locale:
-            joins.append(join.format(t=d['t2'], locale=fallback_str, **d))
-            if not isinstance(fallback, models.Field):
-                params.append(fallback)
+            item_fallback = getattr(item, fallback.attname, None)
         else:
-            joins.append(no_locale_join.format(t=d['t2'], **d))
-
-    # ids will be added later on.
-    sql = """SELECT {model}.{pk}, {selects} FROM {model} {joins}
-             WHERE {model}.{pk} IN {{ids}}"""
-    s = sql.format(selects=','.join(selects), joins='\n'.join(joins),
-                   model=qn(model._meta.db_table), pk=model._meta.pk.column)
-    return s, params
-
-
-def get_trans(items):
-    if not items:
-        return
-
-    connection = connections[multidb.get_slave()]
-    cursor = connection.cursor()
-
-    model = items[0].__class__
-    sql, params = build_query(model, connection)
-    item_dict = dict((item.pk, item) for item in items)
-    ids = ','.join(map(str, item_dict.keys()))
-
-    cursor.execute(sql.format(ids='(%s)' % ids), tuple(params))
-    step = len(trans_fields)
-    for row in cursor.fetchall():
-        # We put the item's pk as the first selected field.
-        item = item_dict[row[0]]
-        for index, field in enumerate(model._meta.translated_fields):
-            start = 1 + step * index
-            t = Translation(*row[start:start+step])
-            if t.id is not None and t.localized_string is not None:
-                setattr(item, field.name, t)
+            item_fallback = fallback
+        for field in fields:
+            id = getattr(item, field.attname, None)
+            if not rows.get(id):
+                continue
+            if field.require_locale:
+                row = find_row(rows[id], [lang, item_fallback])
+            else:
+                row = find_row(rows[id], [lang], require_locale=False)
+            if row is not None:
+                setattr(item, field.name, Translation(*row))
@@ -567,28 +567,27 @@ def cleanup_version(sender, instance, **kw):
 
 
 def clear_compatversion_cache_on_save(sender, instance, created, **kw):
-    """Clears compatversion cache if new Version created."""
+    """Clears compatversion cache if new Version created.
+
+    This is done for every type of add-on, the responses of the update
+    service are cached along with the compatible versions."""
+    if kw.get('raw') or not created:
+        return
     try:
-        if not instance.addon.type == amo.ADDON_EXTENSION:
-            return
+        instance.addon.invalidate_d2c_versions()
     except ObjectDoesNotExist:
         return
 
-    if not kw.get('raw') and created:
-        instance.addon.invalidate_d2c_versions()
-
 
 def clear_compatversion_cache_on_delete(sender, instance, **kw):
     """Clears compatversion cache when Version deleted."""
+    if kw.get('raw'):
+        return
     try:
-        if not instance.addon.type == amo.ADDON_EXTENSION:
-            return
+        instance.addon.invalidate_d2c_versions()
     except ObjectDoesNotExist:
         return
 
-    if not kw.get('raw'):
-        instance.addon.invalidate_d2c_versions()
-
 
 version_uploaded = django.dispatch.Signal()
 models.signals.pre_save.connect(
@@ -683,3 +682,21 @@ class ApplicationsVersions(caching.base.CachingMixin, models.Model):
             return _(u'{app} {min} and later').format(app=self.application,
                                                       min=self.min)
         return u'%s %s - %s' % (self.application, self.min, self.max)
+
+
+def clear_compatversion_cache_on_apps(sender, instance, **kw):
+    """Clears compatversion cache when the app compatibility changes."""
+    if kw.get('raw'):
+        return
+    try:
+        instance.version.addon.invalidate_d2c_versions()
+    except ObjectDoesNotExist:
+        return
+
+
+models.signals.post_save.connect(
+    clear_compatversion_cache_on_apps, sender=ApplicationsVersions,
+    dispatch_uid='clear_compatversion_cache_apps_save')
+models.signals.post_delete.connect(
+    clear_compatversion_cache_on_apps, sender=ApplicationsVersions,
+    dispatch_uid='clear_compatversion_cache_apps_del')
@@ -417,6 +417,16 @@ class TestVersion(amo.tests.TestCase):
         amo.tests.version_factory(addon=addon)
         assert inv_mock.called
 
+    @mock.patch('addons.models.Addon.invalidate_d2c_versions')
+    def test_invalidate_d2c_version_signals_other_types(self, inv_mock):
+        addon = Addon.objects.get(pk=3615)
+        addon.update(type=amo.ADDON_DICT)
+        version = amo.tests.version_factory(addon=addon)
+        assert inv_mock.called
+        inv_mock.reset_mock()
+        version.delete()
+        assert inv_mock.called
+
     def test_app_feature_creation_app(self):
         app = Addon.objects.create(type=amo.ADDON_WEBAPP)
         ver = Version.objects.create(addon=app)
@@ -0,0 +1,270 @@
+import json
+import logging
+import time
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
+
+from django_statsd.clients import statsd
+from elasticutils.contrib.django import get_es
+from pyelasticsearch.exceptions import ElasticHttpError
+
+from amo.utils import JSONEncoder
+from .models import Reindexing
+from .utils import get_indices
+
+
+log = logging.getLogger('z.es')
+
+
+def iter_ids(qs, chunk_size, start=None):
+    """
+    Yield lists of `chunk_size` ids from `qs` in key order, starting after
+    `start`. Each chunk is fetched with `id > last id` so the cost of a chunk
+    does not grow with how far into the table we are.
+    """
+    qs = qs.order_by('id').values_list('id', flat=True)
+    while True:
+        chunk_qs = qs if start is None else qs.filter(id__gt=start)
+        chunk = list(chunk_qs[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        start = chunk[-1]
+
+
+class BulkIndexer(object):
+    """
+    Stream the objects of `qs` into `index` through the ES `_bulk` API.
+
+    Ids are read in key order and documents are extracted, a chunk at a time,
+    by a pool of `workers` threads (inline if `workers` is 0). At most
+    `prefetch` chunks per worker are extracted ahead of what has been sent to
+    ES, so a slow cluster slows down extraction instead of filling memory.
+
+    The number of documents per bulk request adapts to how long ES takes to
+    answer: it grows while requests are faster than `target_time` and is
+    halved when they are slower or when ES rejects documents, in which case
+    the rejected documents are retried after a pause.
+
+    After every bulk request the last id sent is saved as a checkpoint on the
+    `Reindexing` row of `index`, along with the documents indexed, the errors
+    and the rate, so an interrupted reindex can resume where it stopped.
+    """
+
+    def __init__(self, name, qs, search, index=None, transforms=(),
+                 chunk_size=150, workers=4, prefetch=2, batch_size=500,
+                 min_batch_size=50, max_batch_size=5000, target_time=1.0,
+                 max_retries=5, backoff=1.0):
+        self.name = name
+        self.qs = qs
+        self.model = qs.model
+        self.search = search
+        self.index = index or self.model._get_index()
+        self.indices = get_indices(self.index)
+        self.transforms = transforms
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_time = target_time
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.es = get_es()
+        self.indexed = 0
+        self.errors = 0
+        self.resumed = 0
+        self.start = None
+        self.last_id = None
+        self.reindexing = None
+
+    @property
+    def rate(self):
+        """Documents indexed per second since `run` started."""
+        if not self.start:
+            return 0
+        return ((self.indexed - self.resumed) /
+                max(time.time() - self.start, 0.001))
+
+    def extract(self, ids):
+        """Return the (id, document) pairs of `ids`, in key order."""
+        qs = self.model.uncached.filter(id__in=ids).order_by('id')
+        for t in self.transforms:
+            qs = qs.transform(t)
+        docs = []
+        try:
+            objs = list(qs)
+            try:
+                docs = zip([obj.id for obj in objs],
+                           self.search.extract_many(objs))
+            except Exception:
+                # Extract them one by one to only skip the broken ones.
+                for obj in objs:
+                    try:
+                        docs.append((obj.id, self.search.extract(obj)))
+                    except Exception:
+                        log.exception('Failed to extract %s %s.'
+                                      % (self.name, obj.id))
+        finally:
+            if self.workers:
+                # Each worker thread has its own connection, don't leak it.
+                connection.close()
+        # Ids that vanished or failed to extract count as errors.
+        return docs, len(ids) - len(docs), ids[-1]
+
+    def extracted(self, start=None):
+        """Yield the result of `extract` for each chunk, in key order."""
+        chunks = iter_ids(self.qs, self.chunk_size, start)
+        if not self.workers:
+            for chunk in chunks:
+                yield self.extract(chunk)
+            return
+
+        pool = ThreadPool(self.workers)
+        pending = []
+        try:
+            for chunk in chunks:
+                pending.append(pool.apply_async(self.extract, [chunk]))
+                if len(pending) >= self.workers * self.prefetch:
+                    yield pending.pop(0).get()
+            while pending:
+                yield pending.pop(0).get()
+        finally:
+            pool.terminate()
+
+    def body(self, docs):
+        lines = []
+        doc_type = self.model._meta.db_table
+        for id, doc in docs:
+            for index in self.indices:
+                lines.append(json.dumps({'index': {
+                    '_index': index, '_type': doc_type, '_id': id}}))
+                lines.append(json.dumps(doc, cls=JSONEncoder))
+        return '\n'.join(lines) + '\n'
+
+    def send(self, docs):
+        """
+        Send `docs` in one bulk request and return the documents ES rejected
+        because it was overloaded. Other failures are counted as errors.
+        """
+        start = time.time()
+        try:
+            res = self.es.send_request('POST', ['_bulk'], self.body(docs),
+                                       encode_body=False)
+        except ElasticHttpError, e:
+            if e.status_code in (429, 503):
+                self.resize(shrink=True)
+                return docs
+            log.error('Bulk request for %s failed: %s %s'
+                      % (self.name, e.status_code, unicode(e.error)[:500]))
+            self.errors += len(docs)
+            return []
+        finally:
+            took = time.time() - start
+            statsd.timing('es.bulk.%s' % self.name, took * 1000)
+
+        failed = set()
+        rejected = set()
+        for item in res.get('items', []):
+            result = item.get('index') or item.get('create') or {}
+            error = result.get('error')
+            if not error:
+                continue
+            id = int(result['_id'])
+            if 'EsRejectedExecution' in error:
+                rejected.add(id)
+            elif id not in failed:
+                log.error('Failed to index %s %s: %s' % (self.name, id, error))
+                failed.add(id)
+        self.errors += len(failed - rejected)
+        self.indexed += len(docs) - len(failed | rejected)
+        self.resize(shrink=bool(rejected) or took > self.target_time)
+        return [d for d in docs if d[0] in rejected]
+
+    def resize(self, shrink):
+        if shrink:
+            self.batch_size = max(self.batch_size / 2, self.min_batch_size)
+        else:
+            self.batch_size = min(self.batch_size + self.batch_size / 2,
+                                  self.max_batch_size)
+
+    def flush(self, docs):
+        """Send `docs`, retrying what ES rejects with a growing pause."""
+        for retry in range(self.max_retries + 1):
+            if not docs:
+                return
+            if retry:
+                time.sleep(self.backoff * 2 ** (retry - 1))
+            while docs:
+                batch, docs = docs[:self.batch_size], docs[self.batch_size:]
+                rejected = self.send(batch)
+                if rejected:
+                    docs = rejected + docs
+                    break
+        if docs:
+            log.error('Gave up indexing %s %s-%s after %s retries.'
+                      % (self.name, docs[0][0], docs[-1][0], self.max_retries))
+            self.errors += len(docs)
+
+    def get_reindexing(self):
+        try:
+            return Reindexing.objects.get(new_index=self.index)
+        except Reindexing.DoesNotExist:
+            return None
+
+    def checkpoint(self, done=False):
+        self.reindexing.set_progress(self.name, last_id=self.last_id,
+                                     indexed=self.indexed, errors=self.errors,
+                                     rate=round(self.rate, 1), done=done)
+
+    def report(self):
+        log.info('Indexed %s %s (%.1f docs/sec, %s errors).'
+                 % (self.indexed, self.name, self.rate, self.errors))
+        statsd.gauge('es.reindex.%s.rate' % self.name, int(self.rate))
+        statsd.gauge('es.reindex.%s.errors' % self.name, self.errors)
+
+    def run(self):
+        """
+        Index everything, resuming from the checkpoint of a previous run on
+        the same index if there is one. Returns the number of documents
+        indexed and the number of errors.
+        """
+        self.reindexing = self.get_reindexing()
+        progress = {}
+        if self.reindexing:
+            progress = self.reindexing.get_progress(self.name)
+        if progress.get('done'):
+            log.info('Skipping %s, already indexed in %s.'
+                     % (self.name, self.index))
+            return progress['indexed'], progress['errors']
+
+        self.last_id = progress.get('last_id')
+        if self.last_id:
+            log.info('Resuming %s in %s after id %s.'
+                     % (self.name, self.index, self.last_id))
+        self.start = time.time()
+        self.indexed = self.resumed = progress.get('indexed', 0)
+        self.errors = progress.get('errors', 0)
+
+        buffer = []
+        for docs, errors, last_id in self.extracted(self.last_id):
+            buffer.extend(docs)
+            self.errors += errors
+            if len(buffer) >= self.batch_size:
+                self.flush(buffer)
+                buffer = []
+                self.last_id = last_id
+                if self.reindexing:
+                    self.checkpoint()
+                self.report()
+            elif not buffer:
+                self.last_id = last_id
+
+        self.flush(buffer)
+        if self.reindexing:
+            self.checkpoint(done=True)
+        self.report()
+        return self.indexed, self.errors
@@ -9,6 +9,7 @@ import traceback
 from optparse import make_option
 
 import requests
+from celery.exceptions import SoftTimeLimitExceeded
 from celery_tasktree import task_with_callbacks, TaskTree
 
 from django.conf import settings as django_settings
@@ -186,24 +187,47 @@ def create_mapping(new_index, alias, num_replicas=DEFAULT_NUM_REPLICAS,
             status=(200, 201))
 
 
-@task_with_callbacks
+job = 'lib.es.management.commands.reindex.create_index'
+time_limits = django_settings.CELERY_TIME_LIMITS[job]
+
+
 def create_index(index, is_stats):
     """Create the index.
 
     - index: name of the index
     - is_stats: if True, we're indexing stats
+
+    If an indexer fails or the time limit is reached, the error is saved on
+    the flag and raised so the alias is not moved to an incomplete index.
+    The indexers resume from their checkpoints with --resume.
     """
     log('Running all indexes for %r' % index)
     indexers = is_stats and _INDEXES['stats'] or _INDEXES['apps']
 
+    failed = []
     for indexer in indexers:
         log('Indexing %r' % indexer.__name__)
         try:
             indexer(index, aliased=False)
+        except SoftTimeLimitExceeded:
+            log('Indexer %r ran out of time' % indexer.__name__)
+            failed.append(indexer.__name__)
+            break
         except Exception:
-            # We want to log this event but continue
+            # We want to log this event but run the other indexers.
             log('Indexer %r failed' % indexer.__name__)
             traceback.print_exc()
+            failed.append(indexer.__name__)
+
+    if failed:
+        error = 'Indexing %r failed: %s' % (index, ', '.join(failed))
+        Reindexing.objects.filter(new_index=index).update(error=error)
+        raise RuntimeError(error)
+
+
+create_index = task_with_callbacks(create_index,
+                                   time_limit=time_limits['hard'],
+                                   soft_time_limit=time_limits['soft'])
 
 
 @task_with_callbacks
@@ -222,6 +246,17 @@ def unflag_database():
     Reindexing.objects.all().delete()
 
 
+def progress():
+    """A one line summary of the progress of the running indexers."""
+    stats = []
+    for reindexing in Reindexing.objects.all():
+        for name, data in sorted(reindexing.get_progress().items()):
+            stats.append('%s: %s docs %s/s %s errors%s' % (
+                name, data['indexed'], data['rate'], data['errors'],
+                ' (done)' if data['done'] else ''))
+    return ' | '.join(stats) or 'Waiting for the indexers...'
+
+
 _SUMMARY = """
 *** Reindexation done ***
 
@@ -248,6 +283,10 @@ class Command(BaseCommand):
                     help=('Wipes ES from any content first. This option '
                           'will destroy anything that is in ES!'),
                     default=False),
+        make_option('--resume', action='store_true',
+                    help=('Resume an interrupted reindexation from its '
+                          'last checkpoint instead of starting over'),
+                    default=False),
     )
 
     def handle(self, *args, **kwargs):
@@ -263,10 +302,14 @@ class Command(BaseCommand):
                                'run from the Marketplace.')
 
         force = kwargs.get('force', False)
+        resume = kwargs.get('resume', False)
 
-        if database_flagged() and not force:
+        if database_flagged() and not (force or resume):
             raise CommandError('Indexation already occuring - use --force to '
-                               'bypass')
+                               'bypass or --resume to continue it')
+        flagged = dict((r.alias, r) for r in Reindexing.objects.all())
+        if resume:
+            Reindexing.objects.update(error=None)
 
         prefix = kwargs.get('prefix', '')
         log('Starting the reindexation')
@@ -280,11 +323,13 @@ class Command(BaseCommand):
 
             if confirm == 'yes':
                 unflag_database()
+                flagged = {}
                 requests.delete(url('/'))
             else:
                 raise CommandError("Aborted.")
-        elif force:
+        elif force and not resume:
             unflag_database()
+            flagged = {}
 
         # Get list current aliases at /_aliases.
         all_aliases = requests.get(url('/_aliases')).json()
@@ -323,19 +368,27 @@ class Command(BaseCommand):
                     # mark the alias to be removed as well
                     add_action('remove', aliased_index, alias)
 
-            # create a new index, using the alias name with a timestamp
-            new_index = timestamp_index(alias)
-
-            # if old_index is None that could mean it's a full index
-            # In that case we want to continue index in it
-            future_alias = url('/%s' % alias)
-            if requests.head(future_alias).status_code == 200:
-                old_index = alias
-
-            # flag the database
-            step1 = tree.add_task(flag_database, args=[new_index, old_index,
-                                                       alias])
-            step2 = step1.add_task(create_mapping, args=[new_index, alias])
+            if resume and alias in flagged:
+                # keep filling the index of the interrupted run, the
+                # indexers pick up from their checkpoints
+                new_index = flagged[alias].new_index
+                log('Resuming the indexation of %r' % new_index)
+                step2 = tree.add_task(create_mapping, args=[new_index, alias])
+            else:
+                # create a new index, using the alias name with a timestamp
+                new_index = timestamp_index(alias)
+
+                # if old_index is None that could mean it's a full index
+                # In that case we want to continue index in it
+                future_alias = url('/%s' % alias)
+                if requests.head(future_alias).status_code == 200:
+                    old_index = alias
+
+                # flag the database
+                step1 = tree.add_task(flag_database,
+                                      args=[new_index, old_index, alias])
+                step2 = step1.add_task(create_mapping,
+                                       args=[new_index, alias])
             step3 = step2.add_task(create_index, args=[new_index, is_stats])
             last_action = step3
 
@@ -361,8 +414,13 @@ class Command(BaseCommand):
             tree.apply_async()
             time.sleep(10)   # give celeryd some time to flag the DB
             while database_flagged():
-                sys.stdout.write('.')
+                sys.stdout.write('\r%s' % progress())
                 sys.stdout.flush()
+                failed = Reindexing.objects.exclude(error=None)
+                if failed:
+                    raise CommandError(
+                        '%s. Fix it and run again with --resume.'
+                        % '. '.join(r.error for r in failed))
                 time.sleep(5)
         finally:
             del os.environ['FORCE_INDEXING']
@@ -20,7 +20,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
 from amo.utils import chunked, timestamp_index
-from addons.models import Webapp  # To avoid circular import.
+from addons.models import Webapp  # NOQA, to avoid circular import.
 from lib.es.models import Reindexing
 from lib.es.utils import database_flagged
 
@@ -90,9 +90,7 @@ def index_webapp(ids, **kw):
     index = kw.pop('index', None) or ALIAS
     sys.stdout.write('Indexing %s apps' % len(ids))
 
-    qs = Webapp.indexing_transformer(Webapp.uncached.filter(id__in=ids))
-
-    docs = [WebappIndexer.extract_document(obj.id, obj=obj) for obj in qs]
+    docs = WebappIndexer.extract_documents(ids)
     WebappIndexer.bulk_index(docs, es=ES, index=index)
 
 
@@ -1,3 +1,5 @@
+import json
+
 from django.db import models
 
 
@@ -6,6 +8,22 @@ class Reindexing(models.Model):
     old_index = models.CharField(max_length=255, null=True)
     new_index = models.CharField(max_length=255)
     alias = models.CharField(max_length=255)
+    # JSON progress of each indexer, see `lib.es.bulk.BulkIndexer`.
+    progress = models.TextField(null=True)
+    # Why the indexation of `new_index` stopped, it is resumed with --resume.
+    error = models.TextField(null=True)
 
     class Meta:
         db_table = 'zadmin_reindexing'
+
+    def get_progress(self, name=None):
+        progress = json.loads(self.progress or '{}')
+        if name is None:
+            return progress
+        return progress.get(name, {})
+
+    def set_progress(self, name, **data):
+        progress = self.get_progress()
+        progress[name] = data
+        self.progress = json.dumps(progress)
+        Reindexing.objects.filter(pk=self.pk).update(progress=self.progress)
@@ -0,0 +1,134 @@
+import datetime
+import json
+
+import mock
+from nose.tools import eq_
+from pyelasticsearch.exceptions import ElasticHttpError
+
+import amo
+import amo.tests
+from addons.models import Addon
+from lib.es.bulk import BulkIndexer, iter_ids
+from lib.es.models import Reindexing
+
+
+def extract(addon):
+    return {'id': addon.id, 'name': unicode(addon.name)}
+
+
+def response(items=()):
+    return {'items': list(items)}
+
+
+def rejected(id):
+    return {'index': {'_id': str(id), 'error': 'EsRejectedExecutionException'}}
+
+
+class TestBulkIndexer(amo.tests.TestCase):
+
+    def setUp(self):
+        self.addons = sorted([amo.tests.addon_factory() for x in range(5)],
+                             key=lambda a: a.id)
+        self.ids = [a.id for a in self.addons]
+        self.qs = Addon.objects.filter(id__in=self.ids)
+        self.search = mock.Mock(spec=['extract', 'extract_many'])
+        self.search.extract.side_effect = extract
+        self.search.extract_many.side_effect = lambda objs: map(extract, objs)
+        self.es = mock.patch('lib.es.bulk.get_es').start().return_value
+        self.post = self.es.send_request
+        self.post.return_value = response()
+        self.sleep = mock.patch('lib.es.bulk.time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def indexer(self, **kw):
+        kw.setdefault('workers', 0)
+        return BulkIndexer('addons', self.qs, self.search, 'test-index', **kw)
+
+    def sent(self, call):
+        lines = call[0][2].strip().split('\n')
+        return [json.loads(l)['id'] for l in lines[1::2]]
+
+    def test_iter_ids(self):
+        eq_(list(iter_ids(self.qs, 2)),
+            [self.ids[:2], self.ids[2:4], self.ids[4:]])
+        eq_(list(iter_ids(self.qs, 2, start=self.ids[2])),
+            [self.ids[3:5]])
+
+    def test_run(self):
+        eq_(self.indexer(batch_size=2, min_batch_size=2).run(), (5, 0))
+        eq_([id for c in self.post.call_args_list for id in self.sent(c)],
+            self.ids)
+        eq_(self.post.call_args[0][:2], ('POST', ['_bulk']))
+        action = json.loads(self.post.call_args[0][2].split('\n')[0])['index']
+        eq_(action['_index'], 'test-index')
+        eq_(action['_type'], 'addons')
+
+    def test_errors(self):
+        self.post.return_value = response([
+            {'index': {'_id': str(self.ids[0]), 'error': 'MapperParsing'}}])
+        eq_(self.indexer().run(), (4, 1))
+
+    def test_extract_errors(self):
+        self.search.extract_many.side_effect = ValueError
+        self.search.extract.side_effect = ValueError
+        eq_(self.indexer().run(), (0, 5))
+        assert not self.post.called
+
+    def test_extract_one_by_one(self):
+        self.search.extract_many.side_effect = ValueError
+        self.search.extract.side_effect = (
+            lambda obj: extract(obj) if obj.id != self.ids[0] else 1 / 0)
+        eq_(self.indexer().run(), (4, 1))
+
+    def test_rejected_retried(self):
+        self.post.side_effect = [response([rejected(self.ids[1])]),
+                                 response()]
+        eq_(self.indexer().run(), (5, 0))
+        eq_(self.sent(self.post.call_args_list[1]), [self.ids[1]])
+        eq_(self.sleep.call_count, 1)
+
+    def test_gives_up(self):
+        self.post.side_effect = ElasticHttpError(429, 'Too many requests')
+        eq_(self.indexer(max_retries=2).run(), (0, 5))
+        eq_(self.post.call_count, 3)
+
+    def test_request_failed(self):
+        self.post.side_effect = ElasticHttpError(500, 'Broken')
+        eq_(self.indexer().run(), (0, 5))
+        eq_(self.post.call_count, 1)
+
+    def test_batch_size_grows(self):
+        indexer = self.indexer(batch_size=2, max_batch_size=4)
+        indexer.run()
+        eq_(indexer.batch_size, 4)
+
+    def test_batch_size_shrinks(self):
+        indexer = self.indexer(batch_size=100, min_batch_size=10,
+                               target_time=-1)
+        indexer.run()
+        eq_(indexer.batch_size, 50)
+
+    def test_checkpoint(self):
+        reindexing = Reindexing.objects.create(
+            new_index='test-index', alias='addons',
+            start_date=datetime.datetime.now())
+        self.indexer(batch_size=2, min_batch_size=2).run()
+        progress = Reindexing.objects.get(pk=reindexing.pk).get_progress(
+            'addons')
+        eq_(progress['last_id'], self.ids[-1])
+        eq_(progress['indexed'], 5)
+        eq_(progress['done'], True)
+
+        # A finished indexer is not run again.
+        self.post.reset_mock()
+        eq_(self.indexer().run(), (5, 0))
+        assert not self.post.called
+
+    def test_resume(self):
+        reindexing = Reindexing.objects.create(
+            new_index='test-index', alias='addons',
+            start_date=datetime.datetime.now())
+        reindexing.set_progress('addons', last_id=self.ids[2], indexed=3,
+                                errors=0, rate=1.0, done=False)
+        eq_(self.indexer().run(), (5, 0))
+        eq_(self.sent(self.post.call_args), self.ids[3:])
@@ -29,9 +29,14 @@ def index_objects(ids, model, search, index=None, transforms=None):
     for t in transforms:
         qs = qs.transform(t)
 
-    for ob in qs:
-        data = search.extract(ob)
-
+    # Search modules can extract a whole chunk at once with `extract_many`.
+    objs = list(qs)
+    if hasattr(search, 'extract_many'):
+        docs = search.extract_many(objs)
+    else:
+        docs = [search.extract(ob) for ob in objs]
+
+    for ob, data in zip(objs, docs):
         for index in indices:
             model.index(data, bulk=True, id=ob.id, index=index)
 
@@ -1,22 +1,115 @@
 import logging
+import threading
 
 import requests
 import waffle
 from django_statsd.clients import statsd
+from ordereddict import OrderedDict
 
 from mkt import regions
 
+from .database import ip_to_int, RangeDatabase
+
 log = logging.getLogger('z.geoip')
 
 
-class GeoIP:
+class LRUCache(object):
+    """A dict of at most `size` items that drops the least recently used."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.pop(key, None)
+            if value is not None:
+                self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+class LocalBackend(object):
+    """Look the country up in a local range database, see database.py."""
+
+    def __init__(self, path):
+        self.db = RangeDatabase(path)
+
+    def lookup(self, address, ip):
+        """Return the country and the range it was found in, or None."""
+        if ip is None:
+            return None
+        with statsd.timer('z.geoip.local'):
+            found = self.db.find(ip)
+        if found:
+            start, end, country = found
+            return country, (start, end)
+
+
+class HTTPBackend(object):
     """Call to geodude server to resolve an IP to Geo Info block."""
 
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+
+    def lookup(self, address, ip):
+        """Return the country and None as geodude has no ranges, or None."""
+        if not waffle.switch_is_active('geoip-geodude'):
+            return None
+        with statsd.timer('z.geoip'):
+            res = None
+            try:
+                res = requests.post('{0}/country.json'.format(self.url),
+                                    timeout=self.timeout,
+                                    data={'ip': address})
+            except requests.Timeout:
+                statsd.incr('z.geoip.timeout')
+                log.error(('Geodude timed out looking up: {0}'
+                           .format(address)))
+            except requests.RequestException as e:
+                statsd.incr('z.geoip.error')
+                log.error('Geodude connection error: {0}'.format(str(e)))
+            if res and res.status_code == 200:
+                statsd.incr('z.geoip.success')
+                country = res.json().get('country_code')
+                if country:
+                    return country.lower(), None
+
+
+class GeoIP:
+    """
+    Resolve an IP to a country code with the local database if there is one
+    and geodude otherwise.
+
+    Results are kept in a per-process LRU cache, by /24 prefix when the range
+    they came from covers all of it and by address otherwise.
+    """
+
     def __init__(self, settings):
         self.timeout = float(getattr(settings, 'GEOIP_DEFAULT_TIMEOUT', .2))
         self.url = getattr(settings, 'GEOIP_URL', '')
         self.default_val = getattr(settings, 'GEOIP_DEFAULT_VAL',
                                    regions.WORLDWIDE.slug).lower()
+        self.cache = LRUCache(int(getattr(settings, 'GEOIP_CACHE_SIZE',
+                                          10000)))
+        self.backends = []
+        database = getattr(settings, 'GEOIP_DATABASE', '')
+        if database:
+            try:
+                self.backends.append(LocalBackend(database))
+            except (IOError, ValueError) as e:
+                log.error('Could not load the GeoIP database: {0}'
+                          .format(str(e)))
+        if self.url:
+            self.backends.append(HTTPBackend(self.url, self.timeout))
 
     def lookup(self, address):
         """Resolve an IP address to a block of geo information.
@@ -25,22 +118,23 @@ class GeoIP:
         return the default as defined by the settings, or "worldwide".
 
         """
-        if self.url and waffle.switch_is_active('geoip-geodude'):
-            with statsd.timer('z.geoip'):
-                res = None
-                try:
-                    res = requests.post('{0}/country.json'.format(self.url),
-                                        timeout=self.timeout,
-                                        data={'ip': address})
-                except requests.Timeout:
-                    statsd.incr('z.geoip.timeout')
-                    log.error(('Geodude timed out looking up: {0}'
-                               .format(address)))
-                except requests.RequestException as e:
-                    statsd.incr('z.geoip.error')
-                    log.error('Geodude connection error: {0}'.format(str(e)))
-                if res and res.status_code == 200:
-                    statsd.incr('z.geoip.success')
-                    return res.json().get('country_code',
-                                          self.default_val).lower()
+        ip = ip_to_int(address)
+        prefix = ip >> 8 if ip is not None else None
+        for key in (prefix, address):
+            country = self.cache.get(key) if key is not None else None
+            if country:
+                statsd.incr('z.geoip.cache.hit')
+                return country
+
+        for backend in self.backends:
+            found = backend.lookup(address, ip)
+            if found:
+                country, block = found
+                # Only the local database has ranges, and only for IPv4.
+                if (block and block[0] <= prefix << 8 and
+                        (prefix << 8 | 0xff) <= block[1]):
+                    self.cache.set(prefix, country)
+                else:
+                    self.cache.set(address, country)
+                return country
         return self.default_val
@@ -0,0 +1,100 @@
+"""
+A local database of IPv4 ranges and the country they are in, searched in
+place through mmap so every process shares the same pages.
+
+The file is MAGIC followed by non-overlapping (start, end, country code)
+records sorted by start, with start and end as big-endian integers.
+
+To build one from a MaxMind GeoIP country CSV:
+
+$ python lib/geoip/database.py GeoIPCountryWhois.csv geoip.db
+"""
+import csv
+import mmap
+import os
+import socket
+import struct
+import sys
+import tempfile
+
+MAGIC = 'GEOIP1\n\x00'
+RECORD = struct.Struct('>II2s')
+START = struct.Struct('>I')
+
+
+def ip_to_int(address):
+    """The integer value of an IPv4 address, None if it isn't one."""
+    try:
+        return START.unpack(socket.inet_aton(address))[0]
+    except (socket.error, TypeError, UnicodeError):
+        return None
+
+
+class RangeDatabase(object):
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError('%s is not a GeoIP range database.' % path)
+        self.count = (len(self.map) - len(MAGIC)) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def offset(self, i):
+        return len(MAGIC) + i * RECORD.size
+
+    def find(self, ip):
+        """
+        Return the (start, end, country) of the range containing the integer
+        `ip`, or None. A binary search on the starts of the ranges.
+        """
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if START.unpack_from(self.map, self.offset(mid))[0] <= ip:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo:
+            start, end, country = RECORD.unpack_from(self.map,
+                                                     self.offset(lo - 1))
+            if ip <= end:
+                return start, end, country.lower()
+
+    def close(self):
+        self.map.close()
+
+
+def write_database(ranges, path):
+    """
+    Write the (start, end, country) `ranges` to `path`. The file is replaced
+    at once, processes that have the old one mapped keep reading it.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC)
+        last = -1
+        for start, end, country in sorted(ranges):
+            if start <= last or end < start:
+                os.unlink(tmp)
+                raise ValueError('Bad or overlapping range %s-%s.'
+                                 % (start, end))
+            f.write(RECORD.pack(start, end, str(country).upper()))
+            last = end
+    os.rename(tmp, path)
+
+
+def read_csv(f):
+    """Yield the ranges of a MaxMind GeoIP country CSV file."""
+    for row in csv.reader(f):
+        yield int(row[2]), int(row[3]), row[4]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('Usage: %s <GeoIP country CSV> <database>' % sys.argv[0])
+    with open(sys.argv[1], 'rb') as f:
+        write_database(read_csv(f), sys.argv[2])
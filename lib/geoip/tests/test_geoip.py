@@ -1,15 +1,22 @@
+import os
+import shutil
+import tempfile
+
 import mock
 import requests
 from nose.tools import eq_
 
 import amo.tests
 
-from lib.geoip import GeoIP
+from lib.geoip import GeoIP, LRUCache
+from lib.geoip.database import ip_to_int, RangeDatabase, write_database
 
 
-def generate_settings(url='', default='worldwide', timeout=0.2):
+def generate_settings(url='', default='worldwide', timeout=0.2,
+                      database='', cache_size=10):
     return mock.Mock(GEOIP_URL=url, GEOIP_DEFAULT_VAL=default,
-                     GEOIP_DEFAULT_TIMEOUT=timeout)
+                     GEOIP_DEFAULT_TIMEOUT=timeout, GEOIP_DATABASE=database,
+                     GEOIP_CACHE_SIZE=cache_size)
 
 
 class GeoIPTest(amo.tests.TestCase):
@@ -70,3 +77,87 @@ class GeoIPTest(amo.tests.TestCase):
         mock_post.assert_called_with('{0}/country.json'.format(url),
                                      timeout=0.2, data={'ip': ip})
         eq_(result, 'worldwide')
+
+
+class LocalGeoIPTest(amo.tests.TestCase):
+
+    def setUp(self):
+        self.create_switch(name='geoip-geodude', active=True)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'geoip.db')
+        write_database([(ip_to_int('2.0.0.0'), ip_to_int('2.255.255.255'),
+                         'fr'),
+                        (ip_to_int('1.1.1.0'), ip_to_int('1.1.1.127'), 'us'),
+                        (ip_to_int('1.1.1.128'), ip_to_int('1.1.1.255'),
+                         'br')], self.path)
+
+    def test_find(self):
+        db = RangeDatabase(self.path)
+        eq_(len(db), 3)
+        eq_(db.find(ip_to_int('1.1.1.1'))[2], 'us')
+        eq_(db.find(ip_to_int('1.1.1.255'))[2], 'br')
+        eq_(db.find(ip_to_int('2.3.4.5'))[2], 'fr')
+        eq_(db.find(ip_to_int('1.1.0.255')), None)
+        eq_(db.find(ip_to_int('3.0.0.0')), None)
+        eq_(db.find(0), None)
+
+    def test_overlapping_ranges(self):
+        with self.assertRaises(ValueError):
+            write_database([(1, 10, 'us'), (5, 20, 'fr')], self.path)
+        eq_(len(RangeDatabase(self.path)), 3)
+
+    def test_not_a_database(self):
+        with open(self.path, 'w') as f:
+            f.write('nope')
+        geoip = GeoIP(generate_settings(database=self.path))
+        eq_(geoip.backends, [])
+        eq_(geoip.lookup('1.1.1.1'), 'worldwide')
+
+    @mock.patch('requests.post')
+    def test_lookup(self, mock_post):
+        geoip = GeoIP(generate_settings(url='localhost', database=self.path))
+        eq_(geoip.lookup('1.1.1.1'), 'us')
+        eq_(geoip.lookup('1.1.1.200'), 'br')
+        eq_(geoip.lookup('2.1.1.1'), 'fr')
+        assert not mock_post.called
+
+    @mock.patch('requests.post')
+    def test_fallback(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=200, json=lambda: {
+            'country_code': 'DE'})
+        geoip = GeoIP(generate_settings(url='localhost', database=self.path))
+        eq_(geoip.lookup('5.5.5.5'), 'de')
+        eq_(geoip.lookup('::1'), 'de')
+        eq_(mock_post.call_count, 2)
+
+    @mock.patch('lib.geoip.database.RangeDatabase.find')
+    def test_cached_by_prefix(self, find):
+        find.return_value = (ip_to_int('2.0.0.0'), ip_to_int('2.255.255.255'),
+                             'fr')
+        geoip = GeoIP(generate_settings(database=self.path))
+        eq_(geoip.lookup('2.1.1.1'), 'fr')
+        eq_(geoip.lookup('2.1.1.2'), 'fr')
+        eq_(find.call_count, 1)
+
+    @mock.patch('lib.geoip.database.RangeDatabase.find')
+    def test_cached_by_address(self, find):
+        find.return_value = (ip_to_int('1.1.1.0'), ip_to_int('1.1.1.127'),
+                             'us')
+        geoip = GeoIP(generate_settings(database=self.path))
+        eq_(geoip.lookup('1.1.1.1'), 'us')
+        eq_(geoip.lookup('1.1.1.1'), 'us')
+        eq_(find.call_count, 1)
+        geoip.lookup('1.1.1.2')
+        eq_(find.call_count, 2)
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    eq_(cache.get('a'), 1)
+    cache.set('c', 3)
+    eq_(cache.get('b'), None)
+    eq_(cache.get('a'), 1)
+    eq_(cache.get('c'), 3)
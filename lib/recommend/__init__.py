@@ -4,6 +4,7 @@ items.
 
 Check the function docs, they expect specific preconditions.
 """
+import heapq
 
 # Placeholders for the fast functions implemented in C.
 
@@ -20,3 +21,53 @@ try:
     from _recommend import symmetric_diff_count, similarity
 except ImportError:
     pass
+
+
+def build_index(items):
+    """
+    Build the inverted index used by `top_similar`.
+
+    `items` is a dict of {item: [collection]}, collections sorted and unique.
+    Returns a dict of {collection: [item]} and the list of items sorted by
+    the number of collections they are in.
+    """
+    index = {}
+    for item, collections in items.iteritems():
+        for collection in collections:
+            index.setdefault(collection, []).append(item)
+    by_size = sorted(items, key=lambda item: len(items[item]))
+    return index, by_size
+
+
+def top_similar(items, index, by_size, ids=None, size=11):
+    """
+    Yield (item, [(other, similarity)]) with the `size` most similar items for
+    each of `ids` (every item by default), the item itself included and the
+    most similar first. Scores are the same as `similarity`.
+
+    Instead of comparing every pair of items, only the items sharing at least
+    one collection with the item are scored one by one, the symmetric
+    difference being len(xs) + len(ys) - 2 * len(shared). Items sharing
+    nothing score 1 / (1 + len(xs) + len(ys)), so only the smallest of those
+    can make the cut and they are picked from `by_size`.
+    """
+    for item in items if ids is None else ids:
+        xs = items[item]
+        n = len(xs)
+        shared = {}
+        for collection in xs:
+            for other in index[collection]:
+                shared[other] = shared.get(other, 0) + 1
+
+        scores = [(1. / (1 + n + len(items[other]) - 2 * count), other)
+                  for other, count in shared.iteritems()]
+        extra = 0
+        for other in by_size:
+            if extra == size:
+                break
+            if other not in shared:
+                scores.append((1. / (1 + n + len(items[other])), other))
+                extra += 1
+
+        yield item, [(other, score) for score, other
+                     in heapq.nlargest(size, scores)]
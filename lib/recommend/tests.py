@@ -31,3 +31,30 @@ def test_symmetric_diff_count():
 # The algorithm is in flux so this is minimal coverage.
 def test_similarity():
     eq_(1/2., recommend.similarity([1], [1, 2]))
+
+
+def test_top_similar():
+    items = {
+        1: array('l', [1, 2, 3, 4]),
+        2: array('l', [1, 2, 3, 5]),
+        3: array('l', [4, 6, 7, 8, 9]),
+        4: array('l', [10, 11, 12, 13]),
+        5: array('l', [6, 7, 8, 9, 14, 15, 16, 17, 18, 19]),
+    }
+    index, by_size = recommend.build_index(items)
+    top = dict(recommend.top_similar(items, index, by_size, size=3))
+    eq_(top[1], [(1, 1.), (2, 1 / 3.), (3, 1 / 8.)])
+    # Nothing else shares a collection with 5, the smallest items come next.
+    eq_(top[5][:2], [(5, 1.), (3, 1 / 8.)])
+    eq_(top[5][2][1], 1 / 15.)
+
+
+def test_top_similar_matches_similarity():
+    # Every score and rank must be the same as comparing all the pairs.
+    items = dict((i, array('l', range(i % 7, i % 7 + i % 5 + 4)))
+                 for i in range(60))
+    index, by_size = recommend.build_index(items)
+    for item, top in recommend.top_similar(items, index, by_size):
+        scores = sorted((recommend.similarity(items[item], xs)
+                         for xs in items.values()), reverse=True)
+        eq_([score for _, score in top], scores[:11])
@@ -103,6 +103,31 @@ SERVICES_DATABASE = {
     'HOST': '',
 }
 
+# Answer update pings in services/update.py from an in-process index of
+# add-on versions and files. Every SERVICES_UPDATE_INDEX_INTERVAL seconds it
+# reloads the add-ons zamboni logged as changed in the cache, and it is fully
+# reloaded every SERVICES_UPDATE_INDEX_FULL_INTERVAL seconds.
+SERVICES_UPDATE_INDEX = False
+SERVICES_UPDATE_INDEX_INTERVAL = 60
+SERVICES_UPDATE_INDEX_FULL_INTERVAL = 60 * 60
+
+# Cache the rendered responses of services/update.py. They are invalidated
+# along with the compatible versions of the add-on.
+SERVICES_UPDATE_CACHE = False
+SERVICES_UPDATE_CACHE_TIMEOUT = 60 * 60
+
+# Cache the responses and icons of services/theme_update.py. Responses are
+# only served from the cache while the theme has not been modified since.
+SERVICES_THEME_UPDATE_CACHE = False
+SERVICES_THEME_UPDATE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Number of receipts services/verify.py remembers the decoding and the
+# install and purchase checks of, per process. 0 disables the cache.
+SERVICES_VERIFY_CACHE_SIZE = 10000
+
+# Maximum number of add-ons looked up in one batch update request.
+SERVICES_UPDATE_BATCH_SIZE = 100
+
 DATABASE_ROUTERS = ('multidb.PinningMasterSlaveRouter',)
 
 # For use django-mysql-pool backend.
@@ -924,6 +949,37 @@ FETCH_BY_ID = True
 # it's not possible to invalidate these queries.
 CACHE_COUNT_TIMEOUT = 60
 
+# Number of seconds the rows of a translation are cached. They are invalidated
+# when a translation is saved or deleted.
+TRANSLATIONS_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Number of seconds the compiled ACL rules of a user are cached. They are
+# invalidated when the user's groups or their rules change.
+ACL_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Number of seconds the counts of the review queues are cached. They are kept
+# up to date as add-ons change and rebuilt by the queue_stats crons.
+QUEUE_STATS_TIMEOUT = 60 * 60
+
+# Number of seconds the search suggestions index is cached. It is kept up to
+# date as add-ons are indexed and rebuilt by the build_suggestions cron.
+SUGGESTIONS_TIMEOUT = 60 * 60 * 24
+
+# Number of seconds the recommendation scores and the discovery pane
+# recommendations made from them are cached. They are invalidated when the
+# recs cron writes new scores.
+RECS_CACHE_TIMEOUT = 60 * 60
+
+# The counts of the SyncedCollections seen by the discovery pane are written
+# together once there are this many changes or this many seconds have passed,
+# when a request finishes. 0 writes them right away.
+SYNCED_COLLECTIONS_BUFFER_SIZE = 100
+SYNCED_COLLECTIONS_BUFFER_INTERVAL = 10
+
+# Number of seconds the sanitized HTML of a string is cached. It is keyed on
+# the content of the string so it never needs to be invalidated.
+SANITIZER_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
 # To enable pylibmc compression (in bytes)
 PYLIBMC_MIN_COMPRESS_LEN = 0  # disabled
 
@@ -1108,6 +1164,10 @@ CELERY_TIME_LIMITS = {
         'soft': 60 * 10,  # 10 mins to reindex.
         'hard': 60 * 20,  # 20 mins hard limit.
     },
+    'lib.es.management.commands.reindex.create_index': {
+        'soft': 60 * 60 * 6,  # 6 hours to index everything.
+        'hard': 60 * 60 * 6 + 60 * 10,
+    },
 }
 
 # When testing, we always want tasks to raise exceptions. Good for sanity.
@@ -1339,6 +1399,9 @@ BLOCKLIST_COOKIE = 'BLOCKLIST_v1'
 
 # The maximum file size that is shown inside the file viewer.
 FILE_VIEWER_SIZE_LIMIT = 1048576
+# The number of files served from the zip index of the file viewer that are
+# kept extracted.
+FILE_VIEWER_MEMBERS = 200
 # The maximum file size that you can have inside a zip file.
 FILE_UNZIP_SIZE_LIMIT = 104857600
 
@@ -1377,6 +1440,11 @@ ES_TIMEOUT = 30
 ES_DEFAULT_NUM_REPLICAS = 2
 ES_DEFAULT_NUM_SHARDS = 5
 ES_USE_PLUGINS = False
+# Threads extracting documents during a reindex, 0 extracts them inline.
+ES_REINDEX_WORKERS = 4
+# Seconds the results of a cached search are still served once expired, while
+# one worker refreshes them.
+ES_QUERY_CACHE_STALE = 60 * 5
 
 # Default AMO user id to use for tasks.
 TASK_USER_ID = 4757633
@@ -1550,6 +1618,13 @@ JINGO_MINIFY_USE_STATIC = False
 # Monolith settings.
 MONOLITH_SERVER = None
 MONOLITH_MAX_DATE_RANGE = 365
+# Monolith records are inserted together once there are this many of them or
+# this many seconds have passed, when a request finishes. 0 inserts them
+# right away.
+MONOLITH_BUFFER_SIZE = 100
+MONOLITH_BUFFER_INTERVAL = 10
+# Where records are kept while the database is unavailable.
+MONOLITH_SPOOL = os.path.join(TMP_PATH, 'monolith.spool')
 
 # These are useful services, like error generation, getting settings and the
 # like. They should *not* be on in production.
@@ -0,0 +1 @@
+ALTER TABLE `zadmin_reindexing` ADD COLUMN `error` longtext;
@@ -138,6 +138,7 @@ class LoginResource(CORSResource, MarketplaceResource):
 
         request.user, request.amo_user = profile.user, profile
         request.groups = profile.groups.all()
+        request.permissions = acl.get_permissions(profile)
 
         # TODO: move this to the signal.
         profile.log_login_attempt(True)
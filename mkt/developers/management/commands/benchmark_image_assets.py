@@ -0,0 +1,51 @@
+import os
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from PIL import Image
+
+
+class Command(BaseCommand):
+    help = ("Time the hue extraction of a 128px icon and the generation of "
+            "the backdrop of every image asset size.")
+    args = '[icon]'
+    option_list = BaseCommand.option_list + (
+        make_option('--runs', action='store', type='int', default=10,
+                    help='Number of runs to average over.'),
+    )
+
+    def timed(self, name, func, runs):
+        start = time.time()
+        for i in range(runs):
+            result = func()
+        print '%-40s %8.2fms' % (name, (time.time() - start) * 1000 / runs)
+        return result
+
+    def handle(self, *args, **options):
+        from mkt.constants import APP_IMAGE_SIZES
+        from mkt.developers import tasks
+
+        runs = options['runs']
+        path = args[0] if args else os.path.join(
+            os.path.dirname(tasks.__file__), 'tests', 'icons',
+            '337141-128.png')
+        icon = Image.open(path)
+        icon.load()
+        print 'Icon: %s %s %s' % (path, icon.mode, icon.size)
+
+        hue = self.timed('get_hue', lambda: tasks.get_hue(icon), runs)
+        hue = hue / 255.0
+
+        for asset in APP_IMAGE_SIZES:
+            size = asset['size']
+            name = 'backdrop %s %sx%s' % ((asset['slug'],) + size)
+
+            def generate():
+                tasks._backdrops.clear()
+                return tasks._generate_image_asset_backdrop(hue, size)
+            self.timed(name, generate, runs)
+            self.timed(name + ' (cached)',
+                       lambda: tasks._generate_image_asset_backdrop(hue, size),
+                       runs)
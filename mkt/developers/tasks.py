@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import base64
 import colorsys
+import cStringIO
 import json
 import logging
 import os
@@ -192,8 +193,9 @@ def resize_imageasset(src, full_dst, size, **kw):
 def get_hue(image):
     """Return the most common hue of the image."""
     hues = [0 for x in range(256)]
-    # Iterate each pixel. Count each hue value in `hues`.
-    for pixel in image.getdata():
+    # Iterate each distinct colour, it is the same as iterating each pixel but
+    # colorsys runs once per colour. Count each hue value in `hues`.
+    for count, pixel in image.getcolors(image.size[0] * image.size[1]):
         # Ignore greyscale pixels.
         if pixel[0] == pixel[1] and pixel[1] == pixel[2]:
             continue
@@ -202,28 +204,52 @@ def get_hue(image):
             continue
         h, l, s = colorsys.rgb_to_hls(*[x / 255.0 for x in pixel[:3]])
         # Get a tally of the hue for that image.
-        hues[int(h * 255)] += 1
+        hues[int(h * 255)] += count
 
     return hues.index(max(hues))
 
 
+# Backdrops already generated by this process, keyed on (hue, size). They are
+# kept PNG encoded, a decoded 512x512 backdrop is about 1MB, and the cache is
+# emptied once it holds more than BACKDROP_CACHE_BYTES.
+_backdrops = {}
+BACKDROP_CACHE_BYTES = 8 * 1024 * 1024
+
+
 def _generate_image_asset_backdrop(hue, size=None):
+    key = (hue, size)
+    if key not in _backdrops:
+        im = _recolor_image_asset_backdrop(hue, size)
+        data = cStringIO.StringIO()
+        im.save(data, 'PNG')
+        if (sum(map(len, _backdrops.values())) + len(data.getvalue()) >
+                BACKDROP_CACHE_BYTES):
+            _backdrops.clear()
+        _backdrops[key] = data.getvalue()
+        return im
+    im = Image.open(cStringIO.StringIO(_backdrops[key]))
+    im.load()
+    return im
+
+
+def _recolor_image_asset_backdrop(hue, size=None):
     with storage.open(os.path.join(settings.MEDIA_ROOT,
                                    'img/hub/assetback.png')) as assetback:
         im = Image.open(assetback)
         if size:
             im = im.resize(size)
-        im_width = im.size[0]
+        im_width, im_height = im.size
 
-        # Change the hue of the background by iterating each pixel.
-        for i, px in enumerate(im.getdata()):
+        # Change the hue of each distinct colour of the background.
+        colors = {}
+        for count, px in im.getcolors(im_width * im_height):
             # Get the HLS value for the pixel
             h, l, s = colorsys.rgb_to_hls(*[x / 255.0 for x in px[:3]])
             # Convert back to RGB
-            px = tuple([int(x * 255) for x in
-                        colorsys.hls_to_rgb(hue, l, s)])
-            # Put the RGB value back in the pixel
-            im.putpixel((i % im_width, i / im_width), px)
+            colors[px] = tuple([int(x * 255) for x in
+                                colorsys.hls_to_rgb(hue, l, s)])
+        # Put the RGB values back in the pixels.
+        im.putdata([colors[px] for px in im.getdata()])
 
     return im
 
@@ -1,4 +1,5 @@
 import codecs
+import colorsys
 from contextlib import contextmanager
 from cStringIO import StringIO
 import json
@@ -261,6 +262,40 @@ class TestGenerateImageAssets(amo.tests.TestCase):
             im.load()
         eq_(tasks.get_hue(im), 42)
 
+    @mock.patch('mkt.developers.tasks._backdrops', {})
+    @mock.patch('mkt.developers.tasks._recolor_image_asset_backdrop')
+    def test_backdrop_cached(self, recolor):
+        recolor.return_value = Image.new('RGB', (10, 10))
+        first = tasks._generate_image_asset_backdrop(0.5, (10, 10))
+        second = tasks._generate_image_asset_backdrop(0.5, (10, 10))
+        eq_(recolor.call_count, 1)
+        assert first is not second
+        tasks._generate_image_asset_backdrop(0.6, (10, 10))
+        eq_(recolor.call_count, 2)
+
+    @mock.patch('mkt.developers.tasks._backdrops', {})
+    @mock.patch('mkt.developers.tasks.BACKDROP_CACHE_BYTES', 1)
+    @mock.patch('mkt.developers.tasks._recolor_image_asset_backdrop')
+    def test_backdrop_cache_bytes(self, recolor):
+        recolor.return_value = Image.new('RGB', (10, 10))
+        tasks._generate_image_asset_backdrop(0.5, (10, 10))
+        tasks._generate_image_asset_backdrop(0.6, (10, 10))
+        eq_(tasks._backdrops.keys(), [(0.6, (10, 10))])
+
+    @mock.patch('mkt.developers.tasks._backdrops', {})
+    def test_backdrop(self):
+        size = APP_IMAGE_SIZES[0]['size']
+        im = tasks._generate_image_asset_backdrop(0.5, size)
+        # Recolour each pixel by itself for comparison.
+        with storage.open(os.path.join(settings.MEDIA_ROOT,
+                                       'img/hub/assetback.png')) as fp:
+            expected = Image.open(fp).resize(size)
+        for i, px in enumerate(expected.getdata()):
+            h, l, s = colorsys.rgb_to_hls(*[x / 255.0 for x in px[:3]])
+            px = tuple([int(x * 255) for x in colorsys.hls_to_rgb(0.5, l, s)])
+            expected.putpixel((i % size[0], i / size[0]), px)
+        eq_(list(im.getdata()), list(expected.getdata()))
+
 
 class TestFetchManifest(amo.tests.TestCase):
 
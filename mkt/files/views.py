@@ -192,5 +192,5 @@ def serve(request, viewer, key):
         log.error(u'Couldn\'t find %s in %s (%d entries) for file %s' %
                   (key, files.keys()[:10], len(files.keys()), viewer.file.id))
         raise http.Http404()
-    return HttpResponseSendFile(request, obj['full'],
+    return HttpResponseSendFile(request, viewer.get_path(obj),
                                 content_type=obj['mimetype'])
@@ -0,0 +1,115 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+
+from django_statsd.clients import statsd
+
+log = logging.getLogger('z.monolith')
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class RecordBuffer(object):
+    """
+    Collect MonolithRecords in memory and insert them with one multi-row
+    INSERT once there are `size` of them or `interval` seconds have passed.
+
+    The buffer is flushed when a request has finished, outside of its
+    transaction, and when the process exits. Records that could not be
+    inserted are appended to the `spool` file, and inserted again with the
+    next successful flush.
+    """
+
+    def __init__(self, size, interval, spool):
+        self.size = size
+        self.interval = interval
+        self.spool = spool
+        self.records = []
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        if self.size <= 1:
+            self.write([record])
+            return
+        with self.lock:
+            self.records.append(record)
+
+    def due(self):
+        return bool(self.records) and (
+            len(self.records) >= self.size or
+            time.time() - self.last_flush >= self.interval)
+
+    def flush(self):
+        with self.lock:
+            records, self.records = self.records, []
+            self.last_flush = time.time()
+        if records:
+            self.write(records)
+
+    def write(self, records):
+        from .models import MonolithRecord
+        try:
+            MonolithRecord.objects.bulk_create(records)
+            transaction.commit_unless_managed()
+        except DatabaseError:
+            log.exception('Spooling %s monolith records.' % len(records))
+            statsd.incr('monolith.spooled', len(records))
+            transaction.rollback_unless_managed()
+            self.spool_records(records)
+            return
+        statsd.incr('monolith.inserted', len(records))
+        self.replay()
+
+    def spool_records(self, records):
+        with self.lock:
+            with open(self.spool, 'a') as f:
+                for r in records:
+                    recorded = r.recorded.strftime(DATE_FORMAT)
+                    f.write(json.dumps([r.key, recorded, r.user_hash,
+                                        r.value]) + '\n')
+
+    def replay(self):
+        """Insert the spooled records again, if the spool file exists."""
+        if not os.path.exists(self.spool):
+            return
+        # Move it out of the way first so only one process replays it.
+        replaying = '%s.%s' % (self.spool, os.getpid())
+        try:
+            os.rename(self.spool, replaying)
+        except OSError:
+            return
+        from .models import MonolithRecord
+        with open(replaying) as f:
+            records = []
+            for line in f:
+                key, recorded, user_hash, value = json.loads(line)
+                records.append(MonolithRecord(
+                    key=key, user_hash=user_hash, value=value,
+                    recorded=datetime.datetime.strptime(recorded,
+                                                        DATE_FORMAT)))
+        os.unlink(replaying)
+        log.info('Replaying %s spooled monolith records.' % len(records))
+        self.write(records)
+
+
+buffer = RecordBuffer(settings.MONOLITH_BUFFER_SIZE,
+                      settings.MONOLITH_BUFFER_INTERVAL,
+                      settings.MONOLITH_SPOOL)
+
+
+def flush_when_due(sender, **kw):
+    if buffer.due():
+        buffer.flush()
+
+
+request_finished.connect(flush_when_due, dispatch_uid='monolith_flush')
+atexit.register(buffer.flush)
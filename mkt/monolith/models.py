@@ -4,6 +4,8 @@ import json
 
 from django.db import models
 
+from .buffer import buffer
+
 
 class MonolithRecord(models.Model):
     """Data stored temporarily for monolith.
@@ -24,18 +26,25 @@ class MonolithRecord(models.Model):
 def get_user_hash(request):
     """Get a hash identifying an user.
 
-    It's a hash of session key, ip and user agent
+    It's a hash of session key, ip and user agent, computed once per request.
     """
+    if getattr(request, '_monolith_user_hash', None):
+        return request._monolith_user_hash
+
     ip = request.META.get('REMOTE_ADDR', '')
     ua = request.META.get('User-Agent', '')
     session_key = request.session.session_key or ''
 
-    return hashlib.sha1('-'.join(map(str, (ip, ua, session_key)))).hexdigest()
+    request._monolith_user_hash = hashlib.sha1(
+        '-'.join(map(str, (ip, ua, session_key)))).hexdigest()
+    return request._monolith_user_hash
 
 
 def record_stat(key, request, **data):
     """Create a new record in the database with the given values.
 
+    Records are buffered and inserted together, see mkt.monolith.buffer.
+
     :param key:
         The type of stats you're sending, e.g. "app.install".
 
@@ -57,5 +66,5 @@ def record_stat(key, request, **data):
 
     record = MonolithRecord(key=key, user_hash=get_user_hash(request),
                             recorded=recorded, value=json.dumps(data))
-    record.save()
+    buffer.add(record)
     return record
@@ -1,8 +1,13 @@
 import logging
 import json
+from urllib import urlencode
 
 from django.db import transaction
 
+from tastypie import http
+from tastypie.exceptions import ImmediateHttpResponse
+from tastypie.paginator import Paginator
+
 from mkt.api.authentication import OAuthAuthentication
 from mkt.api.authorization import PermissionAuthorization
 from mkt.api.base import MarketplaceModelResource
@@ -12,6 +17,43 @@ from .models import MonolithRecord
 logger = logging.getLogger('z.monolith')
 
 
+class KeysetPaginator(Paginator):
+    """
+    Page through the records in id order. The next page starts after the
+    last id of this one, with `id__gt`, instead of at an OFFSET that the
+    database has to scan up to, so draining a big table stays fast.
+
+    There is no total count, that would be another scan. Clients used to
+    page with `offset`, which is now a 400: follow `meta.next`, or pass the
+    last id seen as `id__gt`.
+    """
+
+    def page(self):
+        if 'offset' in self.request_data:
+            error = {'offset': ['Use id__gt, as given in meta.next.']}
+            raise ImmediateHttpResponse(response=http.HttpBadRequest(
+                json.dumps({'error_message': error}),
+                content_type='application/json'))
+        limit = self.get_limit()
+        objects = self.objects.order_by('id')
+        if limit:
+            objects = objects[:limit]
+        objects = list(objects)
+        meta = {'limit': limit, 'next': None}
+        if limit and len(objects) == limit:
+            meta['next'] = self._generate_next_uri(limit, objects[-1].id)
+        return {'objects': objects, 'meta': meta}
+
+    def _generate_next_uri(self, limit, last_id):
+        if self.resource_uri is None:
+            return None
+        params = {}
+        for k, v in self.request_data.items():
+            params[k] = v.encode('utf-8') if isinstance(v, unicode) else v
+        params.update({'limit': limit, 'id__gt': last_id})
+        return '%s?%s' % (self.resource_uri, urlencode(params))
+
+
 class MonolithData(MarketplaceModelResource):
 
     class Meta:
@@ -20,7 +62,8 @@ class MonolithData(MarketplaceModelResource):
         resource_name = 'data'
         filtering = {'recorded': ['exact', 'lt', 'lte', 'gt', 'gte'],
                      'key': ['exact'],
-                     'id': ['lte', 'gte']}
+                     'id': ['lte', 'gte', 'gt']}
+        paginator_class = KeysetPaginator
         authorization = PermissionAuthorization('Monolith', 'API')
         authentication = OAuthAuthentication()
 
@@ -1,16 +1,23 @@
 from collections import namedtuple
 import datetime
 import json
+import os
+import shutil
+import tempfile
+import urlparse
 import uuid
 
+import mock
 from nose.tools import eq_
 
+from django.db import DatabaseError
 from django.test import client
 
 from amo.tests import TestCase
 from mkt.api.tests.test_oauth import BaseOAuth
 from mkt.site.fixtures import fixture
 
+from .buffer import flush_when_due, RecordBuffer
 from .models import record_stat, MonolithRecord
 
 
@@ -159,3 +166,92 @@ class TestMonolithResource(BaseOAuth):
 
         eq_(res.status_code, 204)
         eq_(MonolithRecord.objects.count(), 0)
+
+    def test_keyset_pagination(self):
+        for value in range(3):
+            record_stat('app.install', self.request, value=value)
+        ids = list(MonolithRecord.objects.order_by('id')
+                   .values_list('id', flat=True))
+
+        res = self.client.get(self.list_url, data={'limit': 2})
+        eq_(res.status_code, 200)
+        data = json.loads(res.content)
+        eq_([o['id'] for o in data['objects']], ids[:2])
+        params = dict(urlparse.parse_qsl(
+            urlparse.urlparse(data['meta']['next']).query))
+        eq_(params['id__gt'], str(ids[1]))
+
+        res = self.client.get(self.list_url, data=params)
+        data = json.loads(res.content)
+        eq_([o['id'] for o in data['objects']], ids[2:])
+        eq_(data['meta']['next'], None)
+
+    def test_offset_rejected(self):
+        res = self.client.get(self.list_url, data={'limit': 2, 'offset': 2})
+        eq_(res.status_code, 400)
+        assert 'offset' in json.loads(res.content)['error_message']
+
+
+class TestRecordBuffer(TestCase):
+
+    def setUp(self):
+        super(TestRecordBuffer, self).setUp()
+        self.request = RequestFactory()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.spool = os.path.join(self.dir, 'monolith.spool')
+        self.buffer = RecordBuffer(size=3, interval=60, spool=self.spool)
+        patcher = mock.patch('mkt.monolith.models.buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, **data):
+        return record_stat('app.install', self.request, value=1, **data)
+
+    def test_flushed_by_size(self):
+        self.record()
+        self.record()
+        assert not self.buffer.due()
+        eq_(MonolithRecord.objects.count(), 0)
+        self.record()
+        assert self.buffer.due()
+        with self.assertNumQueries(1):
+            self.buffer.flush()
+        eq_(MonolithRecord.objects.count(), 3)
+        assert not self.buffer.due()
+
+    @mock.patch('mkt.monolith.buffer.time.time')
+    def test_flushed_by_time(self, time):
+        time.return_value = self.buffer.last_flush
+        self.record()
+        assert not self.buffer.due()
+        time.return_value += 60
+        assert self.buffer.due()
+
+    def test_flushed_when_request_finishes(self):
+        for i in range(3):
+            self.record()
+        flush_when_due(None)
+        eq_(MonolithRecord.objects.count(), 3)
+
+    def test_user_hash_computed_once(self):
+        with mock.patch('mkt.monolith.models.hashlib.sha1') as sha1:
+            sha1.return_value.hexdigest.return_value = 'abc'
+            self.record()
+            self.record()
+        eq_(sha1.call_count, 1)
+
+    def test_spooled_when_database_fails(self):
+        self.record(__recorded=datetime.datetime(2013, 2, 12, 17, 34))
+        with mock.patch.object(MonolithRecord.objects, 'bulk_create') as bc:
+            bc.side_effect = DatabaseError
+            self.buffer.flush()
+        eq_(MonolithRecord.objects.count(), 0)
+        assert os.path.exists(self.spool)
+
+        self.record()
+        self.buffer.flush()
+        eq_(MonolithRecord.objects.count(), 2)
+        assert not os.path.exists(self.spool)
+        eq_(MonolithRecord.objects.order_by('recorded')[0].recorded,
+            datetime.datetime(2013, 2, 12, 17, 34))
@@ -4,6 +4,7 @@ import json
 import time
 from urllib import urlencode
 
+from django.core.cache import cache
 from django.db import connection
 from django.conf import settings
 
@@ -333,6 +334,86 @@ class TestVerify(amo.tests.TestCase):
         assert ('Cache-Control', 'no-cache') in hdrs, 'No cache header needed'
 
 
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_URL', 'http://foo.com')
+@mock.patch.object(utils.settings, 'SERVICES_VERIFY_CACHE_SIZE', 10)
+class TestReceiptCache(amo.tests.TestCase):
+    fixtures = fixture('webapp_337141', 'user_999')
+
+    def setUp(self):
+        cache.clear()
+        verify.receipt_cache.clear()
+        self.addon = Addon.objects.get(pk=337141)
+        self.addon.update(premium_type=amo.ADDON_PREMIUM)
+        self.user = UserProfile.objects.get(pk=999)
+        self.install = Installed.objects.create(addon=self.addon,
+                                                user=self.user)
+        self.install.update(uuid='some-uuid')
+        self.purchase = AddonPurchase.objects.create(addon=self.addon,
+                                                     user=self.user)
+        self.user_data = {'user': {'type': 'directed-identifier',
+                                   'value': 'some-uuid'},
+                          'product': {'url': 'http://f.com',
+                                      'storedata': urlencode({'id': 337141})},
+                          'verify': 'https://foo.com/verifyme/',
+                          'exp': calendar.timegm(time.gmtime()) + 1000,
+                          'typ': 'purchase-receipt'}
+        patcher = mock.patch.object(verify, 'decode_receipt')
+        self.decode_receipt = patcher.start()
+        self.decode_receipt.side_effect = lambda r: dict(self.user_data)
+        self.addCleanup(patcher.stop)
+
+    def get(self, receipt='receipt'):
+        v = verify.Verify(receipt, RequestFactory().get('/verifyme/').META)
+        v.cursor = connection.cursor()
+        return json.loads(v.check_full())['status']
+
+    def test_cached(self):
+        eq_(self.get(), 'ok')
+        with self.assertNumQueries(0):
+            eq_(self.get(), 'ok')
+        eq_(self.decode_receipt.call_count, 1)
+
+        eq_(self.get('another receipt'), 'ok')
+        eq_(self.decode_receipt.call_count, 2)
+
+    def test_refund(self):
+        eq_(self.get(), 'ok')
+        self.purchase.update(type=amo.CONTRIB_REFUND)
+        eq_(self.get(), 'refunded')
+        self.purchase.update(type=amo.CONTRIB_CHARGEBACK)
+        eq_(self.get(), 'refunded')
+        eq_(self.decode_receipt.call_count, 1)
+
+    def test_uninstalled(self):
+        eq_(self.get(), 'ok')
+        self.install.delete()
+        eq_(self.get(), 'invalid')
+
+    @mock.patch('services.verify.sign')
+    def test_expired_not_cached(self, sign):
+        sign.return_value = ''
+        self.user_data['exp'] = calendar.timegm(time.gmtime()) - 1000
+        eq_(self.get(), 'expired')
+        eq_(self.get(), 'expired')
+        eq_(self.decode_receipt.call_count, 2)
+
+    @mock.patch.object(utils.settings, 'SERVICES_VERIFY_CACHE_SIZE', 1)
+    def test_bounded(self):
+        self.get('one')
+        self.get('two')
+        self.get('two')
+        eq_(self.decode_receipt.call_count, 2)
+        self.get('one')
+        eq_(self.decode_receipt.call_count, 3)
+
+    @mock.patch.object(utils.settings, 'SIGNING_SERVER_ACTIVE', True)
+    @mock.patch('services.verify.receipts.certs.ReceiptVerifier')
+    def test_verifier_kept(self, ReceiptVerifier):
+        verify._verifier.__dict__.clear()
+        eq_(verify.get_verifier(), verify.get_verifier())
+        eq_(ReceiptVerifier.call_count, 1)
+
+
 class TestBase(amo.tests.TestCase):
 
     def create(self, data, request=None):
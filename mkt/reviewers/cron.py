@@ -0,0 +1,14 @@
+import commonware.log
+import cronjobs
+
+from .utils import reviewer_queues
+
+log = commonware.log.getLogger('z.cron')
+
+
+@cronjobs.register
+def mkt_queue_stats():
+    """Rebuild the counts of the reviewer queues from the queues themselves."""
+    snapshot = reviewer_queues.rebuild()
+    log.info('Reviewer queues: %s.' % ', '.join(
+        '%s %s' % (k, len(v)) for k, v in sorted(snapshot.items())))
@@ -2,9 +2,16 @@ from django.conf import settings
 from django.db import models
 
 import amo
+from addons.models import Persona
 from apps.addons.models import Addon
 from apps.editors.models import CannedResponse, EscalationQueue, RereviewQueue
+from files.models import File
+from reviews.models import Review, ReviewFlag
 from users.models import UserForeignKey
+from versions.models import Version
+
+from mkt.reviewers.utils import reviewer_queues
+from mkt.webapps.models import Webapp
 
 
 class AppCannedResponseManager(amo.models.ManagerBase):
@@ -38,3 +45,11 @@ def cleanup_queues(sender, instance, **kwargs):
 if settings.MARKETPLACE:
     models.signals.post_delete.connect(cleanup_queues, sender=Addon,
                                        dispatch_uid='queue-addon-cleanup')
+
+    # Keep the queue counts of the reviewer pages up to date.
+    for model in (Addon, Webapp):
+        reviewer_queues.watch(model, lambda addon: addon.id)
+    for model in (RereviewQueue, EscalationQueue, Version, Review, Persona):
+        reviewer_queues.watch(model)
+    reviewer_queues.watch(File, lambda file: file.version.addon_id)
+    reviewer_queues.watch(ReviewFlag, lambda flag: flag.review.addon_id)
@@ -1,7 +1,15 @@
 # -*- coding: utf8 -*-
+from nose.tools import eq_
+
+import amo
 import amo.tests
+from amo.tests import days_ago
+from editors.models import EscalationQueue, RereviewQueue
 
-from mkt.reviewers.utils import create_sort_link
+from mkt.reviewers.cron import mkt_queue_stats
+from mkt.reviewers.utils import create_sort_link, reviewer_queues
+from mkt.reviewers.views import PROGRESS_BUCKETS
+from mkt.webapps.models import Webapp
 
 
 class TestCreateSortLink(amo.tests.TestCase):
@@ -43,3 +51,43 @@ class TestCreateSortLink(amo.tests.TestCase):
         assert 'sort=name' in link
         assert 'order=asc' in link
         assert 'text_query=Feliz+A%C3%B1o' in link
+
+
+class TestReviewerQueues(amo.tests.TestCase):
+
+    def setUp(self):
+        self.app = amo.tests.app_factory(status=amo.STATUS_PENDING,
+                                         created=days_ago(6))
+
+    def test_counts(self):
+        eq_(reviewer_queues.counts()['pending'], 1)
+        with self.assertNumQueries(0):
+            eq_(reviewer_queues.counts()['pending'], 1)
+
+    def test_refreshed_on_save(self):
+        eq_(reviewer_queues.counts()['pending'], 1)
+        self.app.update(status=amo.STATUS_PUBLIC)
+        eq_(reviewer_queues.counts()['pending'], 0)
+        RereviewQueue.objects.create(addon=self.app)
+        eq_(reviewer_queues.counts()['rereview'], 1)
+
+    def test_escalation_moves_app(self):
+        eq_(reviewer_queues.counts()['pending'], 1)
+        EscalationQueue.objects.create(addon=self.app)
+        counts = reviewer_queues.counts()
+        eq_(counts['pending'], 0)
+        eq_(counts['escalated'], 1)
+
+    def test_stale_until_rebuilt(self):
+        eq_(reviewer_queues.counts()['pending'], 1)
+        Webapp.objects.filter(id=self.app.id).update(
+            status=amo.STATUS_PUBLIC)
+        eq_(reviewer_queues.counts()['pending'], 1)
+        mkt_queue_stats()
+        eq_(reviewer_queues.counts()['pending'], 0)
+
+    def test_progress(self):
+        amo.tests.app_factory(status=amo.STATUS_PENDING, created=days_ago(1))
+        amo.tests.app_factory(status=amo.STATUS_PENDING, created=days_ago(12))
+        progress = reviewer_queues.progress(['pending'], PROGRESS_BUCKETS)
+        eq_(progress['pending'], {'new': 1, 'med': 1, 'old': 1, 'week': 2})
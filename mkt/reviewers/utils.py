@@ -13,13 +13,16 @@ from tower import ugettext_lazy as _lazy
 
 import amo
 from access import acl
+from addons.models import Persona
 from amo.helpers import absolutify
 from amo.urlresolvers import reverse
 from amo.utils import JSONEncoder, send_mail_jinja, to_language
 from comm.models import (CommunicationNote, CommunicationThread,
                          CommunicationThreadCC, CommunicationThreadToken)
 from editors.models import EscalationQueue, RereviewQueue, ReviewerScore
+from editors.queue_stats import QueueStats, queryset_members
 from files.models import File
+from reviews.models import Review
 
 from mkt.constants import comm
 from mkt.constants.features import FeatureProfile
@@ -614,3 +617,40 @@ def device_queue_search(request):
         ))
     return Webapp.version_and_file_transformer(
         Webapp.objects.filter(**filters))
+
+
+_escalated = EscalationQueue.uncached.values_list('addon', flat=True)
+
+# The counts and ages of the queues of the reviewer tools.
+reviewer_queues = QueueStats('reviewers', {
+    'pending': queryset_members(
+        Webapp.uncached.exclude(id__in=_escalated)
+                       .filter(type=amo.ADDON_WEBAPP, disabled_by_user=False,
+                               status=amo.STATUS_PENDING),
+        'id'),
+    'rereview': queryset_members(
+        RereviewQueue.uncached.exclude(addon__in=_escalated)
+                              .filter(addon__disabled_by_user=False),
+        'addon'),
+    # This will work as long as we disable files of existing unreviewed
+    # versions when a new version is uploaded.
+    'updates': queryset_members(
+        File.uncached.exclude(version__addon__id__in=_escalated)
+            .filter(version__addon__type=amo.ADDON_WEBAPP,
+                    version__addon__disabled_by_user=False,
+                    version__addon__is_packaged=True,
+                    version__addon__status__in=amo.WEBAPPS_APPROVED_STATUSES,
+                    version__deleted=False,
+                    status=amo.STATUS_PENDING),
+        'version__addon'),
+    'escalated': queryset_members(
+        EscalationQueue.uncached.filter(addon__disabled_by_user=False),
+        'addon'),
+    'moderated': queryset_members(
+        Review.uncached.filter(addon__type=amo.ADDON_WEBAPP,
+                               reviewflag__isnull=False, editorreview=True),
+        'addon'),
+    'themes': queryset_members(
+        Persona.objects.no_cache().filter(addon__status=amo.STATUS_PENDING),
+        'addon', since='addon__created'),
+})
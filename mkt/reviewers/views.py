@@ -23,7 +23,7 @@ import amo
 from abuse.models import AbuseReport
 from access import acl
 from addons.decorators import addon_view
-from addons.models import AddonDeviceType, Persona, Version
+from addons.models import AddonDeviceType, Version
 from amo import messages
 from amo.decorators import json_view, permission_required
 from amo.helpers import absolutify
@@ -46,7 +46,7 @@ from zadmin.models import set_config, unmemoized_get_config
 
 from mkt.reviewers.forms import DEFAULT_ACTION_VISIBILITY
 from mkt.reviewers.utils import (AppsReviewing, clean_sort_param,
-                                 device_queue_search)
+                                 device_queue_search, reviewer_queues)
 from mkt.search.forms import ApiSearchForm
 from mkt.site.helpers import product_as_dict
 from mkt.submit.forms import AppFeaturesForm
@@ -82,42 +82,7 @@ def home(request):
 
 
 def queue_counts(request):
-    excluded_ids = EscalationQueue.uncached.values_list('addon', flat=True)
-    public_statuses = amo.WEBAPPS_APPROVED_STATUSES
-
-    counts = {
-        'pending': Webapp.uncached
-                         .exclude(id__in=excluded_ids)
-                         .filter(type=amo.ADDON_WEBAPP,
-                                 disabled_by_user=False,
-                                 status=amo.STATUS_PENDING)
-                         .count(),
-        'rereview': RereviewQueue.uncached
-                                 .exclude(addon__in=excluded_ids)
-                                 .filter(addon__disabled_by_user=False)
-                                 .count(),
-        # This will work as long as we disable files of existing unreviewed
-        # versions when a new version is uploaded.
-        'updates': File.uncached
-                       .exclude(version__addon__id__in=excluded_ids)
-                       .filter(version__addon__type=amo.ADDON_WEBAPP,
-                               version__addon__disabled_by_user=False,
-                               version__addon__is_packaged=True,
-                               version__addon__status__in=public_statuses,
-                               version__deleted=False,
-                               status=amo.STATUS_PENDING)
-                       .count(),
-        'escalated': EscalationQueue.uncached
-                                    .filter(addon__disabled_by_user=False)
-                                    .count(),
-        'moderated': Review.uncached.filter(addon__type=amo.ADDON_WEBAPP,
-                                            reviewflag__isnull=False,
-                                            editorreview=True)
-                                    .count(),
-        'themes': Persona.objects.no_cache()
-                                 .filter(addon__status=amo.STATUS_PENDING)
-                                 .count(),
-    }
+    counts = reviewer_queues.counts()
 
     if waffle.switch_is_active('buchets') and 'pro' in request.GET:
         counts.update({'device': device_queue_search(request).count()})
@@ -131,46 +96,24 @@ def queue_counts(request):
     return rv
 
 
+# How long the apps of each bucket of the dashboard have been waiting.
+days = lambda n: datetime.timedelta(days=n)
+PROGRESS_BUCKETS = {
+    'new': lambda age: age < days(5),
+    'med': lambda age: days(5) <= age <= days(10),
+    'old': lambda age: age > days(10),
+    'week': lambda age: age <= days(7),
+}
+
+
 def _progress():
     """Returns unreviewed apps progress.
 
     Return the number of apps still unreviewed for a given period of time and
     the percentage.
     """
-
-    days_ago = lambda n: datetime.datetime.now() - datetime.timedelta(days=n)
-    excluded_ids = EscalationQueue.objects.values_list('addon', flat=True)
-    public_statuses = amo.WEBAPPS_APPROVED_STATUSES
-
-    base_queries = {
-        'pending': Webapp.objects
-                         .exclude(id__in=excluded_ids)
-                         .filter(status=amo.STATUS_PENDING,
-                                 disabled_by_user=False),
-        'rereview': RereviewQueue.objects
-                                 .exclude(addon__in=excluded_ids)
-                                 .filter(addon__disabled_by_user=False),
-        'escalated': EscalationQueue.objects
-                                    .filter(addon__disabled_by_user=False),
-        'updates': File.objects
-                       .exclude(version__addon__id__in=excluded_ids)
-                       .filter(version__addon__type=amo.ADDON_WEBAPP,
-                               version__addon__disabled_by_user=False,
-                               version__addon__is_packaged=True,
-                               version__addon__status__in=public_statuses,
-                               status=amo.STATUS_PENDING)
-    }
-
-    types = base_queries.keys()
-    progress = {}
-    for t in types:
-        progress[t] = {
-            'new': base_queries[t].filter(created__gt=days_ago(5)).count(),
-            'med': base_queries[t].filter(
-                created__range=(days_ago(10), days_ago(5))).count(),
-            'old': base_queries[t].filter(created__lt=days_ago(10)).count(),
-            'week': base_queries[t].filter(created__gte=days_ago(7)).count(),
-        }
+    types = ['pending', 'rereview', 'escalated', 'updates']
+    progress = reviewer_queues.progress(types, PROGRESS_BUCKETS)
 
     # Return the percent of (p)rogress out of (t)otal.
     pct = lambda p, t: (p / float(t)) * 100 if p > 0 else 0
@@ -231,6 +231,11 @@ MINIFY_MOZMARKET = True
 GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'worldwide'
 GEOIP_DEFAULT_TIMEOUT = .2
+# A local database of IP ranges, see lib/geoip/database.py. It is used before
+# the GeoIP server, which stays as a fallback for what it doesn't have.
+GEOIP_DATABASE = ''
+# Number of lookups each process remembers.
+GEOIP_CACHE_SIZE = 10000
 
 SENTRY_DSN = None
 
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import collections
 import datetime
 import json
 import os
@@ -26,9 +27,9 @@ import amo
 import amo.models
 from access.acl import action_allowed, check_reviewer
 from addons import query
-from addons.models import (Addon, AddonDeviceType, attach_categories,
-                           attach_devices, attach_prices, attach_translations,
-                           Category)
+from addons.models import (Addon, AddonDeviceType, AddonUpsell, AddonUser,
+                           attach_categories, attach_devices, attach_prices,
+                           attach_translations, Category, Preview)
 from addons.signals import version_changed
 from amo.decorators import skip_cache
 from amo.helpers import absolutify
@@ -39,9 +40,9 @@ from constants.applications import DEVICE_TYPES
 from files.models import File, nfd_str, Platform
 from files.utils import parse_addon, WebAppParser
 from lib.crypto import packaged
-from market.models import AddonPremium
-from stats.models import ClientData
+from market.models import AddonPremium, invalidate_receipt_checks
 from translations.fields import save_signal
+from users.models import UserProfile
 from versions.models import Version
 
 import mkt
@@ -197,8 +198,8 @@ class Webapp(Addon):
         transforms = (attach_categories, attach_devices, attach_prices,
                       attach_translations)
         for t in transforms:
-            qs = apps.transform(t)
-        return qs
+            apps = apps.transform(t)
+        return apps
 
     def get_api_url(self, action=None, api=None, resource=None, pk=False):
         """Reverse a URL for the API."""
@@ -1093,12 +1094,112 @@ class WebappIndexer(MappingType, Indexable):
         """Extracts the ElasticSearch index document for this instance."""
         if obj is None:
             obj = cls.get_model().uncached.get(pk=pk)
+        return cls.extract_documents([pk], [obj])[0]
+
+    @classmethod
+    def extract_documents(cls, ids, objs=None):
+        """
+        Extracts the ElasticSearch index documents for the apps in `ids`, or
+        for `objs` if given, fetching each related table once for all apps.
+        """
+        if objs is None:
+            objs = Webapp.indexing_transformer(
+                Webapp.uncached.filter(id__in=ids))
+        objs = list(objs)
+        related = cls._prefetch(objs)
+        return [cls._build_document(obj, related) for obj in objs]
+
+    @classmethod
+    def _prefetch(cls, apps):
+        """
+        Returns everything `_build_document` needs for `apps` besides the
+        app itself, with one query per related table. Also attaches the
+        current and latest versions to the apps.
+        """
+        from editors.models import EscalationQueue
+
+        ids = [app.id for app in apps]
+        related = dict(
+            (name, collections.defaultdict(list)) for name in
+            ('categories', 'content_ratings', 'exclusions', 'owners',
+             'previews', 'versions'))
+
+        # Versions come with their files from `Version.transformer`.
+        versions = {}
+        for version in Version.objects.no_cache().filter(addon__in=ids):
+            versions[version.id] = version
+            related['versions'][version.addon_id].append(version)
+        for app in apps:
+            for field in ('_current_version', 'latest_version'):
+                version = versions.get(getattr(app, field + '_id'))
+                if version:
+                    version.addon = app
+                    setattr(app, field, version)
+
+        # Used by `Version.developer_name` when the manifest has none.
+        authors = collections.defaultdict(list)
+        for user in (UserProfile.objects.no_cache()
+                     .filter(addons__in=ids, addonuser__listed=True)
+                     .extra(select={'addon_id': 'addons_users.addon_id',
+                                    'position': 'addons_users.position'})
+                     .order_by('position')):
+            authors[user.addon_id].append(user)
+        for app in apps:
+            app.listed_authors = authors[app.id]
+
+        related['features'] = dict(
+            (f.version_id, f) for f in AppFeatures.objects.no_cache()
+            .filter(version__in=versions.keys()))
+        related['escalated'] = set(
+            EscalationQueue.objects.no_cache().filter(addon__in=ids)
+            .values_list('addon', flat=True))
+
+        related['installs'], related['regions'] = Installed.popularity(ids)
+
+        for rating in ContentRating.objects.no_cache().filter(addon__in=ids):
+            related['content_ratings'][rating.addon_id].append(rating)
+        for addon, slug in (
+                Category.objects.no_cache()
+                .filter(addoncategory__addon__in=ids)
+                .values_list('addoncategory__addon', 'slug')):
+            related['categories'][addon].append(slug)
+        for addon, user in (
+                AddonUser.objects.no_cache()
+                .filter(addon__in=ids, role=amo.AUTHOR_ROLE_OWNER)
+                .values_list('addon', 'user')):
+            related['owners'][addon].append(user)
+        for preview in Preview.objects.no_cache().filter(addon__in=ids):
+            related['previews'][preview.addon_id].append(preview)
+        for addon, region in (AddonExcludedRegion.objects
+                              .filter(addon__in=ids)
+                              .values_list('addon', 'region')):
+            related['exclusions'][addon].append(region)
+        related['premiums'] = dict(
+            (p.addon_id, p) for p in AddonPremium.objects.no_cache()
+            .filter(addon__in=ids).select_related('price'))
+
+        upsells = {}
+        for upsell in AddonUpsell.objects.no_cache().filter(free__in=ids):
+            upsells.setdefault(upsell.free_id, upsell)
+        premiums = dict(
+            (a.id, a) for a in Addon.uncached.filter(
+                id__in=[u.premium_id for u in upsells.values()]))
+        for upsell in upsells.values():
+            if upsell.premium_id in premiums:
+                upsell.premium = premiums[upsell.premium_id]
+        related['upsells'] = upsells
+        return related
 
+    @classmethod
+    def _build_document(cls, obj, related):
         latest_version = obj.latest_version
         version = obj.current_version
-        features = (version.features.to_dict()
-                    if version else AppFeatures().to_dict())
-        is_escalated = obj.escalationqueue_set.exists()
+        if version:
+            features = related['features'].get(version.id) or version.features
+            features = features.to_dict()
+        else:
+            features = AppFeatures().to_dict()
+        is_escalated = obj.id in related['escalated']
 
         try:
             status = latest_version.statuses[0][1] if latest_version else None
@@ -1106,24 +1207,27 @@ class WebappIndexer(MappingType, Indexable):
             status = None
 
         translations = obj.translations
-        installed_ids = list(Installed.objects.filter(addon=obj)
-                             .values_list('id', flat=True))
+        installed_count = related['installs'][obj.id]
         content_ratings = dict(
             (cr.get_body().name, {
                 'name': cr.get_rating().name,
                 'description': unicode(cr.get_rating().description)})
-            for cr in obj.content_ratings.all())
+            for cr in related['content_ratings'][obj.id])
 
         attrs = ('app_slug', 'average_daily_users', 'bayesian_rating',
                  'created', 'id', 'is_disabled', 'last_updated',
-                 'premium_type', 'status', 'type', 'uses_flash',
-                 'weekly_downloads')
+                 'premium_type', 'status', 'type', 'weekly_downloads')
         d = dict(zip(attrs, attrgetter(*attrs)(obj)))
 
+        # Same as `obj.uses_flash`, without querying the files again.
+        files = sorted(version.all_files if version else [],
+                       key=attrgetter('created'), reverse=True)
+        d['uses_flash'] = files[0].uses_flash if files else False
+
         d['app_type'] = (amo.ADDON_WEBAPP_PACKAGED if obj.is_packaged else
                          amo.ADDON_WEBAPP_HOSTED)
         d['author'] = obj.developer_name
-        d['category'] = list(obj.categories.values_list('slug', flat=True))
+        d['category'] = related['categories'][obj.id]
         d['content_ratings'] = content_ratings if content_ratings else None
         d['current_version'] = version.version if version else None
         d['default_locale'] = obj.default_locale
@@ -1155,26 +1259,21 @@ class WebappIndexer(MappingType, Indexable):
         d['name'] = list(set(string for _, string
                              in translations[obj.name_id]))
         d['name_sort'] = unicode(obj.name).lower()
-        d['owners'] = [au.user.id for au in
-                       obj.addonuser_set.filter(role=amo.AUTHOR_ROLE_OWNER)]
-        d['popularity'] = d['_boost'] = len(installed_ids)
+        d['owners'] = related['owners'][obj.id]
+        d['popularity'] = d['_boost'] = installed_count
         d['previews'] = [{'filetype': p.filetype,
                           'caption': unicode(p.caption),
                           'image_url': p.image_url,
                           'thumbnail_url': p.thumbnail_url}
-                         for p in obj.previews.all()]
-        try:
-            p = obj.addonpremium.price
-            d['price_tier'] = p.name
-        except AddonPremium.DoesNotExist:
-            d['price_tier'] = None
+                         for p in related['previews'][obj.id]]
+        premium = related['premiums'].get(obj.id)
+        d['price_tier'] = premium.price.name if premium else None
 
         d['ratings'] = {
             'average': obj.average_rating,
             'count': obj.total_reviews,
         }
-        d['region_exclusions'] = list(
-            obj.addonexcludedregion.values_list('region', flat=True))
+        d['region_exclusions'] = related['exclusions'][obj.id]
         d['support_email'] = (unicode(obj.support_email)
                               if obj.support_email else None)
         d['support_url'] = (unicode(obj.support_url)
@@ -1185,8 +1284,9 @@ class WebappIndexer(MappingType, Indexable):
         else:
             d['supported_locales'] = []
 
-        if obj.upsell:
-            upsell_obj = obj.upsell.premium
+        upsell = related['upsells'].get(obj.id)
+        if upsell:
+            upsell_obj = upsell.premium
             d['upsell'] = {
                 'id': upsell_obj.id,
                 'app_slug': upsell_obj.app_slug,
@@ -1197,20 +1297,18 @@ class WebappIndexer(MappingType, Indexable):
 
         d['versions'] = [dict(version=v.version,
                               resource_uri=reverse_version(v))
-                         for v in obj.versions.all()]
+                         for v in related['versions'][obj.id]]
 
         # Calculate regional popularity for "mature regions"
         # (installs + reviews/installs from that region).
-        installs = dict(ClientData.objects.filter(installed__in=installed_ids)
-                        .annotate(region_counts=models.Count('region'))
-                        .values_list('region', 'region_counts').distinct())
+        installs = related['regions'].get(obj.id, {})
         for region in mkt.regions.ALL_REGION_IDS:
             cnt = installs.get(region, 0)
             if cnt:
                 # Magic number (like all other scores up in this piece).
                 d['popularity_%s' % region] = d['popularity'] + cnt * 10
             else:
-                d['popularity_%s' % region] = len(installed_ids)
+                d['popularity_%s' % region] = installed_count
             d['_boost'] += cnt * 10
 
         # Bump the boost if the add-on is public.
@@ -1345,6 +1443,26 @@ class Installed(amo.models.ModelBase):
         db_table = 'users_install'
         unique_together = ('addon', 'user', 'install_type', 'client_data')
 
+    @classmethod
+    def popularity(cls, ids):
+        """
+        Returns the number of installs of each app in `ids`, and for each app
+        a {region: count} dict of the installs sharing the same client data,
+        which is what the regional popularity is computed from.
+        """
+        installs = collections.Counter()
+        clients = collections.defaultdict(dict)
+        for addon, client, region in (
+                cls.objects.filter(addon__in=ids)
+                .values_list('addon', 'client_data', 'client_data__region')):
+            installs[addon] += 1
+            if client is not None:
+                count = clients[addon].get(client, (region, 0))[1]
+                clients[addon][client] = (region, count + (region is not None))
+        regions = dict((addon, dict(v for k, v in sorted(cs.items())))
+                       for addon, cs in clients.items())
+        return installs, regions
+
 
 @receiver(models.signals.post_save, sender=Installed)
 def add_uuid(sender, **kw):
@@ -1356,6 +1474,13 @@ def add_uuid(sender, **kw):
             install.save()
 
 
+models.signals.post_save.connect(invalidate_receipt_checks, sender=Installed,
+                                 dispatch_uid='installed_receipts')
+models.signals.post_delete.connect(invalidate_receipt_checks,
+                                   sender=Installed,
+                                   dispatch_uid='installed_receipts')
+
+
 class AddonExcludedRegion(amo.models.ModelBase):
     """
     Apps are listed in all regions by default.
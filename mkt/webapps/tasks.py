@@ -26,6 +26,7 @@ from editors.models import RereviewQueue
 from files.models import FileUpload
 from files.utils import WebAppParser
 from lib.es.utils import get_indices
+from search import suggestions
 from translations.models import delete_translation, Translation
 from users.utils import get_task_user
 
@@ -257,17 +258,19 @@ def update_supported_locales(ids, **kw):
 def index_webapps(ids, **kw):
     task_log.info('Indexing apps %s-%s. [%s]' % (ids[0], ids[-1], len(ids)))
 
+    # A new index is being built, the suggestions are rebuilt by their cron.
+    reindexing = 'index' in kw
     index = kw.pop('index', WebappIndexer.get_index())
     # Note: If reindexing is currently occurring, `get_indices` will return
     # more than one index.
     indices = get_indices(index)
 
     es = WebappIndexer.get_es(urls=settings.ES_URLS)
-    qs = Webapp.indexing_transformer(Webapp.uncached.filter(id__in=ids))
-    for obj in qs:
-        doc = WebappIndexer.extract_document(obj.id, obj)
+    for doc in WebappIndexer.extract_documents(ids):
         for idx in indices:
-            WebappIndexer.index(doc, id_=obj.id, es=es, index=idx)
+            WebappIndexer.index(doc, id_=doc['id'], es=es, index=idx)
+    if not reindexing:
+        suggestions.update(ids)
 
 
 @task(acks_late=True)
@@ -289,6 +292,7 @@ def unindex_webapps(ids, **kw):
                 # Ignore if it's not there.
                 task_log.info(
                     u'[Webapp:%s] Unindexing app but not found in index' % id_)
+    suggestions.remove(ids)
 
 
 @task
@@ -11,6 +11,7 @@ from datetime import datetime, timedelta
 from django.conf import settings
 from django.core import mail
 from django.core.files.storage import default_storage as storage
+from django.db import connection
 from django.db.models.signals import post_delete, post_save
 from django.utils.translation import ugettext_lazy as _
 
@@ -20,8 +21,9 @@ from nose import SkipTest
 from nose.tools import eq_, ok_, raises
 
 import amo
-from addons.models import (Addon, AddonCategory, AddonDeviceType,
-                           BlacklistedSlug, Category, Preview, version_changed)
+from addons.models import (Addon, AddonCategory, AddonDeviceType, AddonUpsell,
+                           AddonUser, BlacklistedSlug, Category, Preview,
+                           version_changed)
 from addons.signals import version_changed as version_changed_signal
 from amo.helpers import absolutify
 from amo.tests import app_factory, version_factory
@@ -33,6 +35,8 @@ from files.tests.test_models import UploadTest as BaseUploadTest
 from files.utils import WebAppParser
 from lib.crypto import packaged
 from lib.crypto.tests import mock_sign
+from market.models import AddonPremium, Price
+from stats.models import ClientData
 from users.models import UserProfile
 from versions.models import update_status, Version
 
@@ -41,8 +45,8 @@ from mkt.constants import APP_FEATURES, apps
 from mkt.site.fixtures import fixture
 from mkt.submit.tests.test_views import BasePackagedAppTest, BaseWebAppTest
 from mkt.webapps.models import (AddonExcludedRegion, AppFeatures, AppManifest,
-                                get_excluded_in, Installed, Webapp,
-                                WebappIndexer)
+                                ContentRating, get_excluded_in, Installed,
+                                Webapp, WebappIndexer)
 
 
 class TestWebapp(amo.tests.TestCase):
@@ -1159,7 +1163,7 @@ class TestAppFeatures(amo.tests.TestCase):
 
 
 class TestWebappIndexer(amo.tests.TestCase):
-    fixtures = fixture('webapp_337141')
+    fixtures = fixture('user_999', 'webapp_337141')
 
     def setUp(self):
         self.app = Webapp.objects.get(pk=337141)
@@ -1261,6 +1265,86 @@ class TestWebappIndexer(amo.tests.TestCase):
         obj, doc = self._get_doc()
         eq_(doc['is_escalated'], True)
 
+    def _add_related(self, app, user):
+        cat = Category.objects.create(name='c', slug='c-%s' % app.id,
+                                      type=amo.ADDON_WEBAPP)
+        AddonCategory.objects.create(addon=app, category=cat)
+        AddonDeviceType.objects.create(addon=app,
+                                       device_type=DEVICE_TYPES.keys()[0])
+        AddonExcludedRegion.objects.create(addon=app, region=mkt.regions.BR.id)
+        AddonUser.objects.create(addon=app, user=user)
+        Preview.objects.create(addon=app, caption='Preview %s' % app.id)
+        rb = mkt.regions.BR.ratingsbodies[0]
+        ContentRating.objects.create(addon=app, ratings_body=rb.id,
+                                     rating=rb.ratings[0].id)
+        EscalationQueue.objects.create(addon=app)
+        client = ClientData.objects.create(region=mkt.regions.BR.id,
+                                           is_chromeless=False)
+        Installed.objects.create(addon=app, user=user, client_data=client)
+        price = Price.objects.create(name='1', price='0.99')
+        AddonPremium.objects.create(addon=app, price=price)
+        AddonUpsell.objects.create(free=app, premium=app_factory())
+
+    def _count_queries(self, func):
+        # What `assertNumQueries` does, but returning the count.
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            func()
+        finally:
+            connection.use_debug_cursor = False
+        return len(connection.queries) - start
+
+    def test_extract_documents(self):
+        user = UserProfile.objects.get(pk=999)
+        webapps = [self.app, app_factory(), app_factory()]
+        for app in webapps:
+            self._add_related(app, user)
+
+        flash = webapps[1]
+        File.objects.filter(version__addon=flash).update(uses_flash=True)
+
+        docs = WebappIndexer.extract_documents([a.id for a in webapps])
+        docs = dict((doc['id'], doc) for doc in docs)
+        eq_(len(docs), 3)
+        for app in webapps:
+            doc = docs[app.id]
+            eq_(doc['category'], ['c-%s' % app.id])
+            eq_(sorted(doc['owners']), sorted(
+                AddonUser.objects.filter(addon=app, role=amo.AUTHOR_ROLE_OWNER)
+                .values_list('user', flat=True)))
+            assert user.id in doc['owners']
+            eq_(doc['device'], [DEVICE_TYPES.keys()[0]])
+            eq_(doc['uses_flash'], app == flash)
+            eq_(doc['region_exclusions'], [mkt.regions.BR.id])
+            # One install, from Brazil.
+            eq_(doc['popularity'], 1)
+            eq_(doc['popularity_%s' % mkt.regions.BR.id], 11)
+            eq_(doc['popularity_%s' % mkt.regions.US.id], 1)
+            boost = 11 * 4 if app.status == amo.STATUS_PUBLIC else 11
+            eq_(doc['_boost'], boost)
+            eq_(doc['price_tier'], '1')
+            premium = AddonUpsell.objects.get(free=app).premium
+            eq_(doc['upsell'], {'id': premium.id,
+                                'app_slug': premium.app_slug,
+                                'icon_url': premium.get_icon_url(128),
+                                'name': unicode(premium.name)})
+            eq_(len(doc['previews']), 1)
+            eq_(doc['previews'][0]['caption'], 'Preview %s' % app.id)
+            eq_(doc['is_escalated'], True)
+
+    def test_extract_documents_num_queries(self):
+        user = UserProfile.objects.get(pk=999)
+        webapps = [self.app, app_factory(), app_factory()]
+        for app in webapps:
+            self._add_related(app, user)
+
+        one = self._count_queries(
+            lambda: WebappIndexer.extract_documents([webapps[0].id]))
+        many = self._count_queries(
+            lambda: WebappIndexer.extract_documents([a.id for a in webapps]))
+        eq_(one, many)
+
 
 class TestManifestUpload(BaseUploadTest, amo.tests.TestCase):
     fixtures = fixture('webapp_337141')
@@ -6,6 +6,10 @@ HOME=/tmp
 * * * * * %(z_cron)s fast_current_version
 * * * * * %(z_cron)s migrate_collection_users
 
+# Every 10 minutes.
+*/10 * * * * %(z_cron)s editor_queue_stats
+*/10 * * * * %(z_cron)s mkt_queue_stats --settings=settings_local_mkt
+
 # Every 30 minutes.
 */30 * * * * %(z_cron)s tag_jetpacks
 */30 * * * * %(z_cron)s update_addons_current_version
@@ -18,6 +22,9 @@ HOME=/tmp
 45 * * * * %(z_cron)s update_addon_appsupport
 50 * * * * %(z_cron)s cleanup_extracted_file
 55 * * * * %(z_cron)s unhide_disabled_files
+58 * * * * %(z_cron)s blocklist_snapshots
+15 * * * * %(z_cron)s build_suggestions
+15 * * * * %(z_cron)s build_suggestions --settings=settings_local_mkt
 
 
 #every 3 hours
@@ -39,6 +46,7 @@ HOME=/tmp
 #once per day
 05 0 * * * %(z_cron)s email_daily_ratings --settings=settings_local_mkt
 30 1 * * * %(z_cron)s update_user_ratings
+35 1 * * * %(z_cron)s review_aggregates
 40 1 * * * %(z_cron)s update_weekly_downloads
 50 1 * * * %(z_cron)s gc
 45 1 * * * %(z_cron)s mkt_gc --settings=settings_local_mkt
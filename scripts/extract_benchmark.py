@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Compare the bytes written and the time taken to extract add-ons with their
+nested archives, as the file viewer does, by extract_xpi and by the previous
+extract, walk and copy passes.
+
+The bytes written are those the process handed to write(), from /proc/self/io,
+so this needs Linux. Without paths it extracts the jetpack and the langpack
+of the fixtures:
+
+$ python scripts/extract_benchmark.py
+$ python scripts/extract_benchmark.py --repeat 5 big-jetpack.xpi langpack.xpi
+"""
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import manage  # noqa, sets up the paths and the settings.
+
+from files.utils import copy_over, extract_xpi, extract_zip
+
+FIXTURES = os.path.join(ROOT, 'apps', 'files', 'fixtures', 'files')
+
+
+def passes(xpi, path):
+    """The extraction of extract_xpi(xpi, path, expand=True) before."""
+    tempdir = extract_zip(xpi)
+    for x in xrange(0, 10):
+        flag = False
+        for root, dirs, files in os.walk(tempdir):
+            for name in files:
+                if os.path.splitext(name)[1] in ['.jar', '.xpi']:
+                    src = os.path.join(root, name)
+                    if not os.path.isdir(src):
+                        dest = extract_zip(src, remove=True, fatal=False)
+                        if dest:
+                            copy_over(dest, src)
+                            flag = True
+        if not flag:
+            break
+    copy_over(tempdir, path)
+
+
+def single(xpi, path):
+    extract_xpi(xpi, path, expand=True)
+
+
+def written():
+    with open('/proc/self/io') as f:
+        for line in f:
+            key, value = line.split(':')
+            if key == 'wchar':
+                return int(value)
+
+
+def size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name))
+                     for name in files)
+    return total
+
+
+def measure(func, xpi, repeat):
+    """Return the bytes written, seconds and size of the extracted tree."""
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'extracted')
+        start, wrote = time.time(), written()
+        for i in xrange(repeat):
+            func(xpi, path)
+        seconds, wrote = time.time() - start, written() - wrote
+        return wrote / repeat, seconds / repeat, size(path)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [xpi ...]')
+    parser.add_option('--repeat', type='int', default=3)
+    opts, args = parser.parse_args()
+    if not os.path.exists('/proc/self/io'):
+        parser.error('/proc/self/io is needed to count the bytes written.')
+
+    xpis = args or [os.path.join(FIXTURES, name)
+                    for name in ('jetpack.xpi', 'langpack.xpi')]
+    print '%-24s %10s %12s %12s %9s' % ('', 'tree', 'passes', 'single',
+                                        'time')
+    for xpi in xpis:
+        old_bytes, old_time, old_size = measure(passes, xpi, opts.repeat)
+        new_bytes, new_time, new_size = measure(single, xpi, opts.repeat)
+        if old_size != new_size:
+            print '%s: the trees differ, %s and %s bytes.' % (
+                xpi, old_size, new_size)
+        print '%-24s %10s %12s %12s %8.1fx' % (
+            os.path.basename(xpi)[-24:], new_size, old_bytes, new_bytes,
+            old_time / max(new_time, 1e-6))
+    print
+    print 'tree: bytes extracted, passes/single: bytes written per run.'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Compare the latency of a GeoIP lookup in the local range database with a
+request to geodude.
+
+Without --url the requests go to a dummy server on localhost, which is the
+best geodude could ever do:
+
+$ python scripts/geoip_benchmark.py --lookups 2000
+$ python scripts/geoip_benchmark.py --url http://geodude.example.com
+"""
+import BaseHTTPServer
+import optparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib',
+                                'geoip'))
+
+import database
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = '{"country_code": "US", "country_name": "United States"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def dummy_server():
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%s' % server.server_port
+
+
+def make_ranges(count, rand):
+    starts = sorted(rand.sample(xrange(1, 2 ** 32, 256), count))
+    ends = [s - 1 for s in starts[1:]] + [2 ** 32 - 1]
+    countries = ['us', 'fr', 'de', 'br', 'pl', 'es', 'co', 've']
+    return [(s, e, rand.choice(countries)) for s, e in zip(starts, ends)]
+
+
+def timed(func, addresses):
+    times = []
+    for address in addresses:
+        start = time.time()
+        func(address)
+        times.append(time.time() - start)
+    times.sort()
+    return (sum(times) / len(times) * 1e6, times[len(times) / 2] * 1e6,
+            times[int(len(times) * .99)] * 1e6)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--ranges', type='int', default=200000)
+    parser.add_option('--lookups', type='int', default=1000)
+    parser.add_option('--url', default='')
+    parser.add_option('--seed', type='int', default=0)
+    opts, args = parser.parse_args()
+
+    rand = random.Random(opts.seed)
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'geoip.db')
+        database.write_database(make_ranges(opts.ranges, rand), path)
+        db = database.RangeDatabase(path)
+        addresses = ['.'.join(str(rand.randint(0, 255)) for _ in range(4))
+                     for _ in xrange(opts.lookups)]
+
+        url = opts.url or dummy_server()
+        session = requests.Session()
+        print '%s ranges, %s lookups, geodude at %s' % (
+            len(db), len(addresses), url)
+        print '%-8s %10s %10s %10s' % ('', 'mean us', 'median us', 'p99 us')
+        local = timed(lambda a: db.find(database.ip_to_int(a)), addresses)
+        print '%-8s %10.1f %10.1f %10.1f' % (('local',) + local)
+        http = timed(lambda a: session.post('%s/country.json' % url,
+                                            data={'ip': a}, timeout=1),
+                     addresses)
+        print '%-8s %10.1f %10.1f %10.1f' % (('http',) + http)
+        print 'local is %.0fx faster on average' % (http[0] / local[0])
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Compare the speed of the pairwise recommendations (what the recs cron used to
+do) with the inverted index in lib/recommend, on random collections.
+
+Build lib/recommend/_recommend.c first to compare against the C extension:
+
+$ cd lib/recommend && python setup.py build_ext --inplace && cd -
+$ python scripts/recs_benchmark.py --addons 5000
+"""
+import array
+import operator
+import optparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib'))
+
+import recommend
+
+
+def make_addons(count, collections, seed):
+    rand = random.Random(seed)
+    addons = {}
+    for addon in xrange(count):
+        size = int(rand.paretovariate(1.5)) + 3
+        cs = set(rand.randint(0, collections) for _ in xrange(size))
+        addons[addon] = array.array('l', sorted(cs))
+    return addons
+
+
+def pairwise(addons, size):
+    sim = recommend.similarity
+    for addon, collections in addons.iteritems():
+        xs = [(other, sim(collections, cs))
+              for other, cs in addons.iteritems()]
+        others = sorted(xs, key=operator.itemgetter(1), reverse=True)
+        yield addon, others[:size]
+
+
+def indexed(addons, size):
+    index, by_size = recommend.build_index(addons)
+    return recommend.top_similar(addons, index, by_size, size=size)
+
+
+def timed(func, addons, size):
+    start = time.time()
+    results = dict(func(addons, size))
+    return time.time() - start, results
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--addons', type='int', default=5000)
+    parser.add_option('--collections', type='int', default=50000)
+    parser.add_option('--seed', type='int', default=0)
+    opts, args = parser.parse_args()
+
+    addons = make_addons(opts.addons, opts.collections, opts.seed)
+    c_ext = not hasattr(recommend.similarity, 'func_code')
+    print '%s add-ons, %s collections, C extension: %s' % (
+        len(addons), opts.collections, c_ext)
+
+    old, old_results = timed(pairwise, addons, 11)
+    print 'pairwise: %.2fs' % old
+    new, new_results = timed(indexed, addons, 11)
+    print 'indexed:  %.2fs (%.1fx)' % (new, old / new)
+
+    for addon, others in old_results.iteritems():
+        if [s for _, s in others] != [s for _, s in new_results[addon]]:
+            print 'Scores differ for add-on %s' % addon
+            sys.exit(1)
+    print 'Scores match.'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+import threading
+from time import time
+
+from django.core.cache import cache
+
+import commonware.log
+
+from constants import applications, base
+from constants.platforms import PLATFORM_ALL
+
+
+try:
+    from compare import version_int
+except ImportError:
+    from apps.versions.compare import version_int
+
+
+log = commonware.log.getLogger('z.services')
+
+STATUSES_PUBLIC = (base.STATUS_PUBLIC, base.STATUS_LITE,
+                   base.STATUS_LITE_AND_NOMINATED)
+
+# Columns returned for each candidate in the index, in the same order as the
+# row built by `Update.get_update` from the SQL query.
+ROW_FIELDS = [
+    'guid', 'type', 'disabled_by_user', 'appguid', 'min', 'max', 'file_id',
+    'file_status', 'hash', 'filename', 'version_id', 'datestatuschanged',
+    'strict_compat', 'releasenotes', 'version', 'premium_type']
+
+addons_sql = """
+    SELECT id, guid, status, addontype_id, inactive, premium_type
+    FROM addons
+    WHERE status != %(STATUS_DELETED)s %(filter)s"""
+
+candidates_sql = """
+    SELECT
+        versions.addon_id, applications.id, applications.guid,
+        appmin.version, appmin.version_int,
+        appmax.version, appmax.version_int,
+        files.id, files.status, files.hash, files.filename,
+        files.datestatuschanged, files.strict_compatibility,
+        files.binary_components, files.platform_id,
+        versions.id, versions.releasenotes, versions.version
+    FROM versions
+    INNER JOIN applications_versions
+        ON applications_versions.version_id = versions.id
+    INNER JOIN applications
+        ON applications_versions.application_id = applications.id
+    INNER JOIN appversions appmin
+        ON appmin.id = applications_versions.min
+    INNER JOIN appversions appmax
+        ON appmax.id = applications_versions.max
+    INNER JOIN files
+        ON files.version_id = versions.id
+    %(filter)s"""
+
+statuses_sql = """
+    SELECT versions.addon_id, versions.version, files.status
+    FROM files INNER JOIN versions
+    ON files.version_id = versions.id
+    %(filter)s
+    ORDER BY files.id"""
+
+overrides_sql = """
+    SELECT
+        incompatible_versions.version_id, incompatible_versions.app_id,
+        incompatible_versions.min_app_version,
+        incompatible_versions.max_app_version,
+        incompatible_versions.min_app_version_int,
+        incompatible_versions.max_app_version_int
+    FROM incompatible_versions
+    INNER JOIN versions ON versions.id = incompatible_versions.version_id
+    %(filter)s"""
+
+# The add-ons changed by zamboni are logged in the cache for `refresh`: every
+# change takes the next number of CHANGED_NEXT, is stored under CHANGED_KEY and
+# is then published by incrementing CHANGED_SEQ, the number of changes written.
+CHANGED_NEXT = 'compat-index:next'
+CHANGED_SEQ = 'compat-index:seq'
+CHANGED_KEY = 'compat-index:changed:%s'
+CHANGED_TIMEOUT = 60 * 60 * 2
+# Past that many changes since the last refresh, a full load is cheaper.
+CHANGED_MAX = 1000
+
+
+def log_changed(ids):
+    """Record that the add-ons `ids` changed, for the indexes to reload."""
+    cache.add(CHANGED_SEQ, cache.get(CHANGED_NEXT) or 0, 0)
+    cache.add(CHANGED_NEXT, cache.get(CHANGED_SEQ) or 0, 0)
+    for id in ids:
+        cache.set(CHANGED_KEY % cache.incr(CHANGED_NEXT), id, CHANGED_TIMEOUT)
+        cache.incr(CHANGED_SEQ)
+
+
+def get_changed(since):
+    """
+    The ids of the add-ons changed after the change `since`, and the number
+    of the last change. The ids are None if some changes are missing, e.g.
+    evicted from the cache.
+    """
+    seq = cache.get(CHANGED_SEQ) or 0
+    if seq < since or seq - since > CHANGED_MAX:
+        return None, seq
+    keys = [CHANGED_KEY % i for i in xrange(since + 1, seq + 1)]
+    found = cache.get_many(keys) if keys else {}
+    ids = set()
+    for i, key in enumerate(keys):
+        if key not in found:
+            # Writers publish out of order, a change taken but not written
+            # yet is picked up by the next refresh.
+            if (cache.get(CHANGED_NEXT) or 0) > (cache.get(CHANGED_SEQ) or 0):
+                return ids, since + i
+            return None, seq
+        ids.add(found[key])
+    return ids, seq
+
+
+class CompatIndex(object):
+    """
+    An in-process copy of everything `Update` needs to answer an update ping,
+    so that lookups can be made without touching the database.
+
+    The index is keyed on guid and holds, per application, the list of
+    candidate (version, file) pairs ordered the same way the SQL query orders
+    them. It is filled with `load` and kept up to date with `refresh`, which
+    only reloads the add-ons that zamboni logged as changed with
+    `log_changed` since the last refresh. The full loads `refresh` needs are
+    made by `reload` in a thread, with a connection from `connect`, so that
+    they never hold up a request.
+    """
+
+    def __init__(self, interval=60, full_interval=3600, connect=None):
+        self.interval = interval
+        self.full_interval = full_interval
+        self.connect = connect
+        self.addons = {}
+        self.guids = {}
+        self.since = None
+        self.refreshed = 0
+        self.loaded = 0
+        self.loading = False
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.since is not None
+
+    def _filter(self, column, ids, where=True):
+        if ids is None:
+            return ''
+        ids = ','.join(str(int(i)) for i in ids) or 'NULL'
+        return '%s %s IN (%s)' % ('WHERE' if where else 'AND', column, ids)
+
+    def _fetch(self, cursor, ids=None, guids=None):
+        """
+        Build the index entries for `ids` or `guids`, or for every add-on if
+        neither is given.
+        """
+        entries = {}
+        if guids is not None:
+            filter = 'AND guid IN (%s)' % ','.join(['%s'] * len(guids))
+            cursor.execute(addons_sql % {
+                'STATUS_DELETED': base.STATUS_DELETED, 'filter': filter},
+                list(guids))
+        else:
+            cursor.execute(addons_sql % {
+                'STATUS_DELETED': base.STATUS_DELETED,
+                'filter': self._filter('id', ids, where=False)})
+        for (id, guid, status, type, inactive,
+             premium_type) in cursor.fetchall():
+            entries[id] = {
+                'id': id, 'guid': guid, 'status': status, 'type': type,
+                'inactive': inactive, 'premium_type': premium_type,
+                'statuses': {}, 'apps': {}}
+
+        if guids is not None:
+            ids = entries.keys()
+        if ids is not None and not ids:
+            return entries
+
+        overrides = {}
+        cursor.execute(overrides_sql %
+                       {'filter': self._filter('versions.addon_id', ids)})
+        for row in cursor.fetchall():
+            overrides.setdefault(row[0], []).append(row[1:])
+
+        cursor.execute(statuses_sql %
+                       {'filter': self._filter('versions.addon_id', ids)})
+        for addon_id, version, status in cursor.fetchall():
+            if addon_id in entries:
+                entries[addon_id]['statuses'].setdefault(version, status)
+
+        cursor.execute(candidates_sql %
+                       {'filter': self._filter('versions.addon_id', ids)})
+        for (addon_id, app_id, appguid, min, min_int, max, max_int, file_id,
+             file_status, hash, filename, datestatuschanged, strict_compat,
+             binary_components, platform_id, version_id, releasenotes,
+             version) in cursor.fetchall():
+            entry = entries.get(addon_id)
+            if entry is None:
+                continue
+            entry['apps'].setdefault(app_id, []).append({
+                'appguid': appguid, 'min': min, 'min_int': min_int,
+                'max': max, 'max_int': max_int, 'file_id': file_id,
+                'file_status': file_status, 'hash': hash,
+                'filename': filename, 'datestatuschanged': datestatuschanged,
+                'strict_compat': strict_compat,
+                'binary_components': binary_components,
+                'platform_id': platform_id, 'version_id': version_id,
+                'releasenotes': releasenotes, 'version': version,
+                'overrides': overrides.get(version_id, [])})
+
+        for entry in entries.values():
+            for candidates in entry['apps'].values():
+                candidates.sort(key=lambda c: (-c['version_id'], c['file_id']))
+        return entries
+
+    def load(self, cursor):
+        """Replace the whole index with a fresh copy from the database."""
+        # Read first, so the changes made during the load are reloaded.
+        since = cache.get(CHANGED_SEQ) or 0
+        entries = self._fetch(cursor)
+        with self.lock:
+            self.guids = dict((e['guid'], e) for e in entries.values())
+            self.addons = entries
+            self.since = since
+            self.refreshed = self.loaded = time()
+
+    def reload(self):
+        """
+        Start a full load in a thread, unless one is running already or there
+        is no `connect` to load with.
+        """
+        if self.connect is None or self.loading:
+            return
+        self.loading = True
+        thread = threading.Thread(target=self._reload)
+        thread.daemon = True
+        thread.start()
+
+    def _reload(self):
+        try:
+            conn = self.connect()
+            try:
+                self.load(conn.cursor())
+            finally:
+                conn.close()
+        except Exception:
+            log.exception('Could not load the compat index.')
+        finally:
+            self.loading = False
+
+    def load_guids(self, cursor, guids):
+        """
+        Fill the index with only the add-ons matching `guids`. Such an index
+        is not refreshed, it is meant to answer a batch of lookups at once.
+        """
+        entries = self._fetch(cursor, guids=guids) if guids else {}
+        self.guids = dict((e['guid'], e) for e in entries.values())
+        self.addons = entries
+
+    def refresh(self, cursor, force=False):
+        """
+        Reload the add-ons that changed since the last refresh. A full load is
+        started with `reload` on first use and every `full_interval` seconds,
+        to pick up what was changed outside of zamboni's models. If the log of
+        changes is incomplete the index is not `ready` until that load is
+        done. Returns False if another thread is already refreshing.
+        """
+        now = time()
+        if not force and now - self.refreshed < self.interval:
+            return True
+        if not self.lock.acquire(False):
+            return False
+        try:
+            if now - self.loaded >= self.full_interval:
+                self.reload()
+            if not self.ready:
+                return True
+            ids, since = get_changed(self.since)
+            if ids is None:
+                self.since = None
+                self.reload()
+                return True
+
+            if ids:
+                entries = self._fetch(cursor, ids)
+                for id in ids:
+                    old = self.addons.pop(id, None)
+                    if old is not None:
+                        self.guids.pop(old['guid'], None)
+                    if id in entries:
+                        self.addons[id] = entries[id]
+                        self.guids[entries[id]['guid']] = entries[id]
+            self.since = since
+            self.refreshed = now
+            return True
+        finally:
+            self.lock.release()
+
+    def get_addon(self, guid):
+        """The add-on matching the `is_valid` query, or None."""
+        entry = self.guids.get(guid)
+        if entry is None or entry['inactive']:
+            return None
+        return entry
+
+    def get_file_status(self, id, version):
+        """The status of a file of `version`, as looked up by `get_beta`."""
+        entry = self.addons.get(id)
+        if entry is None:
+            return None
+        return entry['statuses'].get(version)
+
+    def is_overridden(self, candidate, app_id, version_int):
+        """
+        Whether a compat override excludes this candidate. This mirrors the
+        `incompatible_versions` subquery in `Update.get_update`, including the
+        precedence of its AND/OR clauses, so both paths give the same answer.
+        """
+        for (app, min, max, min_int, max_int) in candidate['overrides']:
+            if (app == app_id and min == '0' and max_int is not None
+                and max_int >= version_int):
+                return True
+            if min_int is not None and min_int <= version_int:
+                if max == '*':
+                    return True
+                if max_int is not None and max_int >= version_int:
+                    return True
+        return False
+
+    def is_compatible(self, candidate, data, compat_mode):
+        app_version = data['version_int']
+        if candidate['min_int'] > app_version:
+            return False
+
+        if compat_mode == 'ignore':
+            return True
+
+        elif compat_mode == 'normal':
+            # When file has strict_compatibility enabled, or file has binary
+            # components, default to compatible is disabled.
+            if ((candidate['strict_compat'] or
+                 candidate['binary_components']) and
+                candidate['max_int'] < app_version):
+                return False
+            d2c_max = applications.D2C_MAX_VERSIONS.get(data['app_id'])
+            if d2c_max and candidate['max_int'] < version_int(d2c_max):
+                return False
+            return not self.is_overridden(candidate, data['app_id'],
+                                          app_version)
+
+        # Not defined or 'strict'.
+        return candidate['max_int'] >= app_version
+
+    def get_update(self, data, flags, compat_mode):
+        """
+        The row that `Update.get_update` would find for `data`, or None. The
+        candidates are already ordered by version id, so the first match wins.
+        """
+        entry = self.addons.get(data['id'])
+        if entry is None:
+            return None
+
+        platforms = [PLATFORM_ALL.id]
+        if data.get('appOS'):
+            platforms.append(data['appOS'])
+
+        if flags['multiple_status']:
+            statuses = STATUSES_PUBLIC
+        else:
+            statuses = [data['status']]
+
+        for candidate in entry['apps'].get(data['app_id'], []):
+            if candidate['platform_id'] not in platforms:
+                continue
+            if flags['use_version']:
+                if (candidate['file_status'] <= data['status'] or
+                    candidate['version'] != data['version']):
+                    continue
+            elif candidate['file_status'] not in statuses:
+                continue
+            if not self.is_compatible(candidate, data, compat_mode):
+                continue
+
+            row = dict((k, candidate.get(k)) for k in ROW_FIELDS)
+            row.update(guid=entry['guid'], type=entry['type'],
+                       disabled_by_user=entry['inactive'],
+                       premium_type=entry['premium_type'])
+            return row
+        return None
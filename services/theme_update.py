@@ -1,8 +1,10 @@
 import base64
+import hashlib
 import json
 import os
 import posixpath
 import re
+from email.utils import mktime_tz, parsedate_tz
 from time import time
 from wsgiref.handlers import format_date_time
 
@@ -18,6 +20,7 @@ setup_environ(settings)
 log_configure()
 
 # This has to be imported after the settings (utils).
+from django.core.cache import cache
 from django_statsd.clients import statsd
 
 
@@ -40,23 +43,80 @@ class ThemeUpdate(object):
             self.cursor = self.conn.cursor()
 
     def base64_icon(self, addon_id):
+        """
+        The base64 encoded icon of the theme. It only changes when the theme
+        is modified, so with SERVICES_THEME_UPDATE_CACHE it is cached on
+        `modified` rather than read from disk for every locale and every ping.
+        """
+        use_cache = getattr(settings, 'SERVICES_THEME_UPDATE_CACHE', False)
+        key = 'theme-update:icon:%s:%s' % (addon_id,
+                                            self.data['row']['modified'])
+        if use_cache:
+            icon = cache.get(key)
+            if icon is not None:
+                return icon
+
         path = self.image_path('icon.jpg')
         try:
             with open(path, 'r') as f:
-                return base64.b64encode(f.read())
+                icon = base64.b64encode(f.read())
         except IOError, e:
             if len(e.args) == 1:
                 log_exception('I/O error: {0}'.format(e[0]))
             else:
                 log_exception('I/O error({0}): {1}'.format(e[0], e[1]))
             return ''
+        if use_cache:
+            cache.set(key, icon, settings.SERVICES_THEME_UPDATE_CACHE_TIMEOUT)
+        return icon
+
+    def get_headers(self, length=None):
+        """
+        The response headers. `Last-Modified` is the time the theme was last
+        modified, so clients can revalidate with `If-Modified-Since`. Without
+        a `length` only the caching headers are returned, for a 304.
+        """
+        modified = (self.data.get('modified') or
+                    self.data['row'].get('modified'))
+        headers = [('Cache-Control', 'public, max-age=3600'),
+                   ('Expires', format_date_time(time() + 3600)),
+                   ('Last-Modified', format_date_time(modified or time()))]
+        if length is not None:
+            headers += [('Content-Length', str(length)),
+                        ('Content-Type', 'application/json')]
+        return headers
+
+    def get_modified(self):
+        """
+        The time the theme was last modified as a timestamp, or None if
+        there is no such public theme. This only looks at `addons`, so it is
+        cheap enough to run before every cache lookup.
+        """
+        if 'modified' not in self.data:
+            sql = """
+            SELECT UNIX_TIMESTAMP(a.modified)
+            FROM addons AS a
+            INNER JOIN personas AS p ON p.addon_id=a.id
+            WHERE p.{primary_key}=%(id)s AND
+                a.addontype_id=%(atype)s AND a.status=4 AND a.inactive=0
+            """.format(primary_key=self.data['primary_key'])
+            self.cursor.execute(sql, self.data)
+            row = self.cursor.fetchone()
+            self.data['modified'] = int(row[0] or 0) if row else None
+        return self.data['modified']
+
+    def is_modified_since(self, since):
+        """Whether the theme changed after the `If-Modified-Since` date."""
+        try:
+            since = mktime_tz(parsedate_tz(since))
+        except (TypeError, ValueError, OverflowError):
+            return True
+        return self.get_modified() > since
 
-    def get_headers(self, length):
-        return [('Cache-Control', 'public, max-age=3600'),
-                ('Content-Length', str(length)),
-                ('Content-Type', 'application/json'),
-                ('Expires', format_date_time(time() + 3600)),
-                ('Last-Modified', format_date_time(time()))]
+    def get_cache_key(self):
+        key = ':'.join(map(str, [self.data['primary_key'], self.data['id'],
+                                 self.data['locale']]))
+        return 'theme-update:%s' % hashlib.md5(key).hexdigest()
 
     def get_update(self):
         """
@@ -78,6 +138,8 @@ class ThemeUpdate(object):
         SELECT p.persona_id, a.id, a.slug, v.version,
             t_name.localized_string AS name,
             t_desc.localized_string AS description,
+            t_name_default.localized_string AS default_name,
+            t_desc_default.localized_string AS default_description,
             p.display_username, p.header,
             p.footer, p.accentcolor, p.textcolor,
             UNIX_TIMESTAMP(a.modified) AS modified
@@ -88,6 +150,10 @@ class ThemeUpdate(object):
             ON t_name.id=a.name AND t_name.locale=%(locale)s
         LEFT JOIN translations AS t_desc
             ON t_desc.id=a.summary AND t_desc.locale=%(locale)s
+        LEFT JOIN translations AS t_name_default
+            ON t_name_default.id=a.name AND t_name_default.locale='en-US'
+        LEFT JOIN translations AS t_desc_default
+            ON t_desc_default.id=a.summary AND t_desc_default.locale='en-US'
         WHERE p.{primary_key}=%(id)s AND
             a.addontype_id=%(atype)s AND a.status=4 AND a.inactive=0
         """.format(primary_key=self.data['primary_key'])
@@ -95,30 +161,54 @@ class ThemeUpdate(object):
         self.cursor.execute(sql, self.data)
         row = self.cursor.fetchone()
 
-        row_to_dict = lambda row: dict(zip((
-            'persona_id', 'addon_id', 'slug', 'current_version', 'name',
-            'description', 'username', 'header', 'footer', 'accentcolor',
-            'textcolor', 'modified'),
-            list(row)))
-
         if row:
-            self.data['row'] = row_to_dict(row)
+            row = dict(zip((
+                'persona_id', 'addon_id', 'slug', 'current_version', 'name',
+                'description', 'default_name', 'default_description',
+                'username', 'header', 'footer', 'accentcolor', 'textcolor',
+                'modified'),
+                list(row)))
 
             # Fall back to `en-US` if the name was null for our locale.
-            # TODO: Write smarter SQL and don't rerun the whole query.
-            if not self.data['row']['name']:
+            default_name = row.pop('default_name')
+            default_description = row.pop('default_description')
+            if not row['name']:
                 self.data['locale'] = 'en-US'
-                self.cursor.execute(sql, self.data)
-                row = self.cursor.fetchone()
-                if row:
-                    self.data['row'] = row_to_dict(row)
+                row['name'] = default_name
+                row['description'] = default_description
 
+            self.data['row'] = row
             return True
 
         return False
 
-    # TODO: Cache on row['modified']
     def get_json(self):
+        """
+        The JSON response, or None if the theme is not found. Responses are
+        cached per id, locale and `src=gp` and only served from the cache
+        while the theme has not been modified since.
+        """
+        if not getattr(settings, 'SERVICES_THEME_UPDATE_CACHE', False):
+            return self.build_json()
+
+        modified = self.get_modified()
+        if modified is None:
+            # Persona not found.
+            return
+        key = self.get_cache_key()
+        cached = cache.get(key)
+        if cached and cached[0] == modified:
+            statsd.incr('services.theme_update.cache.hit')
+            return cached[1]
+
+        statsd.incr('services.theme_update.cache.miss')
+        output = self.build_json()
+        if output:
+            cache.set(key, (modified, output),
+                      settings.SERVICES_THEME_UPDATE_CACHE_TIMEOUT)
+        return output
+
+    def build_json(self):
         if not self.get_update():
             # Persona not found.
             return
@@ -216,6 +306,15 @@ def application(environ, start_response):
 
         try:
             update = ThemeUpdate(locale, id_, environ.get('QUERY_STRING'))
+            since = environ.get('HTTP_IF_MODIFIED_SINCE')
+            if since:
+                modified = update.get_modified()
+                if modified is None:
+                    start_response('404 Not Found', [])
+                    return ['']
+                if not update.is_modified_since(since):
+                    start_response('304 Not Modified', update.get_headers())
+                    return ['']
             output = update.get_json()
             if not output:
                 start_response('404 Not Found', [])
@@ -1,7 +1,9 @@
+import hashlib
 import smtplib
 import sys
 import traceback
 
+from datetime import datetime, timedelta
 from email.Utils import formatdate
 from email.mime.text import MIMEText
 from time import time
@@ -14,6 +16,7 @@ import settings_local as settings
 setup_environ(settings)
 # This has to be imported after the settings so statsd knows where to log to.
 from django_statsd.clients import statsd
+from django.core.cache import cache
 
 
 import commonware.log
@@ -26,16 +29,21 @@ try:
 except ImportError:
     from apps.versions.compare import version_int
 
+from compat_index import CompatIndex
 from constants import applications, base
-from utils import (APP_GUIDS, get_mirror, log_configure, PLATFORMS,
-                   STATUSES_PUBLIC)
+from utils import (APP_GUIDS, cache_ns_key, get_mirror, log_configure,
+                   PLATFORMS, STATUSES_PUBLIC)
 
 # Go configure the log.
 log_configure()
 
-good_rdf = """<?xml version="1.0"?>
+rdf_wrapper = """<?xml version="1.0"?>
 <RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
          xmlns:em="http://www.mozilla.org/2004/em-rdf#">
+%s</RDF:RDF>"""
+
+
+good_rdf_description = """\
     <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
         <em:updates>
             <RDF:Seq>
@@ -57,25 +65,22 @@ good_rdf = """<?xml version="1.0"?>
             </RDF:Description>
         </em:targetApplication>
     </RDF:Description>
-</RDF:RDF>"""
-
-
-bad_rdf = """<?xml version="1.0"?>
-<RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-         xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-</RDF:RDF>"""
+"""
 
 
-no_updates_rdf = """<?xml version="1.0"?>
-<RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-         xmlns:em="http://www.mozilla.org/2004/em-rdf#">
+no_updates_rdf_description = """\
     <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
         <em:updates>
             <RDF:Seq>
             </RDF:Seq>
         </em:updates>
     </RDF:Description>
-</RDF:RDF>"""
+"""
+
+
+good_rdf = rdf_wrapper % good_rdf_description
+bad_rdf = rdf_wrapper % ''
+no_updates_rdf = rdf_wrapper % no_updates_rdf_description
 
 
 timing_log = commonware.log.getLogger('z.timer')
@@ -90,10 +95,16 @@ def getconn():
 
 mypool = pool.QueuePool(getconn, max_overflow=10, pool_size=5, recycle=300)
 
+compat_index = CompatIndex(
+    interval=getattr(settings, 'SERVICES_UPDATE_INDEX_INTERVAL', 60),
+    full_interval=getattr(settings, 'SERVICES_UPDATE_INDEX_FULL_INTERVAL',
+                          3600),
+    connect=mypool.connect)
+
 
 class Update(object):
 
-    def __init__(self, data, compat_mode='strict'):
+    def __init__(self, data, compat_mode='strict', index=None):
         self.conn, self.cursor = None, None
         self.data = data.copy()
         self.data['row'] = {}
@@ -101,6 +112,20 @@ class Update(object):
         self.is_beta_version = False
         self.version_int = 0
         self.compat_mode = compat_mode
+        self.index = index
+
+    def get_index(self):
+        """
+        The compat index if it is enabled and loaded, otherwise None and the
+        lookups fall back to SQL.
+        """
+        if not getattr(settings, 'SERVICES_UPDATE_INDEX', False):
+            return None
+        try:
+            compat_index.refresh(self.cursor)
+        except mysql.Error:
+            log_exception(self.data)
+        return compat_index if compat_index.ready else None
 
     def is_valid(self):
         # If you accessing this from unit tests, then before calling
@@ -120,14 +145,16 @@ class Update(object):
         if not data['app_id']:
             return False
 
-        sql = """SELECT id, status, addontype_id, guid FROM addons
-                 WHERE guid = %(guid)s AND
-                       inactive = 0 AND
-                       status != %(STATUS_DELETED)s
-                 LIMIT 1;"""
-        self.cursor.execute(sql, {'guid': self.data['id'],
-                                  'STATUS_DELETED': base.STATUS_DELETED})
-        result = self.cursor.fetchone()
+        if self.index is None:
+            self.index = self.get_index()
+        if self.index:
+            addon = self.index.get_addon(self.data['id'])
+            if addon is None:
+                return False
+            result = (addon['id'], addon['status'], addon['type'],
+                      addon['guid'])
+        else:
+            result = self.get_addon()
         if result is None:
             return False
 
@@ -145,6 +172,30 @@ class Update(object):
         self.is_beta_version = base.VERSION_BETA.search(data['version'])
         return True
 
+    def get_addon(self):
+        sql = """SELECT id, status, addontype_id, guid FROM addons
+                 WHERE guid = %(guid)s AND
+                       inactive = 0 AND
+                       status != %(STATUS_DELETED)s
+                 LIMIT 1;"""
+        self.cursor.execute(sql, {'guid': self.data['id'],
+                                  'STATUS_DELETED': base.STATUS_DELETED})
+        return self.cursor.fetchone()
+
+    def get_file_status(self):
+        if self.index:
+            return self.index.get_file_status(self.data['id'],
+                                              self.data['version'])
+        sql = """
+            SELECT versions.id, status
+            FROM files INNER JOIN versions
+            ON files.version_id = versions.id
+            WHERE versions.addon_id = %(id)s
+                  AND versions.version = %(version)s LIMIT 1;"""
+        self.cursor.execute(sql, self.data)
+        result = self.cursor.fetchone()
+        return result[1] if result is not None else None
+
     def get_beta(self):
         data = self.data
         data['status'] = base.STATUS_PUBLIC
@@ -153,17 +204,9 @@ class Update(object):
             # Beta channel looks at the addon name to see if it's beta.
             if self.is_beta_version:
                 # For beta look at the status of the existing files.
-                sql = """
-                    SELECT versions.id, status
-                    FROM files INNER JOIN versions
-                    ON files.version_id = versions.id
-                    WHERE versions.addon_id = %(id)s
-                          AND versions.version = %(version)s LIMIT 1;"""
-                self.cursor.execute(sql, data)
-                result = self.cursor.fetchone()
+                status = self.get_file_status()
                 # Only change the status if there are files.
-                if result is not None:
-                    status = result[1]
+                if status is not None:
                     # If it's in Beta or Public, then we should be looking
                     # for similar. If not, find something public.
                     if status in (base.STATUS_BETA, base.STATUS_PUBLIC):
@@ -184,6 +227,22 @@ class Update(object):
         self.get_beta()
         data = self.data
 
+        if self.index:
+            row = self.index.get_update(data, self.flags, self.compat_mode)
+        else:
+            row = self.get_update_row()
+
+        if row:
+            row['type'] = base.ADDON_SLUGS_UPDATE[row['type']]
+            row['url'] = get_mirror(self.data['addon_status'],
+                                    self.data['id'], row)
+            data['row'] = row
+            return True
+
+        return False
+
+    def get_update_row(self):
+        data = self.data
         sql = ["""
             SELECT
                 addons.guid as guid, addons.addontype_id as type,
@@ -267,29 +326,68 @@ class Update(object):
         result = self.cursor.fetchone()
 
         if result:
-            row = dict(zip([
+            return dict(zip([
                 'guid', 'type', 'disabled_by_user', 'appguid', 'min', 'max',
                 'file_id', 'file_status', 'hash', 'filename', 'version_id',
                 'datestatuschanged', 'strict_compat', 'releasenotes',
                 'version', 'premium_type'],
                 list(result)))
-            row['type'] = base.ADDON_SLUGS_UPDATE[row['type']]
-            row['url'] = get_mirror(self.data['addon_status'],
-                                    self.data['id'], row)
-            data['row'] = row
-            return True
-
-        return False
 
     def get_bad_rdf(self):
         return bad_rdf
 
+    def get_cache_key(self):
+        """
+        The cache key for the response to this query. It lives in the
+        `d2c-versions` namespace of the add-on, so anything that invalidates
+        the compatible versions of the add-on invalidates the response too.
+        """
+        data = self.data
+        # The add-on version only matters when it is used to look up the
+        # status of its files, or to stay within that version.
+        version = ''
+        if (self.is_beta_version or
+            data['addon_status'] not in STATUSES_PUBLIC.values()):
+            version = data['version']
+        key = ':'.join(map(str, [
+            data['reqVersion'], data['app_id'], data['version_int'],
+            data.get('appOS'), self.compat_mode, version]))
+        return 'update:%s:%s' % (cache_ns_key('d2c-versions:%s' % data['id']),
+                                 hashlib.md5(key).hexdigest())
+
+    def get_cache_timeout(self):
+        """
+        Don't cache a local mirror URL past the point it would switch to the
+        public mirror.
+        """
+        timeout = settings.SERVICES_UPDATE_CACHE_TIMEOUT
+        row = self.data['row']
+        if row and row['datestatuschanged']:
+            switch = (row['datestatuschanged'] +
+                      timedelta(minutes=settings.MIRROR_DELAY))
+            remaining = switch - datetime.now()
+            if remaining > timedelta(0):
+                timeout = min(timeout, remaining.seconds + 1)
+        return timeout
+
+    def get_update_rdf(self):
+        if self.get_update():
+            return self.get_good_rdf()
+        return self.get_no_updates_rdf()
+
     def get_rdf(self):
         if self.is_valid():
-            if self.get_update():
-                rdf = self.get_good_rdf()
+            if getattr(settings, 'SERVICES_UPDATE_CACHE', False):
+                key = self.get_cache_key()
+                rdf = cache.get(key)
+                if rdf is None:
+                    statsd.incr('services.update.cache.miss')
+                    rdf = self.get_update_rdf()
+                    cache.set(key, rdf, self.get_cache_timeout())
+                else:
+                    statsd.incr('services.update.cache.hit')
             else:
-                rdf = self.get_no_updates_rdf()
+                rdf = self.get_update_rdf()
         else:
             rdf = self.get_bad_rdf()
         self.cursor.close()
@@ -297,11 +395,15 @@ class Update(object):
             self.conn.close()
         return rdf
 
-    def get_no_updates_rdf(self):
+    def get_no_updates_description(self):
         name = base.ADDON_SLUGS_UPDATE[self.data['type']]
-        return no_updates_rdf % ({'guid': self.data['guid'], 'type': name})
+        return no_updates_rdf_description % ({'guid': self.data['guid'],
+                                              'type': name})
 
-    def get_good_rdf(self):
+    def get_no_updates_rdf(self):
+        return rdf_wrapper % self.get_no_updates_description()
+
+    def get_good_description(self):
         data = self.data['row']
         data['if_hash'] = ''
         if data['hash']:
@@ -315,7 +417,10 @@ class Update(object):
                                  (settings.SITE_URL, '/versions/updateInfo/',
                                   data['version_id']))
 
-        return good_rdf % data
+        return good_rdf_description % data
+
+    def get_good_rdf(self):
+        return rdf_wrapper % self.get_good_description()
 
     def format_date(self, secs):
         return '%s GMT' % formatdate(time() + secs)[:25]
@@ -328,6 +433,58 @@ class Update(object):
                 ('Content-Length', str(length))]
 
 
+class BatchUpdate(Update):
+    """
+    Looks up updates for several add-ons of the same application at once.
+    All the add-ons are loaded into a `CompatIndex` with a fixed number of
+    queries and each one is then answered by an `Update` from that index.
+    """
+
+    def __init__(self, data, items, compat_mode='strict'):
+        super(BatchUpdate, self).__init__(data, compat_mode)
+        self.items = items[:settings.SERVICES_UPDATE_BATCH_SIZE]
+
+    def is_valid(self):
+        for field in ['reqVersion', 'appID', 'appVersion']:
+            if field not in self.data:
+                return False
+        return bool(self.items) and self.data['appID'] in APP_GUIDS
+
+    def get_batch_index(self):
+        index = self.get_index()
+        if index is None:
+            index = CompatIndex()
+            index.load_guids(self.cursor, [guid for guid, _ in self.items])
+        return index
+
+    def get_descriptions(self):
+        index = self.get_batch_index()
+        for guid, version in self.items:
+            data = dict(self.data, id=guid, version=version)
+            up = Update(data, self.compat_mode, index=index)
+            up.cursor = self.cursor
+            if not up.is_valid():
+                continue
+            if up.get_update():
+                yield up.get_good_description()
+            else:
+                yield up.get_no_updates_description()
+
+    def get_rdf(self):
+        if not self.cursor:
+            self.conn = mypool.connect()
+            self.cursor = self.conn.cursor()
+
+        if self.is_valid():
+            rdf = rdf_wrapper % '\n'.join(self.get_descriptions())
+        else:
+            rdf = self.get_bad_rdf()
+        self.cursor.close()
+        if self.conn:
+            self.conn.close()
+        return rdf
+
+
 def mail_exception(data):
     if settings.EMAIL_BACKEND != 'django.core.mail.backends.smtp.EmailBackend':
         return
@@ -363,3 +520,25 @@ def application(environ, start_response):
             log_exception(data)
             raise
     return [output]
+
+
+def batch_application(environ, start_response):
+    """
+    Like `application`, for several add-ons at once. Pass one `id` and one
+    `version` parameter per add-on, in the same order.
+    """
+    status = '200 OK'
+    with statsd.timer('services.update.batch'):
+        qs = parse_qsl(environ['QUERY_STRING'])
+        data = dict((k, v) for k, v in qs if k not in ('id', 'version'))
+        compat_mode = data.pop('compatMode', 'strict')
+        items = zip([v for k, v in qs if k == 'id'],
+                    [v for k, v in qs if k == 'version'])
+        try:
+            update = BatchUpdate(data, items, compat_mode)
+            output = update.get_rdf()
+            start_response(status, update.get_headers(len(output)))
+        except:
+            log_exception(qs)
+            raise
+    return [output]
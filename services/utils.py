@@ -15,6 +15,7 @@ if settingmodule.startswith(('zamboni',  # typical git clone destination
 import posixpath
 import re
 import sys
+import time
 
 from cef import log_cef as _log_cef
 import MySQLdb as mysql
@@ -28,6 +29,7 @@ settings = importlib.import_module(settingmodule)
 
 # Pyflakes will complain about these, but they are required for setup.
 setup_environ(settings)
+from django.core.cache import cache
 from lib.log_settings_base import formatters, handlers, loggers
 
 # Ugh. But this avoids any zamboni or django imports at all.
@@ -100,6 +102,20 @@ def getconn():
 mypool = pool.QueuePool(getconn, max_overflow=10, pool_size=5, recycle=300)
 
 
+def cache_ns_key(namespace):
+    """
+    Returns a key with the namespace value appended, the same way
+    `amo.utils.cache_ns_key` does, so that the services share the namespaces
+    zamboni increments.
+    """
+    ns_key = 'ns:%s' % namespace
+    ns_val = cache.get(ns_key)
+    if ns_val is None:
+        ns_val = int(time.time())
+        cache.set(ns_key, ns_val, 0)
+    return '%s:%s' % (ns_val, ns_key)
+
+
 def log_configure():
     """You have to call this to explicity configure logging."""
     cfg = {
@@ -1,4 +1,8 @@
 import calendar
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
 import json
 from time import gmtime, time
@@ -7,9 +11,9 @@ from wsgiref.handlers import format_date_time
 
 from django.core.management import setup_environ
 
-from utils import (log_configure, log_exception, log_info, mypool,
-                   ADDON_PREMIUM, CONTRIB_CHARGEBACK, CONTRIB_NO_CHARGE,
-                   CONTRIB_PURCHASE, CONTRIB_REFUND)
+from utils import (cache_ns_key, log_configure, log_exception, log_info,
+                   mypool, ADDON_PREMIUM, CONTRIB_CHARGEBACK,
+                   CONTRIB_NO_CHARGE, CONTRIB_PURCHASE, CONTRIB_REFUND)
 
 from services.utils import settings
 setup_environ(settings)
@@ -46,6 +50,59 @@ class RefundedReceipt(Exception):
     pass
 
 
+class ReceiptCache(object):
+    """
+    A bounded, in-process cache of what was learnt verifying a receipt,
+    keyed by the hash of the receipt: the decoded receipt and, once checked,
+    the install and purchase rows it maps to.
+
+    Entries expire at the `exp` of the receipt. The database checks are only
+    trusted while the `receipt-verify` cache namespace of the app and user is
+    unchanged; zamboni bumps it when a purchase or an install is written, so
+    refunds and chargebacks show up on the next verification.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, receipt):
+        return hashlib.sha1(receipt).hexdigest()
+
+    def get(self, receipt):
+        key = self.key(receipt)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry['expires'] <= time():
+                return None
+            # Most recently used last.
+            self.entries[key] = entry
+            return entry
+
+    def set(self, receipt, entry):
+        size = getattr(settings, 'SERVICES_VERIFY_CACHE_SIZE', 0)
+        if not size:
+            return
+        key = self.key(receipt)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+receipt_cache = ReceiptCache()
+
+
+def receipt_ns(addon_id, user_id):
+    """The same namespace as `market.models.receipt_ns`."""
+    return cache_ns_key('receipt-verify:%s:%s' % (addon_id, user_id))
+
+
 class Verify:
 
     def __init__(self, receipt, environ):
@@ -58,6 +115,8 @@ class Verify:
         self.premium = None
         # This is so the unit tests can override the connection.
         self.conn, self.cursor = None, None
+        # What is known about this receipt from earlier verifications.
+        self.cached = None
 
     def setup_db(self):
         if not self.cursor:
@@ -130,6 +189,13 @@ class Verify:
         If its invalid, then just return invalid rather than give out any
         information.
         """
+        self.cached = receipt_cache.get(self.receipt)
+        if self.cached is not None:
+            statsd.incr('services.verify.cache.hit')
+            # The receipt gets re-signed with a new expiry if it expired,
+            # don't let that leak into the cache.
+            return copy.deepcopy(self.cached['decoded'])
+
         try:
             receipt = decode_receipt(self.receipt)
         except:
@@ -144,8 +210,40 @@ class Verify:
             log_info('No directed-identifier supplied')
             raise InvalidReceipt
 
+        statsd.incr('services.verify.cache.miss')
+        try:
+            expires = int(receipt.get('exp', 0))
+        except ValueError:
+            expires = 0
+        if expires > time():
+            self.cached = {'decoded': copy.deepcopy(receipt),
+                           'expires': expires}
+            receipt_cache.set(self.receipt, self.cached)
         return receipt
 
+    def get_cached(self, name):
+        """
+        The result of the `name` check from an earlier verification of this
+        receipt, if the purchases and installs of the user have not changed
+        since. Returns None if there is none.
+        """
+        if not self.cached or name not in self.cached:
+            return None
+        if self.cached['ns'] != receipt_ns(self.cached['addon_id'],
+                                           self.cached['user_id']):
+            for key in ('ns', 'install', 'purchase'):
+                self.cached.pop(key, None)
+            return None
+        return self.cached[name]
+
+    def set_cached(self, name, value):
+        if self.cached is not None:
+            if 'ns' not in self.cached:
+                self.cached.update(addon_id=self.addon_id,
+                                   user_id=self.user_id,
+                                   ns=receipt_ns(self.addon_id, self.user_id))
+            self.cached[name] = value
+
     def check_type(self, *types):
         """
         Verifies that the type of receipt is what we expect.
@@ -200,16 +298,20 @@ class Verify:
             log_info('Invalid store data')
             raise InvalidReceipt
 
-        sql = """SELECT id, user_id, premium_type FROM users_install
-                 WHERE addon_id = %(addon_id)s
-                 AND uuid = %(uuid)s LIMIT 1;"""
-        self.cursor.execute(sql, {'addon_id': self.addon_id,
-                                  'uuid': uuid})
-        result = self.cursor.fetchone()
-        if not result:
-            # We've got no record of this receipt being created.
-            log_info('No entry in users_install for uuid: %s' % uuid)
-            raise InvalidReceipt
+        result = self.get_cached('install')
+        if result is None:
+            sql = """SELECT id, user_id, premium_type FROM users_install
+                     WHERE addon_id = %(addon_id)s
+                     AND uuid = %(uuid)s LIMIT 1;"""
+            self.cursor.execute(sql, {'addon_id': self.addon_id,
+                                      'uuid': uuid})
+            result = self.cursor.fetchone()
+            if not result:
+                # We've got no record of this receipt being created.
+                log_info('No entry in users_install for uuid: %s' % uuid)
+                raise InvalidReceipt
+            self.user_id = result[1]
+            self.set_cached('install', tuple(result))
 
         pk, self.user_id, self.premium = result
 
@@ -217,15 +319,18 @@ class Verify:
         """
         Verifies that the app has been purchased.
         """
-        sql = """SELECT id, type FROM addon_purchase
-                 WHERE addon_id = %(addon_id)s
-                 AND user_id = %(user_id)s LIMIT 1;"""
-        self.cursor.execute(sql, {'addon_id': self.addon_id,
-                                  'user_id': self.user_id})
-        result = self.cursor.fetchone()
-        if not result:
-            log_info('Invalid receipt, no purchase')
-            raise InvalidReceipt
+        result = self.get_cached('purchase')
+        if result is None:
+            sql = """SELECT id, type FROM addon_purchase
+                     WHERE addon_id = %(addon_id)s
+                     AND user_id = %(user_id)s LIMIT 1;"""
+            self.cursor.execute(sql, {'addon_id': self.addon_id,
+                                      'user_id': self.user_id})
+            result = self.cursor.fetchone()
+            if not result:
+                log_info('Invalid receipt, no purchase')
+                raise InvalidReceipt
+            self.set_cached('purchase', tuple(result))
 
         if result[-1] in (CONTRIB_REFUND, CONTRIB_CHARGEBACK):
             log_info('Valid receipt, but refunded')
@@ -286,6 +391,21 @@ def get_headers(length):
             ('Last-Modified', format_date_time(time()))]
 
 
+_verifier = threading.local()
+
+
+def get_verifier():
+    """
+    The receipt verifier of this thread. It is kept across requests so the
+    certificates it fetched are not fetched again for every receipt.
+    """
+    issuers = settings.SIGNING_VALID_ISSUERS
+    if getattr(_verifier, 'issuers', None) is not issuers:
+        _verifier.verifier = certs.ReceiptVerifier(valid_issuers=issuers)
+        _verifier.issuers = issuers
+    return _verifier.verifier
+
+
 def decode_receipt(receipt):
     """
     Cracks the receipt using the private key. This will probably change
@@ -293,8 +413,7 @@ def decode_receipt(receipt):
     """
     with statsd.timer('services.decode'):
         if settings.SIGNING_SERVER_ACTIVE:
-            verifier = certs.ReceiptVerifier(valid_issuers=
-                                             settings.SIGNING_VALID_ISSUERS)
+            verifier = get_verifier()
             try:
                 result = verifier.verify(receipt)
             except ExpiredSignatureError:
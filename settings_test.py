@@ -127,8 +127,22 @@ PASSWORD_HASHERS = (
 )
 
 SQL_RESET_SEQUENCES = False
+
+# Worker threads would not see the data of the test transaction.
+ES_REINDEX_WORKERS = 0
+
+# Most receipt tests verify an empty receipt with a mocked decoding.
+SERVICES_VERIFY_CACHE_SIZE = 0
+
+# Tests read the monolith records right after recording them.
+MONOLITH_BUFFER_SIZE = 0
+
+# And the counts of the synced collections right after counting them.
+SYNCED_COLLECTIONS_BUFFER_SIZE = 0
+
 GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'worldwide'
 GEOIP_DEFAULT_TIMEOUT = .2
+GEOIP_DATABASE = ''
 
 PURCHASE_ENABLED_REGIONS = [regions.US.id,]  # US
@@ -42,6 +42,7 @@ DATABASE_POOL_ARGS = {
 }
 
 SERVICES_DATABASE = dj_database_url.parse(private.SERVICES_DATABASE_URL)
+SERVICES_THEME_UPDATE_CACHE = True
 
 SLAVE_DATABASES = ['slave']
 
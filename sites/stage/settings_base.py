@@ -33,6 +33,7 @@ DATABASES['slave']['ENGINE'] = 'mysql_pool'
 DATABASES['slave']['OPTIONS'] = {'init_command': 'SET storage_engine=InnoDB'}
 
 SERVICES_DATABASE = dj_database_url.parse(private.SERVICES_DATABASE_URL)
+SERVICES_THEME_UPDATE_CACHE = True
 
 DATABASE_POOL_ARGS = {
     'max_overflow': 10,